@@ -0,0 +1,123 @@
+"""
+Synthetic databases for the benchmarks.
+
+    python -m benchmarks.generate --recipes 100000 --data-dir benchmarks/data/100000
+
+The schema comes from DBHandler so the data matches what the app writes, rows are then inserted in large
+batches straight into the tables. The same seed always gives the same database.
+"""
+import argparse, json, os, random, sys, time
+
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Dessert", "Snack"]
+ADJECTIVES = ["spicy", "creamy", "smoky", "crispy", "roasted", "grilled", "baked", "fresh", "hearty", "quick",
+              "lemon", "garlic", "honey", "sweet", "sour", "herbed", "braised", "pan fried", "slow cooked", "rustic"]
+DISHES = ["soup", "stew", "curry", "salad", "pie", "pasta", "tacos", "stir fry", "casserole", "risotto",
+          "sandwich", "bowl", "bake", "skewers", "noodles", "omelette", "pancakes", "cake", "muffins", "chili"]
+BASE_INGREDIENTS = ["chicken", "beef", "pork", "tofu", "rice", "flour", "sugar", "butter", "milk", "egg",
+                    "onion", "garlic", "tomato", "potato", "carrot", "pepper", "salt", "olive oil", "cheese", "lentils",
+                    "spinach", "mushroom", "lemon", "basil", "cumin", "paprika", "yogurt", "cream", "honey", "oats"]
+QUANTITIES = [("1", "cup"), ("1/2", "cup"), ("2", "tbsp"), ("1", "tsp"), ("200", "g"), ("1", "kg"), ("8", "oz"),
+              ("1 1/2", "lbs"), ("3", ""), ("2", "each"), ("500", "ml"), ("1", "dozen"), ("2-3", "tbsp"), ("1½", "cup")]
+NOTES = "Preheat the oven. Mix the {0} with the {1}, season well and cook until done. Serve with {2}."
+
+def default_counts(recipes: int) -> tuple[int, int]:
+    """Catalog sizes for a recipe count, roughly one new ingredient per 10 recipes and one tag per 100"""
+    return max(len(BASE_INGREDIENTS), recipes // 10), max(20, recipes // 100)
+
+def generate(database, recipes: int, ingredients: int|None=None, tags: int|None=None, seed: int=0,
+             chunk_size: int=10000) -> dict:
+    """
+    :param database: An empty DBHandler
+    :param recipes: Number of recipes to add
+    :param ingredients: Ingredient catalog size, see default_counts
+    :param tags: Tag catalog size, see default_counts
+    \nFills the database and returns a summary of what was written
+    """
+    from scripts import Units
+    started = time.perf_counter()
+    rng = random.Random(seed)
+    default_ingredients, default_tags = default_counts(recipes)
+    ingredients = ingredients or default_ingredients
+    tags = tags or default_tags
+
+    ingredient_names = list(BASE_INGREDIENTS)
+    ingredient_names += [f"{rng.choice(ADJECTIVES)} {rng.choice(BASE_INGREDIENTS)} {n:06d}"
+                         for n in range(ingredients - len(ingredient_names))]
+    tag_names = [f"tag {n:05d}" for n in range(tags)]
+    database.bulk_add_ingredients(ingredient_names)
+    database.bulk_add_tags(tag_names)
+    ingredient_ids = dict(database.db.execute("SELECT name, id FROM ingredients"))
+    tag_ids = dict(database.db.execute("SELECT name, id FROM tags"))
+    # Only a handful of quantity/unit pairs, parsed once instead of once per line
+    parsed = {pair: Units.to_base(*pair) for pair in QUANTITIES}
+
+    next_id = database.db.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM recipes").fetchone()[0]
+    lines_written = 0
+    for chunk_start in range(0, recipes, chunk_size):
+        recipe_rows, line_rows, tag_rows = [], [], []
+        for recipe_id in range(next_id + chunk_start, next_id + min(chunk_start + chunk_size, recipes)):
+            lines = rng.sample(ingredient_names, rng.randint(3, 10))
+            recipe_tags = rng.sample(tag_names, min(len(tag_names), rng.randint(0, 4)))
+            name = f"{rng.choice(ADJECTIVES)} {lines[0]} {rng.choice(DISHES)}"
+            ingredient_json = []
+            for position, ingredient in enumerate(lines):
+                quantity, unit = rng.choice(QUANTITIES)
+                ingredient_json.append({"ingredient": ingredient, "quantity": quantity, "measurement_unit": unit})
+                line_rows.append((recipe_id, position, ingredient_ids[ingredient], quantity, unit, *parsed[(quantity, unit)]))
+            tag_rows.extend((recipe_id, tag_ids[tag]) for tag in recipe_tags)
+            recipe_rows.append((recipe_id, name, rng.choice(MEAL_TYPES), NOTES.format(*rng.sample(lines, 3)),
+                                json.dumps(ingredient_json), json.dumps(recipe_tags)))
+        with database.db:
+            # The full text triggers on recipes keep recipes_fts in step
+            database.db.executemany("INSERT INTO recipes(id, name, meal_type, notes, ingredients, tags) VALUES (?,?,?,?,?,?)",
+                                    recipe_rows)
+            database.db.executemany("""INSERT INTO recipe_ingredients(recipe_id, position, ingredient_id, quantity, unit,
+                                       amount, base_amount, dimension) VALUES (?,?,?,?,?,?,?,?)""", line_rows)
+            database.db.executemany("INSERT INTO recipe_tags(recipe_id, tag_id) VALUES (?,?)", tag_rows)
+        lines_written += len(line_rows)
+    database.db.execute("PRAGMA optimize")
+    return {
+        "recipes": recipes,
+        "ingredients": len(ingredient_ids),
+        "tags": len(tag_ids),
+        "recipe_ingredients": lines_written,
+        "seed": seed,
+        "generate_s": round(time.perf_counter() - started, 3),
+    }
+
+def open_dataset(data_dir: str, recipes: int, seed: int=0):
+    """
+    :param data_dir: Used as GROCERYAPP_DATA_DIR, must be set before anything imports DatabaseManager
+    \nOpens the database in data_dir, generating it the first time. Returns (DBHandler, summary).
+    The summary is kept next to the database so later runs can reuse it.
+    """
+    os.environ["GROCERYAPP_DATA_DIR"] = os.path.abspath(data_dir)
+    import scripts.DatabaseManager as DatabaseManager
+    summary_path = os.path.join(data_dir, "dataset.json")
+    database = DatabaseManager.DBHandler()
+    if os.path.exists(summary_path):
+        with open(summary_path, encoding="utf-8") as file:
+            summary = json.load(file)
+        if summary.get("recipes") == recipes and summary.get("seed") == seed:
+            return database, summary
+        raise ValueError(f"{data_dir} holds a different dataset ({summary.get('recipes')} recipes, seed {summary.get('seed')})")
+    if database.db.execute("SELECT EXISTS(SELECT 1 FROM recipes)").fetchone()[0]:
+        raise ValueError(f"{data_dir} already has recipes that weren't generated, use an empty folder")
+    summary = generate(database, recipes, seed=seed)
+    with open(summary_path, "w", encoding="utf-8") as file:
+        json.dump(summary, file, indent=2)
+    return database, summary
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate a synthetic GroceryApp database")
+    parser.add_argument("--recipes", type=int, required=True)
+    parser.add_argument("--data-dir", required=True, help="Folder the database folder is created in")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+    database, summary = open_dataset(args.data_dir, args.recipes, args.seed)
+    database.close()
+    json.dump(summary, sys.stdout, indent=2)
+    print()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,264 @@
+"""
+Headless benchmarks, Qt runs on the offscreen platform so no display is needed.
+
+    python -m benchmarks.run                                  # 1k, 10k and 100k recipes
+    python -m benchmarks.run --sizes 1000000 --repeat 10      # 1M, the first run generates it (takes minutes)
+    python -m benchmarks.run --baseline benchmarks/results/v0.1.1.json
+    python -m benchmarks.run --compare old.json new.json
+
+Each size runs in its own process against a generated database (see benchmarks/generate.py), datasets are
+kept in benchmarks/data and reused. Results are written as json with p50/p95/p99 per operation so runs
+from different versions can be compared with --compare/--baseline.
+"""
+import argparse, datetime as dt, json, os, platform, random, sqlite3, subprocess, sys, tempfile, time
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DATA_ROOT = os.path.join(REPO_ROOT, "benchmarks", "data")
+RESULTS_DIR = os.path.join(REPO_ROOT, "benchmarks", "results")
+SIZES = (1000, 10000, 100000, 1000000)
+DEFAULT_SIZES = (1000, 10000, 100000) # 1M is opt in, generating it takes a few minutes
+SEARCH_QUERIES = ["chicken", "spicy soup", "garlic", "creamy pasta", "lemon", "roasted potato", "oats", "tofu curry"]
+
+class Bench():
+    """Times callables into OperationStats so the summaries match the app's own metrics"""
+    def __init__(self, repeat: int):
+        self.repeat = repeat
+        self.stats = {} # Operation -> OperationStats
+
+    def measure(self, name: str, function, setup=None, repeat: int|None=None):
+        """
+        :param function: Called with whatever setup returns, only this call is timed
+        :param setup: Optional callable run before every call, returns a tuple of arguments
+        """
+        for _ in range(repeat or self.repeat):
+            args = setup() if setup is not None else ()
+            started = time.perf_counter()
+            function(*args)
+            self.add(name, (time.perf_counter() - started) * 1000)
+
+    def add(self, name: str, ms: float):
+        """Records a duration that was timed by the caller"""
+        from scripts.InfoLogging import OperationStats
+        if name not in self.stats:
+            self.stats[name] = OperationStats()
+        self.stats[name].add(ms)
+
+    def results(self) -> dict:
+        return {name: stats.summary() for name, stats in self.stats.items()}
+
+def sample_recipe(rng: random.Random, ingredients: list[str], tags: list[str], name: str) -> dict:
+    return {
+        "name": name,
+        "mealType": "Dinner",
+        "notes": "Benchmark recipe, mix everything and cook.",
+        "ingredients": [{"ingredient": ingredient, "quantity": "1", "measurement_unit": "cup"}
+                        for ingredient in rng.sample(ingredients, 6)],
+        "tags": rng.sample(tags, min(2, len(tags))),
+    }
+
+def bench_database(bench: Bench, database, rng: random.Random):
+    """DBHandler CRUD, lookups, search and aggregation"""
+    recipe_ids = [row[0] for row in database.db.execute("SELECT id FROM recipes")]
+    ingredients = [row[0] for row in database.db.execute("SELECT name FROM ingredients")]
+    tags = [row[0] for row in database.db.execute("SELECT name FROM tags")]
+    keys = database.db.execute("SELECT name, id FROM recipes ORDER BY random() LIMIT ?", (bench.repeat,)).fetchall()
+    added = []
+    counter = iter(range(1 << 30))
+
+    bench.measure("DBHandler.add_recipe", lambda recipe: added.append(database.add_recipe(recipe)),
+                  lambda: (sample_recipe(rng, ingredients, tags, f"benchmark recipe {next(counter)}"),))
+    bench.measure("DBHandler.fetch_recipe", database.fetch_recipe, lambda: (rng.choice(recipe_ids),))
+    updates = iter(list(added))
+    bench.measure("DBHandler.update_recipe", database.update_recipe,
+                  lambda: ({**sample_recipe(rng, ingredients, tags, "benchmark recipe updated"), "id": next(updates)},))
+    bench.measure("DBHandler.remove_recipe", database.remove_recipe, lambda: (added.pop(),))
+    bench.measure("DBHandler.page_recipes", database.page_recipes, lambda: (rng.choice(keys), 500))
+    bench.measure("DBHandler.find_recipe_ids", database.find_recipe_ids, lambda: (rng.choice(keys)[0],))
+    bench.measure("DBHandler.search_recipes", database.search_recipes, lambda: (rng.choice(SEARCH_QUERIES),))
+    bench.measure("DBHandler.filter_recipes", database.filter_recipes,
+                  lambda: ([rng.choice(ingredients)], [rng.choice(tags)]))
+    bench.measure("DBHandler.aggregate_ingredients", database.aggregate_ingredients,
+                  lambda: ({recipe_id: 2.0 for recipe_id in rng.sample(recipe_ids, 7)},))
+    bench.measure("DBHandler.bulk_add_ingredients", database.bulk_add_ingredients,
+                  lambda: ([f"benchmark ingredient {next(counter)}"],))
+    names = iter(database.db.execute("SELECT name FROM ingredients WHERE name LIKE 'benchmark ingredient %'").fetchall())
+    bench.measure("DBHandler.remove_ingredient", database.remove_ingredient, lambda: next(names))
+    bench.measure("DBHandler.read_startup_data", database.read_startup_data, repeat=min(bench.repeat, 5))
+
+def wait_for_data(app, window):
+    while not window.data_loaded:
+        window.load_pool.waitForDone()
+        app.processEvents()
+
+def bench_gui(bench: Bench, rng: random.Random) -> dict:
+    """Start up and the main window paths, the window opens its own DBHandler on the same database"""
+    from PyQt6.QtWidgets import QApplication, QDialog
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    QDialog.exec = lambda self: 0 # Dialogs are built and timed but never wait for input
+
+    started = time.perf_counter()
+    import main
+    import_ms = (time.perf_counter() - started) * 1000
+    main.MainWindow.start_backup = lambda self: None # Backups copy the whole database, they're not what's measured here
+
+    # Both times are from creating the window, the first one in the process also pays for building the tabs' imports
+    window = None
+    for _ in range(min(bench.repeat, 5)):
+        if window is not None:
+            window.close()
+            app.processEvents()
+        started = time.perf_counter()
+        window = main.MainWindow()
+        window.show()
+        app.processEvents() # Runs window_shown, which starts the background load
+        bench.add("startup.window", (time.perf_counter() - started) * 1000)
+        wait_for_data(app, window)
+        bench.add("startup.data", (time.perf_counter() - started) * 1000)
+    window.tabs.setCurrentIndex(1)
+    app.processEvents()
+
+    def search():
+        window.edit_tab_search()
+        window.search_pool.waitForDone()
+        app.processEvents() # Delivers the results signal
+    def set_query():
+        window.search_input.blockSignals(True) # No debounce timer, search() runs the query itself
+        window.search_input.setText(rng.choice(SEARCH_QUERIES))
+        window.search_input.blockSignals(False)
+        return ()
+    bench.measure("MainWindow.edit_tab_search", search, set_query)
+    window.full_text_check.setChecked(True)
+    bench.measure("MainWindow.edit_tab_search[full_text]", search, set_query)
+    window.full_text_check.setChecked(False)
+    window.search_input.clear()
+    search()
+
+    model = window.recipe_viewer_model
+    def select_recipe():
+        window.recipe_viewer.setCurrentIndex(model.index(rng.randrange(model.rowCount())))
+        return ()
+    bench.measure("MainWindow.open_recipe_details", window.open_recipe_details, select_recipe)
+
+    from scripts.SubWindows import IngredientSelector
+    recipe_id = model.data(model.index(0), main.Qt.ItemDataRole.UserRole)
+    data_pack = window.reads.fetch_recipe(recipe_id).to_data_pack()
+    def build_selector():
+        selector = IngredientSelector(window, window.ingredient_catalog, window.tag_catalog, data_pack)
+        selector.deleteLater()
+    bench.measure("IngredientSelector.__init__", build_selector)
+    window.close()
+    app.processEvents()
+    return {"import_main_ms": round(import_ms, 3)}
+
+def run_size(size: int, repeat: int, seed: int, data_root: str) -> dict:
+    """Runs every benchmark for one dataset size, expects a fresh process"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from benchmarks.generate import open_dataset
+    database, dataset = open_dataset(os.path.join(data_root, f"{size}-{seed}"), size, seed)
+    rng = random.Random(seed)
+    bench = Bench(repeat)
+    try:
+        bench_database(bench, database, rng)
+    finally:
+        database.close()
+    extra = bench_gui(bench, rng)
+    return {"dataset": dataset, **extra, "operations": bench.results()}
+
+def environment() -> dict:
+    info = {
+        "generated": dt.datetime.now().isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+    }
+    try:
+        info["commit"] = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                                        text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    try:
+        from PyQt6.QtCore import QT_VERSION_STR
+        info["qt"] = QT_VERSION_STR
+    except ImportError:
+        pass
+    return info
+
+def compare(old: dict, new: dict, threshold: float=1.25) -> list[tuple]:
+    """
+    :param threshold: New p50 / old p50 above this counts as a regression
+    \nPrints the p50 of every operation both runs have and returns the regressions as (size, operation, old, new)
+    """
+    regressions = []
+    for size, new_result in new["sizes"].items():
+        old_result = old["sizes"].get(size)
+        if old_result is None:
+            continue
+        print(f"\n{int(size):,} recipes")
+        for operation, stats in new_result["operations"].items():
+            before = old_result["operations"].get(operation)
+            if before is None:
+                continue
+            old_ms, new_ms = before["p50_ms"], stats["p50_ms"]
+            ratio = new_ms / old_ms if old_ms else float("inf") if new_ms else 1.0
+            flag = ""
+            if ratio > threshold and new_ms - old_ms > 0.05: # Sub 50µs differences are noise
+                flag = "  REGRESSION"
+                regressions.append((size, operation, old_ms, new_ms))
+            print(f"  {operation:<40} {old_ms:>10.3f} -> {new_ms:>10.3f} ms  x{ratio:.2f}{flag}")
+    return regressions
+
+def load_results(path: str) -> dict:
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="GroceryApp benchmarks")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(DEFAULT_SIZES),
+                        help=f"Recipe counts to run, e.g. {' '.join(map(str, SIZES))}")
+    parser.add_argument("--repeat", type=int, default=30, help="Calls timed per operation")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--data-root", default=DATA_ROOT, help="Where generated datasets are kept")
+    parser.add_argument("--out", help="Results file, defaults to benchmarks/results/<commit or date>.json")
+    parser.add_argument("--baseline", help="Compare the new results against this results file")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="Compare two results files and exit")
+    parser.add_argument("--threshold", type=float, default=1.25, help="p50 ratio counted as a regression")
+    parser.add_argument("--worker", type=int, help=argparse.SUPPRESS) # Size to run in this process
+    parser.add_argument("--worker-out", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        regressions = compare(load_results(args.compare[0]), load_results(args.compare[1]), args.threshold)
+        return 1 if regressions else 0
+    if args.worker is not None:
+        result = run_size(args.worker, args.repeat, args.seed, args.data_root)
+        with open(args.worker_out, "w", encoding="utf-8") as file:
+            json.dump(result, file)
+        return 0
+
+    results = {"environment": environment(), "repeat": args.repeat, "sizes": {}}
+    for size in args.sizes:
+        print(f"Running {size:,} recipes...", flush=True)
+        with tempfile.TemporaryDirectory() as folder:
+            out = os.path.join(folder, "result.json")
+            command = [sys.executable, "-m", "benchmarks.run", "--worker", str(size), "--worker-out", out,
+                       "--repeat", str(args.repeat), "--seed", str(args.seed), "--data-root", args.data_root]
+            completed = subprocess.run(command, cwd=REPO_ROOT)
+            if completed.returncode != 0:
+                print(f"{size:,} recipes failed with exit code {completed.returncode}", file=sys.stderr)
+                continue
+            results["sizes"][str(size)] = load_results(out)
+        for operation, stats in results["sizes"][str(size)]["operations"].items():
+            print(f"  {operation:<40} p50 {stats['p50_ms']:>10.3f}  p95 {stats['p95_ms']:>10.3f}  max {stats['max_ms']:>10.3f} ms")
+
+    out = args.out or os.path.join(RESULTS_DIR, f"{results['environment'].get('commit') or dt.date.today().isoformat()}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(out)), exist_ok=True)
+    with open(out, "w", encoding="utf-8") as file:
+        json.dump(results, file, indent=2)
+    print(f"Results written to {out}")
+    if args.baseline:
+        return 1 if compare(load_results(args.baseline), results, args.threshold) else 0
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
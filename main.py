@@ -1,42 +1,68 @@
-import sys, ast
-from rapidfuzz import fuzz
+import os, sys, time
+STARTUP_STARTED = time.perf_counter() # Taken before the heavy imports so the start up time includes them
 from PyQt6.QtWidgets import (QApplication, QMainWindow, QTabWidget, QWidget, 
                              QVBoxLayout, QHBoxLayout, QLabel, QPushButton, 
                              QLineEdit, QTextEdit, QSizePolicy, QSpacerItem, 
                              QComboBox, QListView, QCheckBox, QDialog, QMenu,
-                             QMessageBox)
-from PyQt6.QtCore import Qt, QStringListModel, QSortFilterProxyModel, QPoint
-from PyQt6.QtGui import QAction
+                             QMessageBox, QTableView, QHeaderView, QAbstractItemView)
+from PyQt6.QtCore import Qt, QStringListModel, QPoint, QTimer, QThreadPool, QModelIndex
+from PyQt6.QtGui import QAction, QStandardItemModel, QStandardItem
 import scripts.DatabaseManager as DatabaseManager
-from scripts.SubWindows import IngredientSelector
+from scripts.Models import RecipeListModel
+from scripts.Catalog import Catalog
+from scripts.Workers import SearchTask, BackupTask, StartupLoadTask
+from scripts.DatabaseWorker import DatabaseWorker
+from scripts.ShoppingList import build_shopping_list
+from scripts import Units
+from scripts.InfoLogging import InfoLogger, metrics, timer, timed, METRICS_FILE_ENV
+# SearchEngine (rapidfuzz) and SubWindows are imported where they're first used to keep start up short
+
+info_log = InfoLogger("app")
 
 class MainWindow(QMainWindow):
     def __init__(self):
         super().__init__()
+        self.startup_budget_ms = 750 # Process start to window shown, add to settings json later
+        # Milliseconds since process start: "window" when shown, "data" when loaded.
+        # "database" is how long opening the database took, migrations run there before the window can show
+        self.startup_times = {}
         try:
             # Init database manager
+            opened = time.perf_counter()
             self.database = DatabaseManager.DBHandler()
+            self.startup_times["database"] = (time.perf_counter() - opened) * 1000
+            metrics.record("startup.database", self.startup_times["database"])
+            # Only the worker thread writes from here on, this thread reads through its own read only connection
+            self.db_worker = DatabaseWorker(self.database)
+            self.reads = self.database.reading()
         except Exception as e:
             QMessageBox.critical(self,"Database Error", f"Database failed to initalize with error: {e}")
         
         # Main vars
-        self.measurement_types = ["oz", "g", "lbs"] # add to settings json later``
-        self.measurement_types.sort()
-        self.refresh_recipes()
+        self.measurement_types = list(Units.MEASUREMENT_UNITS) # add to settings json later``
+        self.search_result_limit = 500 # add to settings json later
+        self.search_engine = None # Built in the background by StartupLoadTask
+        self.data_loaded = False
+        self.data_stale = False # A recipe changed while the start up load was running
+        self.search_debounce_ms = 150 # add to settings json later
+        self.search_request = 0 # Newest search number, older results are dropped when they arrive
+        self.search_pool = QThreadPool(self)
+        self.search_pool.setMaxThreadCount(1) # One search at a time, stale ones cancel themselves
+        self.backup_daily = 7 # add to settings json later
+        self.backup_weekly = 4 # add to settings json later
+        self.backup_pool = QThreadPool(self)
+        self.backup_pool.setMaxThreadCount(1)
+        self.load_pool = QThreadPool(self)
+        self.load_pool.setMaxThreadCount(1)
         self.search_results = []
         self.popup_data = {}
         
-        try:
-            self.ingredients_list = self.database.retrieve_ingredients()
-        except Exception as e:
-            QMessageBox.critical(self,"Database Error", f"Ingredients failed to load with error: {e}")
-            self.ingredients_list = [] 
-            
-        try:
-            self.tags_list = self.database.retrieve_tags()
-        except Exception as e:
-            QMessageBox.critical(self,"Database Error", f"Tags failed to load with error: {e}")
-            self.tags_list = [] 
+        # Shared with every IngredientSelector so the names are only read and sorted once, filled by the start up load
+        self.ingredient_catalog = Catalog(self.reads, "ingredients", self.db_worker)
+        self.tag_catalog = Catalog(self.reads, "tags", self.db_worker)
+        
+        # The viewer model exists before its tab so recipe deltas have somewhere to go, it reads nothing until shown
+        self.recipe_viewer_model = RecipeListModel(self.reads, self)
             
         # Various window settings
         self.setWindowTitle("Grocery Manager")
@@ -45,28 +71,49 @@ class MainWindow(QMainWindow):
         # Create a tab widget
         self.tabs = QTabWidget()
         
-        # Add recipe tab
-        self.recipe_tab()
-        
-        # Add recipe editor tab
-        self.recipe_editor_tab()
-        
-        # Add Grocery list editor
-        self.grocery_list_tab()
-
-        # Add ingredients tab
-        self.ingredient_list_tab()
-        self.init_ingredients_display()
-        
-        # Add tags tab
-        self.tag_list_tab()
-        self.init_tags_display()
-        
+        # Tabs are built the first time they're opened, until then each one is an empty page
+        # (title, builder, called once after building)
+        self.tab_builders = [
+            ("Add Recipe", self.recipe_tab, None),
+            ("Edit/View Recipes", self.recipe_editor_tab, None),
+            ("Make Shopping List", self.grocery_list_tab, None),
+            ("Manage Ingredients", self.ingredient_list_tab, self.init_ingredients_display),
+            ("Manage Tags", self.tag_list_tab, self.init_tags_display),
+        ]
+        self.built_tabs = set()
+        for title, _, _ in self.tab_builders:
+            page = QWidget()
+            page_layout = QVBoxLayout(page)
+            page_layout.setContentsMargins(0, 0, 0, 0)
+            self.tabs.addTab(page, title)
+        self.ensure_tab(0)
+        
+        # Must be connected first, the handlers below use the widgets of the tab being opened
+        self.tabs.currentChanged.connect(self.ensure_tab)
         self.tabs.currentChanged.connect(self.edit_tab_display_update)
+        self.tabs.currentChanged.connect(self.grocery_tab_display_update)
 
         # Set the tab widget as the central widget of the main window
         self.setCentralWidget(self.tabs)
         
+        # File menu
+        file_menu = self.menuBar().addMenu("File") # type: ignore
+        import_action = QAction("Import Recipes...", self)
+        export_action = QAction("Export Recipes...", self)
+        import_action.triggered.connect(self.import_recipes)
+        export_action.triggered.connect(self.export_recipes)
+        file_menu.addAction(import_action) # type: ignore
+        file_menu.addAction(export_action) # type: ignore
+        
+        # Ctrl+Shift+D opens the performance panel
+        debug_action = QAction("Performance", self)
+        debug_action.setShortcut("Ctrl+Shift+D")
+        debug_action.triggered.connect(self.open_debug_panel)
+        self.addAction(debug_action)
+        
+        # Runs once the event loop starts, after the window is shown
+        QTimer.singleShot(0, self.window_shown)
+        
     # Tabs
     def recipe_tab(self):
         """
@@ -118,21 +165,18 @@ class MainWindow(QMainWindow):
         self.edit.clicked.connect(self.recipe_edit_popup)
         submit.clicked.connect(self.recipe_tab_submit)
         
-        self.tabs.addTab(tab, "Add Recipe")
+        return tab
     
     def ingredient_list_tab(self):
         tab = QWidget()
         layout = QVBoxLayout(tab)
         
-        # Ingredient list view setup
+        # Ingredient list view setup, rows are kept in the catalog's sorted order so no sort proxy is needed
         self.ingredients_model = QStringListModel()
-        proxy_model = QSortFilterProxyModel()
-        proxy_model.setSourceModel(self.ingredients_model)
-        proxy_model.setDynamicSortFilter(True)
         self.ingredients_view = QListView()
         self.ingredients_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
-        self.ingredients_view.setModel(proxy_model)
-        proxy_model.sort(0, Qt.SortOrder.AscendingOrder) # Sort list
+        self.ingredients_view.setUniformItemSizes(True)
+        self.ingredients_view.setModel(self.ingredients_model)
         
         # Group 1 - Add ingredient group
         group_1 = QHBoxLayout()
@@ -159,21 +203,18 @@ class MainWindow(QMainWindow):
         group_1.addWidget(ingredient_submit)
         layout.addWidget(ingredient_save)
         
-        self.tabs.addTab(tab, "Manage Ingredients")
+        return tab
 
     def tag_list_tab(self):
         tab = QWidget()
         layout = QVBoxLayout(tab)
         
-        # Tag view setup
+        # Tag view setup, rows are kept in the catalog's sorted order so no sort proxy is needed
         self.tags_model = QStringListModel()
-        proxy_model = QSortFilterProxyModel()
-        proxy_model.setSourceModel(self.tags_model)
-        proxy_model.setDynamicSortFilter(True)
         self.tags_view = QListView()
         self.tags_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
-        self.tags_view.setModel(proxy_model)
-        proxy_model.sort(0, Qt.SortOrder.AscendingOrder) # Sort tags
+        self.tags_view.setUniformItemSizes(True)
+        self.tags_view.setModel(self.tags_model)
         
         # Group 1 - Add tag
         group_1 = QHBoxLayout()
@@ -200,7 +241,7 @@ class MainWindow(QMainWindow):
         group_1.addWidget(tag_submit)
         layout.addWidget(tag_save)
         
-        self.tabs.addTab(tab, "Manage Tags")
+        return tab
 
     def recipe_editor_tab(self):
         tab = QWidget()
@@ -215,19 +256,16 @@ class MainWindow(QMainWindow):
         self.search_input.setPlaceholderText("Search recipe...")
         self.keyword_check = QCheckBox("Keyword Search")
         self.keyword_check.setCheckState(Qt.CheckState.Checked) # I think this is the better mode so I am leaving it checked by default
+        self.full_text_check = QCheckBox("Search Notes && Ingredients")
         search_btn = QPushButton("Search")
         search_btn.setFixedWidth(fixed_btn_width)
 
-        # Recipe viewer setup
-        self.recipe_viewer_model = QStringListModel(self.recipe_names)
-        proxy_model = QSortFilterProxyModel()
-        proxy_model.setSourceModel(self.recipe_viewer_model)
-        proxy_model.setDynamicSortFilter(True)
+        # Recipe viewer setup, rows are paged from the database in name order as the list scrolls
+        self.show_recipe_index()
         self.recipe_viewer = QListView()
         self.recipe_viewer.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
-        self.recipe_viewer.setModel(proxy_model)
-        proxy_model.setSortCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
-        proxy_model.sort(0, Qt.SortOrder.AscendingOrder) # Sort recipes
+        self.recipe_viewer.setUniformItemSizes(True)
+        self.recipe_viewer.setModel(self.recipe_viewer_model)
         
         # Policies
         self.recipe_viewer.setContextMenuPolicy(Qt.ContextMenuPolicy.CustomContextMenu)
@@ -236,22 +274,87 @@ class MainWindow(QMainWindow):
         self.recipe_viewer.doubleClicked.connect(self.open_recipe_details)
         search_btn.clicked.connect(self.edit_tab_search)
         self.search_input.returnPressed.connect(search_btn.click)
+        self.keyword_check.stateChanged.connect(self.edit_tab_search)
+        self.full_text_check.stateChanged.connect(self.edit_tab_search)
+        
+        # Search as you type, each keystroke restarts the timer so a burst of typing runs one search
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(self.search_debounce_ms)
+        self.search_timer.timeout.connect(self.edit_tab_search)
+        self.search_input.textChanged.connect(lambda _: self.search_timer.start())
         self.recipe_viewer.customContextMenuRequested.connect(self.recipe_view_context_menu)
         
         # Layout
         layout.addLayout(group_1)
         group_1.addWidget(self.search_input)
         group_1.addWidget(search_btn)
-        layout.addWidget(self.keyword_check, alignment=Qt.AlignmentFlag.AlignRight)
+        check_layout = QHBoxLayout()
+        check_layout.addStretch()
+        check_layout.addWidget(self.full_text_check)
+        check_layout.addWidget(self.keyword_check)
+        layout.addLayout(check_layout)
         layout.addWidget(self.recipe_viewer)
         
-        self.tabs.addTab(tab, "Edit/View Recipes")
+        return tab
 
     def grocery_list_tab(self):
         tab = QWidget()
         layout = QVBoxLayout(tab)
         
-        self.tabs.addTab(tab, "Make Shopping List")
+        # Button width for consistent buttons    
+        fixed_btn_width = 128
+        
+        # Group 1 - Recipe picker and meal plan
+        group_1 = QHBoxLayout()
+        self.plan_source_model = RecipeListModel(self.reads, self)
+        self.plan_source_view = QListView()
+        self.plan_source_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.plan_source_view.setUniformItemSizes(True)
+        self.plan_source_view.setModel(self.plan_source_model)
+        
+        button_layout = QVBoxLayout()
+        plan_add = QPushButton("Add >>")
+        plan_add.setFixedWidth(fixed_btn_width)
+        plan_remove = QPushButton("<< Remove")
+        plan_remove.setFixedWidth(fixed_btn_width)
+        button_layout.addWidget(plan_add, alignment=Qt.AlignmentFlag.AlignBottom)
+        button_layout.addWidget(plan_remove, alignment=Qt.AlignmentFlag.AlignTop)
+        
+        # Planned recipes, the multiplier column is editable
+        self.plan_model = QStandardItemModel(0, 2)
+        self.plan_model.setHorizontalHeaderLabels(["Recipe", "Servings Multiplier"])
+        self.plan_table = QTableView()
+        self.plan_table.setModel(self.plan_model)
+        self.plan_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch) # type: ignore
+        self.plan_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
+        self.plan_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
+        
+        # Group 2 - Shopping list output
+        self.shopping_model = QStandardItemModel(0, 3)
+        self.shopping_model.setHorizontalHeaderLabels(["Ingredient", "Amount", "Unit"])
+        self.shopping_table = QTableView()
+        self.shopping_table.setModel(self.shopping_model)
+        self.shopping_table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        self.shopping_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch) # type: ignore
+        self.shopping_table.setAlternatingRowColors(True)
+        build_btn = QPushButton("Build Shopping List")
+        
+        # Connections
+        plan_add.clicked.connect(self.add_recipe_to_plan)
+        plan_remove.clicked.connect(self.remove_recipe_from_plan)
+        self.plan_source_view.doubleClicked.connect(self.add_recipe_to_plan)
+        build_btn.clicked.connect(self.build_shopping_list)
+        
+        # Layout
+        group_1.addWidget(self.plan_source_view)
+        group_1.addLayout(button_layout)
+        group_1.addWidget(self.plan_table)
+        layout.addLayout(group_1, 1)
+        layout.addWidget(build_btn)
+        layout.addWidget(self.shopping_table, 1)
+        
+        return tab
 
     # Add recipe tab functions
     def recipe_tab_submit(self):
@@ -274,7 +377,11 @@ class MainWindow(QMainWindow):
                 
             }
             try:
-                self.database.add_recipe(submission_data)
+                # Saved on the database worker, the viewer gets the recipe once it's committed
+                name, meal_type = submission_data["name"], submission_data["mealType"]
+                self.db_worker.submit("add_recipe", submission_data,
+                                      callback=lambda recipe_id: self.recipe_saved(recipe_id, name, meal_type),
+                                      errback=lambda e: self.database_error("recipe_tab_submit", e))
                 # Reset the widgets and recipe data
                 self.recipe_name_input.clear()
                 self.combo_meal_types.setCurrentIndex(0)
@@ -285,66 +392,76 @@ class MainWindow(QMainWindow):
                 self.recipe_name_label.setStyleSheet("color:white;font-weight:normal")
                 self.edit.setText("Edit Details")
                 self.edit.setStyleSheet("color:white;font-weight:normal")
-                QMessageBox.information(self, "Success", "New recipe added!") # Let the user know everything worked
-                self.refresh_recipes()
             except Exception as e:
                 QMessageBox.critical(self, "Error", f"An error has occured @recipe_tab_submit please note the following error:\n{e}")
+
+    def recipe_saved(self, recipe_id: int|None, name: str, meal_type: str):
+        """
+        :param self:
+        \nCalled by the database worker once a new recipe is committed
+        """
+        if recipe_id is None:
+            QMessageBox.critical(self, "Error", "The recipe could not be saved, see the log for details.")
+            return
+        self.recipe_added(recipe_id, name, meal_type)
+        QMessageBox.information(self, "Success", "New recipe added!") # Let the user know everything worked
+
+    def database_error(self, location: str, error: Exception):
+        QMessageBox.critical(self, "Error", f"An error has occured @{location} please note the following error:\n{error}")
                             
     def edit_tab_search(self):
-        self.search_input.setReadOnly(True) # Disable the line edit while search is preformed.
-        self.search_results.clear()
+        """
+        :param self:
+        \nQueues a search on the search pool so typing never waits on it, results arrive in show_search_results
+        """
+        self.search_timer.stop()
+        self.search_request += 1 # Anything still running for an older query cancels itself
         input_text = self.search_input.text().strip()
-        self.search_input.clear()
                    
         if input_text == "":
             # Should make it so if the user has nothing in the search it just returns the regular recipe list
-            self.recipe_viewer_model.removeRows(0, self.recipe_viewer_model.rowCount())
-            self.recipe_viewer_model.setStringList(self.recipe_names)
+            self.search_results = []
+            if not self.recipe_viewer_model.showing_index:
+                self.show_recipe_index()
+        elif self.full_text_check.isChecked():
+            # Runs in SQLite against the FTS index, fast enough to stay on this thread
+            matches = self.reads.search_recipes(input_text, limit=self.search_result_limit, markers=("<b>", "</b>"))
+            self.search_results = [(recipe_id, name) for recipe_id, name, _, _, _ in matches]
+            self.populate_recipe_viewer(self.search_results, [snippet for _, _, _, snippet, _ in matches])
+        elif self.search_engine is None:
+            return # Still loading, data_load_finished runs the search once the engine is ready
         else:
-            match_threshold = 23 # How sensitive should the search be higher num is stricter
-            score_saves = {}
+            keyword = self.keyword_check.checkState() == Qt.CheckState.Checked
+            task = SearchTask(self.search_engine, self.search_request, lambda: self.search_request, input_text, keyword)
+            task.signals.finished.connect(self.show_search_results)
+            self.search_pool.start(task)
             
-            for recipe in self.recipe_names:
-                comparison_score = fuzz.ratio(recipe, input_text)
-                if self.keyword_check.checkState() == Qt.CheckState.Checked:
-                    for word in recipe.split(" "):
-                        sub_score = fuzz.ratio(word.lower().strip(), input_text.lower())
-                        if  sub_score >= 80:
-                            score_saves[recipe] = comparison_score
-                            break
-                else:
-                    score_saves[recipe] = comparison_score
-            # Final results processing        
-            if self.keyword_check.checkState() == Qt.CheckState.Unchecked:
-                self.search_results = [key for key in score_saves.keys() if score_saves[key] >= match_threshold]
-            else:
-                self.search_results = [key for key in score_saves.keys()]
-                    
-            self.search_results.sort() # Might not be needed 
-            
-            self.recipe_viewer_model.removeRows(0, self.recipe_viewer_model.rowCount())
-            self.recipe_viewer_model.setStringList(self.search_results)
-        
-        self.search_input.setReadOnly(False) # Re-enable the line edit once search is complete.
+    def show_search_results(self, request: int, matches: list|None):
+        if request != self.search_request or matches is None:
+            return # A newer search has been started since this one
+        # Results come back ranked by score, best match first
+        self.search_results = [(recipe_id, name) for recipe_id, name, _ in matches]
+        self.populate_recipe_viewer(self.search_results)
         
     def edit_tab_display_update(self):
-        # Reinitializes the recipe viewer to reflect new changes to the db
-        if self.tabs.currentIndex() == 1:
-            self.recipe_viewer_model = QStringListModel(self.recipe_names)
-            proxy_model = QSortFilterProxyModel()
-            proxy_model.setSourceModel(self.recipe_viewer_model)
-            proxy_model.setDynamicSortFilter(True)
-            self.recipe_viewer.setModel(proxy_model)
-            proxy_model.setSortCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
-            proxy_model.sort(0, Qt.SortOrder.AscendingOrder)
+        # The viewer is kept in sync by the recipe deltas, switching back to the tab only clears old search results
+        if self.tabs.currentIndex() == 1 and not self.recipe_viewer_model.showing_index:
+            self.search_input.clear()
+            self.edit_tab_search()
             
     def open_recipe_details(self):
-        ###--CAUTION--######################################################################################################
-        # This has a pretty glaring issue in that it requires the data to be in the exact format it is in now.             #
-        # I am editing data by specific array indecies which basically means that if any index is changed this will break. #
-        ####################################################################################################################
         # Gets the current selection from the recipe list view
-        entry_name = self.recipe_viewer.currentIndex().data(Qt.ItemDataRole.DisplayRole)
+        current_index = self.recipe_viewer.currentIndex()
+        if not current_index.isValid():
+            return
+        entry_name = current_index.data(Qt.ItemDataRole.DisplayRole)
+        recipe_id = current_index.data(Qt.ItemDataRole.UserRole)
+        
+        # Gets the data from the db 
+        recipe = self.reads.fetch_recipe(recipe_id)
+        if recipe is None:
+            QMessageBox.critical(self, "Error", f"Recipe '{entry_name}' could not be loaded from the database.")
+            return
         
         # Create a popup dialog
         popup = QDialog(self)
@@ -353,40 +470,8 @@ class MainWindow(QMainWindow):
         popup.resize(600, 400)  # Set appropriate size for the dialog
         layout = QVBoxLayout(popup)
         
-        # Gets the data from the db 
-        entry_data = self.database.fetch_entry_data(entry_name)
-        
-        # Creates a new editable datapack for the db entry
-        self.edit_data_pack = {
-            "id":"",
-            "name":"",
-            "mealType":"",
-            "notes":"",
-            "ingredients":[],
-            "tags":[]
-            }
-        
-        # Populates the editable data pack
-        for i, item in enumerate(entry_data):
-            try:
-                item_check = ast.literal_eval(item) # Checks for list
-                if type(item_check) == list:
-                    if type(item_check[0]) == dict:
-                        self.edit_data_pack["ingredients"] = item_check
-                    else:
-                        self.edit_data_pack["tags"] = item_check        
-            except Exception as e:
-                # This here is the problem child make sure ALL indecies are correct
-                if i == 0:
-                    self.edit_data_pack["id"] = item
-                elif i == 1:
-                    self.edit_data_pack["name"] = item
-                elif i == 2:
-                    self.edit_data_pack["mealType"] = item
-                elif i == 3:
-                    self.edit_data_pack["notes"] = item
-                else:
-                    QMessageBox.critical(self, "Error", f"An error has occured @open_recipe_details please note the following error:\n{e}")
+        # Creates a new editable datapack for the db entry, the record has already decoded the json columns
+        self.edit_data_pack = recipe.to_data_pack()
 
         # Add line edit for name
         self.name_edit = QLineEdit()
@@ -426,9 +511,7 @@ class MainWindow(QMainWindow):
     def detailed_edit(self):
         saveable_data = self.recipe_edit_popup(data_pack=self.edit_data_pack)
         if saveable_data is not None:
-            self.database.update_recipe(saveable_data)
-        
-        self.refresh_recipes()
+            self.queue_recipe_update(dict(saveable_data))
         
     def save_edits(self):
         # Edit the data pack edp is garbage shorthand for edit data pack
@@ -439,12 +522,16 @@ class MainWindow(QMainWindow):
         
         # Make sure the datapack is actually populated
         if self.edit_data_pack is not None:
-            self.database.update_recipe(edp)
+            self.queue_recipe_update(dict(edp))
 
-        self.refresh_recipes()
-        
-        # Update displays to reflect changes
-        self.edit_tab_display_update()
+    def queue_recipe_update(self, data_pack: dict):
+        """
+        :param self:
+        \nSaves an edit on the database worker, the displays are updated once it's committed
+        """
+        self.db_worker.submit("update_recipe", data_pack,
+                              callback=lambda _: self.recipe_changed(data_pack["id"], data_pack["name"], data_pack["mealType"]),
+                              errback=lambda e: self.database_error("save_edits", e))
         
     def recipe_view_context_menu(self, position):
         global_pos = self.recipe_viewer.mapToGlobal(position)
@@ -473,39 +560,67 @@ class MainWindow(QMainWindow):
         if confirmed:
             index = self.recipe_viewer.currentIndex()
             if index.isValid():
-                recipe = self.recipe_viewer_model.data(index, Qt.ItemDataRole.DisplayRole)
-                self.database.remove_recipe(recipe)
-                self.recipe_viewer_model.removeRow(index.row())
-                self.save_recipes()
+                recipe_id = index.data(Qt.ItemDataRole.UserRole)
+                self.db_worker.submit("remove_recipe", recipe_id, callback=lambda _: self.recipe_removed(recipe_id),
+                                      errback=lambda e: self.database_error("remove_recipe", e))
         else:
             return
-        
-    def save_recipes(self):
-        recipes = [self.recipe_viewer_model.data(self.recipe_viewer_model.index(row, 0), Qt.ItemDataRole.DisplayRole) for row in range(self.recipe_viewer_model.rowCount())]
-        recipes = [lower_ingredient.strip().lower() for lower_ingredient in recipes]
-        self.refresh_recipes()
+            
+    # Shopping list tab functions
+    def grocery_tab_display_update(self):
+        # Reloads the recipe picker when the tab is opened, only the first page is read until it's scrolled
+        if self.tabs.currentIndex() == 2:
+            self.plan_source_model.show_index()
+                
+    def add_recipe_to_plan(self):
+        selection_index = self.plan_source_view.currentIndex()
+        if selection_index.isValid():
+            recipe_id = selection_index.data(Qt.ItemDataRole.UserRole)
+            name = self.recipe_item(recipe_id, selection_index.data(Qt.ItemDataRole.DisplayRole))
+            name.setFlags(name.flags() & ~Qt.ItemFlag.ItemIsEditable)
+            multiplier = QStandardItem("1")
+            self.plan_model.appendRow([name, multiplier])
+            # Makes sure no accidental recipes are added
+            self.plan_source_view.clearSelection()
+            self.plan_source_view.setCurrentIndex(QModelIndex())
+            
+    def remove_recipe_from_plan(self):
+        selection_index = self.plan_table.currentIndex()
+        if selection_index.isValid():
+            self.plan_model.removeRow(selection_index.row())
+            self.plan_table.clearSelection()
+            
+    def build_shopping_list(self):
+        """
+        :param self:
+        \nCollects recipe id -> multiplier from the plan table and fills the shopping list from one aggregate query
+        """
+        plan = {}
+        for row in range(self.plan_model.rowCount()):
+            recipe_id = self.plan_model.item(row, 0).data(Qt.ItemDataRole.UserRole) # type: ignore
+            try:
+                multiplier = float(self.plan_model.item(row, 1).text()) # type: ignore
+            except ValueError:
+                QMessageBox.warning(self, "Invalid Multiplier", f"Row {row + 1} needs a number for its servings multiplier.")
+                return
+            # The same recipe planned twice just adds up its servings
+            plan[recipe_id] = plan.get(recipe_id, 0.0) + multiplier
+            
+        with timer("MainWindow.build_shopping_list"):
+            self.shopping_model.removeRows(0, self.shopping_model.rowCount())
+            for name, amount, unit in build_shopping_list(self.reads, plan):
+                self.shopping_model.appendRow([QStandardItem(name), QStandardItem(f"{amount:g}"), QStandardItem(unit)])
             
     # Ingredients tab functions
+    @timed()
     def init_ingredients_display(self):
         """
         Docstring for init_ingredients_display
         
         :param self: Initializes the ingredients display with data from the db
         """
-        if self.ingredients_list is not None:
-            valid_ingredients = [s for s in self.ingredients_list if s[1].strip()] # Filter out any empty or whitespace-only ingredients first
-            valid_ingredients = [s[1] for s in valid_ingredients] # Converts from list of tuples to list of strings
-            valid_ingredients.sort() # Sort the list
-            
-            if valid_ingredients:  # Only proceed if there are valid entries
-                start_row = self.ingredients_model.rowCount()
-                count = len(valid_ingredients)
-                
-                self.ingredients_model.insertRows(start_row, count)
-
-                for i, ingredient in enumerate(valid_ingredients):
-                    index = self.ingredients_model.index(start_row + i, 0)
-                    self.ingredients_model.setData(index, ingredient, Qt.ItemDataRole.DisplayRole)
+        # The catalog is already sorted without blanks, one call fills the model
+        self.ingredients_model.setStringList(self.ingredient_catalog.names)
  
     def update_ingredients_display(self):
         """
@@ -513,27 +628,27 @@ class MainWindow(QMainWindow):
         
         :param self: Update the display for ingredients
         """
-        ingredient_text = self.ingredient_edit.text().strip().lower()
-        if not ingredient_text or ingredient_text in [self.ingredients_model.data(self.ingredients_model.index(row, 0)) for row in range(self.ingredients_model.rowCount())]:
+        # The catalog checks duplicates against a set and saves just this one row
+        position = self.ingredient_catalog.add(self.ingredient_edit.text())
+        if position is None:
             QMessageBox.warning(self, "Duplicate Entry", "Ingredient already exists!")
             return
         
-        self.ingredients_model.insertRows(self.ingredients_model.rowCount(), 1)  # Insert one row at the end
-        index = self.ingredients_model.index(self.ingredients_model.rowCount() - 1, 0)
-        self.ingredients_model.setData(index, self.ingredient_edit.text(), Qt.ItemDataRole.DisplayRole)
+        self.ingredients_model.insertRows(position, 1)  # Insert one row where it sorts
+        index = self.ingredients_model.index(position, 0)
+        self.ingredients_model.setData(index, self.ingredient_catalog.names[position], Qt.ItemDataRole.DisplayRole)
         self.ingredient_edit.clear()
-        
-        self.save_ingredients() # Runs a save whenever the display is updated
 
     def save_ingredients(self):
-        ingredients = [self.ingredients_model.data(self.ingredients_model.index(row, 0), Qt.ItemDataRole.DisplayRole) for row in range(self.ingredients_model.rowCount())]
-        ingredients = [lower_ingredient.strip().lower() for lower_ingredient in ingredients]
-        self.database.add_ingredients(ingredients)
-        try:
-            self.ingredients_list = self.database.retrieve_ingredients()
-        except Exception as e:
-            QMessageBox.critical(self,"Database Error", f"Ingredients failed to load with error: {e}")
-            self.ingredients_list = []
+        """
+        :param self:
+        \nEvery ingredient is saved as it's entered, this reloads the list from the database once the saves are done
+        """
+        def reload(rows):
+            self.ingredient_catalog.load(rows or [])
+            self.init_ingredients_display()
+        self.db_worker.submit("retrieve_ingredients", callback=reload, errback=lambda e: QMessageBox.critical(
+            self, "Database Error", f"Ingredients failed to load with error: {e}"))
     
     def ingredients_context_menu(self, position):
         global_pos = self.ingredients_view.mapToGlobal(position)
@@ -568,33 +683,25 @@ class MainWindow(QMainWindow):
             index = self.ingredients_view.currentIndex()
             if index.isValid():
                 ingredient = self.ingredients_model.data(index, Qt.ItemDataRole.DisplayRole)
-                self.database.remove_ingredient(ingredient)
-                self.ingredients_model.removeRow(index.row())
-                self.save_ingredients()
+                def removed(position):
+                    if position is not None:
+                        self.ingredients_model.removeRow(position)
+                    else:
+                        self.catalog_in_use("Ingredient In Use", self.ingredient_catalog, ingredient)
+                self.ingredient_catalog.remove(ingredient, callback=removed)
         else:
             return
 
     # Tags tab functions
+    @timed()
     def init_tags_display(self):
         """
         Docstring for init_tags_display
         
         :param self: Initializes the tags display with data from the db
         """
-        if self.tags_list is not None:
-            valid_tags = [s for s in self.tags_list if s[1].strip()] # Filter out any empty or whitespace-only tags first
-            valid_tags = [s[1] for s in valid_tags] # Converts from list of tuples to list of strings
-            valid_tags.sort() # Sort the list
-            
-            if valid_tags:  # Only proceed if there are valid entries
-                start_row = self.tags_model.rowCount()
-                count = len(valid_tags)
-                
-                self.tags_model.insertRows(start_row, count)
-
-                for i, tag in enumerate(valid_tags):
-                    index = self.tags_model.index(start_row + i, 0)
-                    self.tags_model.setData(index, tag, Qt.ItemDataRole.DisplayRole)
+        # The catalog is already sorted without blanks, one call fills the model
+        self.tags_model.setStringList(self.tag_catalog.names)
     
     def update_tags_display(self):
         """
@@ -602,26 +709,26 @@ class MainWindow(QMainWindow):
         
         :param self: Update the display for tags
         """
-        tag_text = self.tag_edit.text().strip().lower()
-        if not tag_text or tag_text in [self.tags_model.data(self.tags_model.index(row, 0)) for row in range(self.tags_model.rowCount())]:
+        # The catalog checks duplicates against a set and saves just this one row
+        position = self.tag_catalog.add(self.tag_edit.text())
+        if position is None:
             QMessageBox.warning(self, "Duplicate Entry", "Tag already exists!")
             return
-        self.tags_model.insertRows(self.tags_model.rowCount(), 1)  # Insert one row at the end
-        index = self.tags_model.index(self.tags_model.rowCount() - 1, 0)
-        self.tags_model.setData(index, self.tag_edit.text(), Qt.ItemDataRole.DisplayRole)
+        self.tags_model.insertRows(position, 1)  # Insert one row where it sorts
+        index = self.tags_model.index(position, 0)
+        self.tags_model.setData(index, self.tag_catalog.names[position], Qt.ItemDataRole.DisplayRole)
         self.tag_edit.clear()
-        
-        self.save_tags() # Runs a save whenever the display is updated
 
     def save_tags(self):
-        tags = [self.tags_model.data(self.tags_model.index(row, 0), Qt.ItemDataRole.DisplayRole) for row in range(self.tags_model.rowCount())]
-        tags = [lower_tag.strip().lower() for lower_tag in tags]
-        self.database.add_tags(tags)
-        try:
-            self.tags_list = self.database.retrieve_tags()
-        except Exception as e:
-            QMessageBox.critical(self,"Database Error", f"Tags failed to load with error: {e}")
-            self.tags_list = []
+        """
+        :param self:
+        \nEvery tag is saved as it's entered, this reloads the list from the database once the saves are done
+        """
+        def reload(rows):
+            self.tag_catalog.load(rows or [])
+            self.init_tags_display()
+        self.db_worker.submit("retrieve_tags", callback=reload, errback=lambda e: QMessageBox.critical(
+            self, "Database Error", f"Tags failed to load with error: {e}"))
         
     def tags_context_menu(self, position):
         global_pos = self.tags_view.mapToGlobal(position)
@@ -656,28 +763,40 @@ class MainWindow(QMainWindow):
             index = self.tags_view.currentIndex()
             if index.isValid():
                 tag = self.tags_model.data(index, Qt.ItemDataRole.DisplayRole)
-                self.database.remove_tag(tag)
-                self.tags_model.removeRow(index.row())
-                self.save_tags()
+                def removed(position):
+                    if position is not None:
+                        self.tags_model.removeRow(position)
+                    else:
+                        self.catalog_in_use("Tag In Use", self.tag_catalog, tag)
+                self.tag_catalog.remove(tag, callback=removed)
         else:
             return
 
+    def catalog_in_use(self, title: str, catalog, name: str):
+        """
+        :param self:
+        Shown when the database kept an ingredient/tag because a recipe still uses it.
+        """
+        uses = catalog.usage(name)
+        QMessageBox.warning(self, title, f"{name} is used by {uses} recipe(s). "
+                            "Remove it from those recipes first.")
+
     # Multi-tab functions
-    def recipe_edit_popup(self,data_pack:dict|None=None):
+    def recipe_edit_popup(self,data_pack:dict|None=None) -> dict:
+        """
+        :param self:
+        :param data_pack: Recipe to edit, a new recipe's ingredients and tags when None
+        \nReturns the ingredients and tags chosen in the popup, also kept in self.popup_data for the recipe tab
+        """
         # DEBUG print(f"LOCATION 'recipe_edit_popup': {data_pack}")
-        if not data_pack:
-            if self.ingredients_list and self.tags_list:
-                popup = IngredientSelector(ingredient_list=self.ingredients_list, tag_list=self.tags_list)
-            else:
-                popup = IngredientSelector()
-        else:
-            if self.ingredients_list and self.tags_list:
-                popup = IngredientSelector(ingredient_list=self.ingredients_list, tag_list=self.tags_list, data_pack=data_pack)
-            else:
-                popup = IngredientSelector()
+        from scripts.SubWindows import IngredientSelector
+        popup = IngredientSelector(ingredient_catalog=self.ingredient_catalog, tag_catalog=self.tag_catalog,
+                                   measurement_units=self.measurement_types,
+                                   data_pack=data_pack or None)
         
         popup.exec()
         self.popup_data = popup.get_data()
+        return self.popup_data
       
     def get_confirmation(self):
         reply = QMessageBox.question(
@@ -693,17 +812,209 @@ class MainWindow(QMainWindow):
         else:
             return False
         
-    def refresh_recipes(self):
-        '''
+    def ensure_tab(self, index: int):
+        """
         :param self:
-        \nRefresh the recipe data from the database to reflect changes
-        '''
-        self.recipes = self.database.retrieve_recipes()
-        if self.recipes:
-            self.recipe_names = [name[1] for name in self.recipes]
-            self.recipe_names.sort()
+        :param index: Tab index
+        \nBuilds a tab the first time it's opened
+        """
+        if index in self.built_tabs or not 0 <= index < len(self.tab_builders):
+            return
+        self.built_tabs.add(index)
+        _, builder, after = self.tab_builders[index]
+        self.tabs.widget(index).layout().addWidget(builder())
+        if after is not None:
+            after()
+
+    def window_shown(self):
+        """
+        :param self:
+        \nFirst thing to run after the window is on screen, starts the background work and checks the start up budget
+        """
+        self.startup_times["window"] = (time.perf_counter() - STARTUP_STARTED) * 1000
+        metrics.record("startup.window", self.startup_times["window"])
+        if self.startup_times["window"] > self.startup_budget_ms:
+            # The database share is usually the migrations after an update
+            info_log.warning("Start up over budget", window_ms=round(self.startup_times["window"]),
+                             database_ms=round(self.startup_times.get("database", 0)),
+                             budget_ms=self.startup_budget_ms)
+        self.start_data_load()
+        self.start_backup()
+
+    def start_data_load(self):
+        if not hasattr(self, "database"):
+            return
+        task = StartupLoadTask(self.database, self.search_result_limit)
+        task.signals.finished.connect(self.data_load_finished)
+        self.load_pool.start(task)
+
+    def data_load_finished(self, result):
+        """
+        :param self:
+        :param result: (RecipeSearchEngine, ingredient rows, tag rows) from StartupLoadTask
+        """
+        if result is None:
+            QMessageBox.critical(self, "Database Error", "Recipes, ingredients and tags failed to load.")
+            return
+        if self.data_stale:
+            # A recipe was saved while this was loading, the snapshot may be missing it so read again
+            self.data_stale = False
+            self.start_data_load()
+            return
+        self.search_engine, ingredient_rows, tag_rows = result
+        self.ingredient_catalog.load(ingredient_rows)
+        self.tag_catalog.load(tag_rows)
+        self.data_loaded = True
+        self.startup_times["data"] = (time.perf_counter() - STARTUP_STARTED) * 1000
+        metrics.record("startup.data", self.startup_times["data"])
+        info_log.info("Data loaded", **{f"{name}_ms": round(ms) for name, ms in self.startup_times.items()})
+        
+        # Refresh whatever was opened before the data arrived
+        if 3 in self.built_tabs:
+            self.init_ingredients_display()
+        if 4 in self.built_tabs:
+            self.init_tags_display()
+        if 1 in self.built_tabs and self.search_input.text().strip():
+            self.edit_tab_search()
+
+    def start_backup(self):
+        """
+        :param self:
+        \nBacks up the database on a worker thread, the status bar shows the progress
+        """
+        if not hasattr(self, "database"):
+            return
+        task = BackupTask(self.database.backup_manager(self.backup_daily, self.backup_weekly))
+        task.signals.progress.connect(self.show_backup_progress)
+        task.signals.finished.connect(self.backup_finished)
+        self.backup_pool.start(task)
+
+    def show_backup_progress(self, copied: int, total: int):
+        if total:
+            self.statusBar().showMessage(f"Backing up... {copied * 100 // total}%")
+
+    def closeEvent(self, event):
+        # Let background work finish before the connections go away
+        self.load_pool.waitForDone()
+        self.search_pool.waitForDone()
+        self.backup_pool.waitForDone()
+        if hasattr(self, "database"):
+            self.db_worker.close() # Queued edits are saved before the connections close
+            self.database.close()
+        metrics_file = os.environ.get(METRICS_FILE_ENV)
+        if metrics_file:
+            try:
+                metrics.dump_json(metrics_file, {"startup_ms": self.startup_times})
+                info_log.info("Metrics written", path=metrics_file)
+            except OSError as e:
+                info_log.warning("Metrics could not be written", path=metrics_file, reason=str(e))
+        super().closeEvent(event)
+
+    # Import/export
+    def import_recipes(self):
+        """
+        :param self:
+        \nStreams a JSON Lines or CSV file into the database on the database worker, the window stays usable
+        """
+        from PyQt6.QtWidgets import QFileDialog
+        from scripts import ImportExport
+        path, _ = QFileDialog.getOpenFileName(self, "Import Recipes", "", "Recipes (*.jsonl *.ndjson *.csv)")
+        if not path:
+            return
+        self.statusBar().showMessage(f"Importing {path}...") # type: ignore
+        # Not batched with other edits, the import commits a chunk at a time
+        self.db_worker.submit(ImportExport.import_file, path, batch=False, callback=self.import_finished,
+                              errback=lambda e: self.transfer_failed("Import Failed", f"{path} could not be imported:\n{e}"))
+
+    def import_finished(self, report):
+        """
+        :param self:
+        :param report: ImportExport.ImportReport
+        \nReloads everything in the background once an import is committed
+        """
+        self.statusBar().clearMessage() # type: ignore
+        # Deltas that land while reloading mark the data stale instead of editing the old index
+        self.data_loaded = False
+        self.start_data_load()
+        self.show_recipe_index()
+        message = f"Imported {report.imported} of {report.read} recipes in {report.seconds:.1f} s."
+        if report.skipped:
+            message += f"\n{report.skipped} skipped:\n" + "\n".join(report.errors[:10])
+        QMessageBox.information(self, "Import Finished", message)
+        
+    def export_recipes(self):
+        from PyQt6.QtWidgets import QFileDialog
+        from scripts import ImportExport
+        path, _ = QFileDialog.getSaveFileName(self, "Export Recipes", "recipes.jsonl", "JSON Lines (*.jsonl);;CSV (*.csv)")
+        if not path:
+            return
+        self.statusBar().showMessage(f"Exporting to {path}...") # type: ignore
+        # Queued after any edits still waiting so the file includes them
+        self.db_worker.submit(ImportExport.export_file, path, batch=False,
+                              callback=lambda count: self.statusBar().showMessage(f"Exported {count} recipes to {path}", 5000), # type: ignore
+                              errback=lambda e: self.transfer_failed("Export Failed", f"{path} could not be written:\n{e}"))
+
+    def transfer_failed(self, title: str, message: str):
+        self.statusBar().clearMessage() # type: ignore
+        QMessageBox.critical(self, title, message)
+
+    def open_debug_panel(self):
+        from scripts.SubWindows import DebugPanel
+        panel = DebugPanel(self, {"startup_ms": self.startup_times})
+        panel.exec()
+
+    def backup_finished(self, path):
+        if path:
+            self.statusBar().showMessage("Backup complete", 3000)
         else:
-            self.recipe_names = []
+            self.statusBar().clearMessage()
+
+    def recipe_added(self, recipe_id: int, name: str, meal_type: str):
+        """
+        :param self:
+        \nApplies a new recipe to the search engine and inserts its row in the viewer
+        """
+        if self.data_loaded:
+            self.search_engine.add(recipe_id, name)
+        else:
+            self.data_stale = True
+        self.recipe_viewer_model.recipe_added(recipe_id, name)
+            
+    def recipe_changed(self, recipe_id: int, name: str, meal_type: str):
+        """
+        :param self:
+        \nApplies an edit to the search engine, the viewer row is moved if the new name sorts elsewhere
+        """
+        if self.data_loaded:
+            self.search_engine.update(recipe_id, name)
+        else:
+            self.data_stale = True
+        # Search results aren't in index order so the model renames those in place
+        self.recipe_viewer_model.recipe_changed(recipe_id, name)
+                    
+    def recipe_removed(self, recipe_id: int):
+        if self.data_loaded:
+            self.search_engine.remove(recipe_id)
+        else:
+            self.data_stale = True
+        self.recipe_viewer_model.recipe_removed(recipe_id)
+        
+    def show_recipe_index(self):
+        self.recipe_viewer_model.show_index()
+    
+    def populate_recipe_viewer(self, entries, tooltips: list[str]|None=None):
+        """
+        :param self:
+        :param entries: (id, name) pairs to show in the recipe viewer
+        :param tooltips: Optional text shown when hovering each row, e.g. full text search snippets
+        \nThe id is stored on each row so lookups never depend on the display text
+        """
+        self.recipe_viewer_model.show_results(entries, tooltips)
+            
+    def recipe_item(self, recipe_id: int, name: str) -> QStandardItem:
+        item = QStandardItem(name)
+        item.setData(recipe_id, Qt.ItemDataRole.UserRole)
+        return item
     
     def recipe_view(self):
         QMessageBox.information(self, "Hi there", "This function isn't implemented just yet.")
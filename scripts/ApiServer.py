@@ -0,0 +1,387 @@
+"""
+Local HTTP API over the recipe database, so other devices in the house can use the same recipes.
+
+    python -m scripts.CommandLine serve --host 0.0.0.0 --port 8080
+
+Endpoints, every body is json:
+
+    GET    /health
+    GET    /recipes?after=&limit=            Pages of (id, name) by name, "next" is the after of the next page
+    POST   /recipes                          A recipe in the import format, returns its id
+    GET    /recipes/{id}
+    PUT    /recipes/{id}
+    DELETE /recipes/{id}
+    GET    /ingredients?after=&limit=        Pages by id, POST {"names": [...], "density": 1.03} adds some
+    GET    /tags?after=&limit=               POST {"names": [...]} adds some
+    GET    /search?q=&fields=&ingredient=&tag=&limit=
+    GET    /shopping-list?recipe=12&recipe=15:2
+
+It's a small HTTP/1.1 server on asyncio streams with keep alive. Reads run on a pool of threads, each with
+its own read only connection, writes are queued to one writer thread on DBHandler's writer connection.
+\nEvery GET carries an ETag made from SQLite's data_version, which changes whenever anything (this server,
+the app or the command line) commits. A matching If-None-Match gets a 304 without touching the tables,
+and responses are cached until the data changes.
+"""
+import asyncio, base64, json, re, secrets, threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import urlsplit, parse_qs
+from scripts.InfoLogging import InfoLogger, ErrorLogger, timer
+
+info_log = InfoLogger("api")
+error_log = ErrorLogger("api")
+
+TOKEN_ENV = "GROCERYAPP_API_TOKEN" # Default for --token
+MAX_HEADER_BYTES = 16384
+MAX_BODY_BYTES = 1024 * 1024
+KEEP_ALIVE_SECONDS = 15 # Idle time before a kept alive connection is closed
+DEFAULT_PAGE = 100
+MAX_PAGE = 1000
+CACHE_SIZE = 512 # GET responses kept for the current data_version
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+@dataclass(slots=True)
+class Request():
+    method: str
+    path: str
+    target: str # Path and query, the cache key
+    query: dict[str, list[str]]
+    headers: dict[str, str] # Lower cased names
+    body: bytes
+    match: re.Match|None = None
+
+    def param(self, name: str, default: str="") -> str:
+        values = self.query.get(name)
+        return values[-1] if values else default
+
+    def int_param(self, name: str, default: int, low: int=0, high: int|None=None) -> int:
+        try:
+            value = int(self.param(name) or default)
+        except ValueError:
+            raise HttpError(400, f"{name} must be a whole number")
+        if value < low or (high is not None and value > high):
+            raise HttpError(400, f"{name} must be between {low} and {high}")
+        return value
+
+    def json(self):
+        try:
+            return json.loads(self.body or b"null")
+        except ValueError as e:
+            raise HttpError(400, f"invalid json ({e})")
+
+def _cursor(name: str, recipe_id: int) -> str:
+    return base64.urlsafe_b64encode(json.dumps([name, recipe_id]).encode()).decode().rstrip("=")
+
+def _read_cursor(text: str) -> tuple[str, int]|None:
+    if not text:
+        return None
+    try:
+        name, recipe_id = json.loads(base64.urlsafe_b64decode(text + "=" * (-len(text) % 4)))
+        return str(name), int(recipe_id)
+    except (ValueError, TypeError):
+        raise HttpError(400, "after isn't a cursor from a previous page")
+
+# Handlers, called with (DBHandler, Request) on a reader thread (GET) or the writer thread
+def health(database, request):
+    return {"status": "ok"}
+
+def list_recipes(database, request):
+    limit = request.int_param("limit", DEFAULT_PAGE, 1, MAX_PAGE)
+    rows = database.page_recipes(_read_cursor(request.param("after")), limit)
+    return {
+        "items": [{"id": recipe_id, "name": name} for recipe_id, name in rows],
+        "next": _cursor(rows[-1][1], rows[-1][0]) if len(rows) == limit else None,
+    }
+
+def get_recipe(database, request):
+    recipe = database.fetch_recipe(int(request.match["id"]))
+    if recipe is None:
+        raise HttpError(404, "no such recipe")
+    return recipe.to_dict()
+
+def _recipe_from_body(request):
+    from scripts.ImportExport import recipe_from_record, InvalidRecord
+    record = request.json()
+    if not isinstance(record, dict):
+        raise HttpError(400, "expected a recipe object")
+    try:
+        return recipe_from_record(record)
+    except InvalidRecord as e:
+        raise HttpError(422, str(e))
+
+def add_recipe(database, request):
+    recipe = _recipe_from_body(request)
+    recipe.id = database.bulk_add_recipes([recipe])[0]
+    return recipe.to_dict()
+
+def update_recipe(database, request):
+    recipe = _recipe_from_body(request)
+    recipe.id = int(request.match["id"])
+    if database.fetch_recipe(recipe.id) is None:
+        raise HttpError(404, "no such recipe")
+    database.update_recipe(recipe.to_data_pack())
+    return recipe.to_dict()
+
+def delete_recipe(database, request):
+    recipe_id = int(request.match["id"])
+    if database.fetch_recipe(recipe_id) is None:
+        raise HttpError(404, "no such recipe")
+    database.remove_recipe(recipe_id)
+    return {"deleted": recipe_id}
+
+def _list_catalog(table: str):
+    def handler(database, request):
+        limit = request.int_param("limit", DEFAULT_PAGE, 1, MAX_PAGE)
+        rows = database.page_catalog(table, request.int_param("after", 0), limit)
+        columns = ("id", "name", "density") if table == "ingredients" else ("id", "name")
+        return {"items": [dict(zip(columns, row)) for row in rows],
+                "next": rows[-1][0] if len(rows) == limit else None}
+    return handler
+
+def _add_to_catalog(table: str):
+    def handler(database, request):
+        body = request.json()
+        names = body.get("names") if isinstance(body, dict) else None
+        if not isinstance(names, list) or not all(isinstance(name, str) for name in names):
+            raise HttpError(400, 'expected {"names": [...]}')
+        if table == "tags":
+            inserted, duplicates = database.bulk_add_tags(names)
+            return {"added": inserted, "already_saved": duplicates}
+        density = body.get("density")
+        if density is not None and (not isinstance(density, (int, float)) or density <= 0):
+            raise HttpError(422, "density must be a number above 0")
+        with database.batch(): # The names and their density are committed together
+            inserted, duplicates = database.bulk_add_ingredients(names)
+            if density is not None:
+                database.set_ingredient_densities((name, float(density)) for name in names)
+        return {"added": inserted, "already_saved": duplicates}
+    return handler
+
+def search(database, request):
+    query = request.param("q")
+    limit = request.int_param("limit", 50, 1, MAX_PAGE)
+    ingredients = [name for name in request.query.get("ingredient", []) if name.strip()]
+    tags = [name for name in request.query.get("tag", []) if name.strip()]
+    if not query and not ingredients and not tags:
+        raise HttpError(400, "give q, ingredient or tag")
+    allowed = None
+    if ingredients or tags:
+        filtered = database.filter_recipes(ingredients, tags)
+        if not query:
+            return {"items": [{"id": recipe_id, "name": name, "meal_type": meal_type}
+                              for recipe_id, name, meal_type in filtered[:limit]]}
+        allowed = {row[0] for row in filtered}
+    fields = [field for field in request.param("fields", "name,notes,ingredients").split(",") if field]
+    rows = database.search_recipes(query, fields, limit=limit if allowed is None else max(limit * 20, 1000))
+    return {"items": [{"id": recipe_id, "name": name, "meal_type": meal_type, "snippet": snippet, "score": -score}
+                      for recipe_id, name, meal_type, snippet, score in rows
+                      if allowed is None or recipe_id in allowed][:limit]}
+
+def shopping_list(database, request):
+    from scripts.ShoppingList import build_shopping_list
+    plan = {}
+    for entry in request.query.get("recipe", []):
+        recipe_id, _, servings = entry.partition(":")
+        try:
+            recipe_id, servings = int(recipe_id), float(servings or 1)
+        except ValueError:
+            raise HttpError(400, f"recipe={entry} isn't ID or ID:SERVINGS")
+        plan[recipe_id] = plan.get(recipe_id, 0.0) + servings
+    if not plan:
+        raise HttpError(400, "give at least one recipe=ID[:SERVINGS]")
+    return {"items": [{"ingredient": name, "amount": amount, "unit": unit}
+                      for name, amount, unit in build_shopping_list(database, plan)]}
+
+# (method, path pattern, handler, status on success), GETs are reads, everything else goes to the writer
+ROUTES = [
+    ("GET", r"/health", health, 200),
+    ("GET", r"/recipes", list_recipes, 200),
+    ("POST", r"/recipes", add_recipe, 201),
+    ("GET", r"/recipes/(?P<id>\d+)", get_recipe, 200),
+    ("PUT", r"/recipes/(?P<id>\d+)", update_recipe, 200),
+    ("DELETE", r"/recipes/(?P<id>\d+)", delete_recipe, 200),
+    ("GET", r"/ingredients", _list_catalog("ingredients"), 200),
+    ("POST", r"/ingredients", _add_to_catalog("ingredients"), 201),
+    ("GET", r"/tags", _list_catalog("tags"), 200),
+    ("POST", r"/tags", _add_to_catalog("tags"), 201),
+    ("GET", r"/search", search, 200),
+    ("GET", r"/shopping-list", shopping_list, 200),
+]
+
+class ApiServer():
+    """
+    Serves ROUTES over HTTP/1.1, see the module docstring. The event loop only parses requests and
+    writes responses, database work always runs on the read pool or the writer thread.
+    """
+    def __init__(self, database, host: str="127.0.0.1", port: int=8080, readers: int=4, token: str|None=None):
+        """
+        :param self:
+        :param database: DBHandler, from here on its writer connection is only used by the writer thread
+        :param port: 0 picks a free port, see self.port once started
+        :param readers: Threads (and read only connections) serving GETs
+        :param token: When given every request but /health needs "Authorization: Bearer <token>"
+        """
+        self.database = database
+        self.host = host
+        self.port = port
+        self.token = token
+        self.read_pool = ThreadPoolExecutor(readers, thread_name_prefix="api-read")
+        self.write_pool = ThreadPoolExecutor(1, thread_name_prefix="api-write") # One writer, requests queue up
+        self.views = threading.local() # Each reader thread's DBHandler.reading() copy
+        self.routes = [(method, re.compile(pattern + r"/?"), handler, status) for method, pattern, handler, status in ROUTES]
+        self.cache = OrderedDict() # target -> (data_version, body), only touched on the event loop
+        self.instance = secrets.token_hex(4) # data_version starts over with each connection, ETags from before a restart never match
+        self.probe = None # The event loop thread's reader, data_version is read from it
+        self.server = None
+
+    def version(self) -> int:
+        """data_version of the probe connection, it changes whenever any other connection commits"""
+        return self.probe.execute("PRAGMA data_version").fetchone()[0]
+
+    def __read(self, handler, request):
+        view = getattr(self.views, "database", None)
+        if view is None:
+            view = self.views.database = self.database.reading()
+        return handler(view, request)
+
+    async def start(self):
+        self.probe = self.database.reader()
+        self.server = await asyncio.start_server(self.handle_connection, self.host, self.port, limit=MAX_HEADER_BYTES)
+        self.port = self.server.sockets[0].getsockname()[1]
+        info_log.info("API server listening", host=self.host, port=self.port, auth=self.token is not None)
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.read_pool.shutdown()
+        self.write_pool.shutdown()
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self.server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                try:
+                    head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEP_ALIVE_SECONDS)
+                except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    self.__write(writer, 431, {"error": "headers too large"}, {}, False)
+                    break
+                try:
+                    request, keep_alive = await self.__parse(head, reader)
+                except HttpError as e:
+                    self.__write(writer, e.status, {"error": str(e)}, {}, False)
+                    break
+                status, payload, headers = await self.dispatch(request)
+                self.__write(writer, status, payload, headers, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def __parse(self, head: bytes, reader: asyncio.StreamReader) -> tuple[Request, bool]:
+        try:
+            lines = head.decode("latin-1").split("\r\n")
+            method, target, version = lines[0].split(" ")
+            headers = {}
+            for line in lines[1:]:
+                if line:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+            length = int(headers.get("content-length") or 0)
+        except ValueError:
+            raise HttpError(400, "malformed request")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "body too large")
+        if "chunked" in headers.get("transfer-encoding", "").lower():
+            raise HttpError(411, "send a content-length")
+        body = await reader.readexactly(length) if length else b""
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+        url = urlsplit(target)
+        return Request(method.upper(), url.path, target, parse_qs(url.query), headers, body), keep_alive
+
+    async def dispatch(self, request: Request) -> tuple[int, object, dict]:
+        """Returns (status, payload or None, extra headers)"""
+        allowed = []
+        for method, pattern, handler, status in self.routes:
+            match = pattern.fullmatch(request.path)
+            if match is None:
+                continue
+            if method != request.method:
+                allowed.append(method)
+                continue
+            request.match = match
+            break
+        else:
+            if allowed:
+                return 405, {"error": "method not allowed"}, {"Allow": ", ".join(allowed)}
+            return 404, {"error": "not found"}, {}
+        if self.token is not None and handler is not health:
+            given = request.headers.get("authorization", "").removeprefix("Bearer ").strip()
+            if not secrets.compare_digest(given.encode(), self.token.encode()):
+                return 401, {"error": "missing or wrong token"}, {"WWW-Authenticate": "Bearer"}
+
+        loop = asyncio.get_running_loop()
+        with timer(f"api {request.method} {pattern.pattern.removesuffix('/?')}"):
+            try:
+                if request.method != "GET":
+                    payload = await loop.run_in_executor(self.write_pool, handler, self.database, request)
+                    self.cache.clear()
+                    return status, payload, {}
+                version = self.version()
+                etag = f'"{self.instance}-{version}"'
+                headers = {"ETag": etag, "Cache-Control": "no-cache"}
+                if etag in (tag.strip() for tag in request.headers.get("if-none-match", "").split(",")):
+                    return 304, None, headers
+                cached = self.cache.get(request.target)
+                if cached is not None and cached[0] == version:
+                    self.cache.move_to_end(request.target)
+                    return status, cached[1], headers
+                payload = _encode(await loop.run_in_executor(self.read_pool, self.__read, handler, request))
+                self.cache[request.target] = (version, payload)
+                if len(self.cache) > CACHE_SIZE:
+                    self.cache.popitem(last=False)
+                return status, payload, headers
+            except HttpError as e:
+                return e.status, {"error": str(e)}, {}
+            except Exception as e:
+                error_log.error("API request failed", e, traceback=True, method=request.method, path=request.path)
+                return 500, {"error": "internal error"}, {}
+
+    def __write(self, writer: asyncio.StreamWriter, status: int, payload, headers: dict, keep_alive: bool):
+        body = b"" if payload is None else payload if isinstance(payload, bytes) else _encode(payload)
+        lines = [f"HTTP/1.1 {status} {HTTPStatus(status).phrase}", f"Date: {formatdate(usegmt=True)}",
+                 f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        if status != 304:
+            lines += ["Content-Type: application/json; charset=utf-8", f"Content-Length: {len(body)}"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + (body if status != 304 else b""))
+
+def _encode(payload) -> bytes:
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def serve(database, host: str="127.0.0.1", port: int=8080, readers: int=4, token: str|None=None):
+    """Runs the server until Ctrl+C"""
+    server = ApiServer(database, host, port, readers, token)
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        info_log.info("API server stopped")
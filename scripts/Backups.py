@@ -0,0 +1,180 @@
+import sqlite3, json, os, re
+import datetime as dt
+from scripts.InfoLogging import InfoLogger, ErrorLogger, timed
+
+info_log = InfoLogger("backups")
+error_log = ErrorLogger("backups")
+
+BACKUP_PREFIX = "GroceryApp_Backup-"
+BACKUP_DATE_FORMAT = "%m-%d-%Y"
+_BACKUP_NAME = re.compile(rf"^{BACKUP_PREFIX}(\d{{2}}-\d{{2}}-\d{{4}})\.db$")
+STATE_FILE = "last_backup.json"
+
+class BackupManager():
+    """
+    Rotating, dated backups of the database.
+    \nBackups copy a few pages at a time through sqlite's online backup API on their own connection, so
+    they can run on a worker thread while the app keeps using the database. A backup is skipped when the
+    database files haven't changed since the last one, and old backups are pruned down to the newest
+    `daily` days plus one per week for `weekly` weeks.
+    """
+    pages_per_step = 256 # Pages copied per step, the source is only locked while a step runs
+    step_sleep = 0.005 # Seconds between steps, gives the GUI thread's writes a chance to go through
+    def __init__(self, db_path: str, backup_dir: str, daily: int=7, weekly: int=4):
+        """
+        :param self:
+        :param db_path: Database to back up
+        :param backup_dir: Where the dated backups are kept
+        :param daily: Number of most recent days to keep a backup for
+        :param weekly: Number of weeks, after the daily ones, to keep one backup for
+        """
+        self.db_path = db_path
+        self.backup_dir = backup_dir
+        self.daily = daily
+        self.weekly = weekly
+
+    def backup_path(self, day: dt.date) -> str:
+        return os.path.join(self.backup_dir, f"{BACKUP_PREFIX}{day.strftime(BACKUP_DATE_FORMAT)}.db")
+
+    def checkpoint(self):
+        """
+        :param self:
+        \nMoves the committed pages in the WAL into the database file and empties the WAL. Readers still using
+        the WAL stop it short, which is harmless, the fingerprint then includes what's left in it.
+        """
+        try:
+            connection = sqlite3.connect(self.db_path, timeout=1)
+            try:
+                connection.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            error_log.warning("Checkpoint failed", path=self.db_path, error=str(e))
+
+    def fingerprint(self) -> list:
+        """
+        :param self:
+        \nSize and modification time of the database file, plus the size and header of a non empty WAL.
+        \nEvery connection recreates the WAL, so its modification time changes on each launch and is left out.
+        The WAL header's salts change whenever it's reset, so a write after a reset still changes the fingerprint.
+        """
+        if not os.path.exists(self.db_path):
+            return [None, None]
+        self.checkpoint()
+        fingerprint = []
+        try:
+            stat = os.stat(self.db_path)
+            fingerprint.append([stat.st_size, stat.st_mtime_ns])
+        except OSError:
+            fingerprint.append(None)
+        try:
+            with open(self.db_path + "-wal", "rb") as wal:
+                header = wal.read(32)
+                size = os.fstat(wal.fileno()).st_size
+            fingerprint.append([size, header.hex()] if size else None) # An empty WAL holds nothing
+        except OSError:
+            fingerprint.append(None)
+        return fingerprint
+
+    def __read_state(self) -> dict:
+        try:
+            with open(os.path.join(self.backup_dir, STATE_FILE), "r", encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return {}
+
+    def __write_state(self, state: dict):
+        with open(os.path.join(self.backup_dir, STATE_FILE), "w", encoding="utf-8") as file:
+            json.dump(state, file)
+
+    def is_current(self) -> bool:
+        """Returns True when the newest backup still exists and the database hasn't changed since it was taken"""
+        state = self.__read_state()
+        return (state.get("fingerprint") == self.fingerprint()
+                and os.path.exists(os.path.join(self.backup_dir, state.get("file", ""))))
+
+    @timed("BackupManager.run")
+    def run(self, progress=None, today: dt.date|None=None) -> str|None:
+        """
+        :param self:
+        :param progress: Optional callable(copied_pages, total_pages), called after every step
+        :param today: Date to stamp the backup with, defaults to today
+        \nBacks up the database if it changed and prunes old backups.
+        \nReturns the path written, None when nothing needed backing up
+        """
+        os.makedirs(self.backup_dir, exist_ok=True)
+        if today is None:
+            today = dt.date.today()
+        if not os.path.exists(self.db_path) or self.is_current():
+            self.prune(today)
+            return None
+
+        fingerprint = self.fingerprint() # Taken before copying, a write during the copy gets backed up next time
+        path = self.backup_path(today)
+        temp_path = path + ".tmp"
+        source = sqlite3.connect(self.db_path)
+        target = sqlite3.connect(temp_path)
+        try:
+            source.backup(target, pages=self.pages_per_step, sleep=self.step_sleep,
+                          progress=(lambda status, remaining, total: progress(total - remaining, total)) if progress else None)
+        except sqlite3.Error:
+            target.close()
+            os.remove(temp_path)
+            raise
+        finally:
+            source.close()
+        # The copy keeps the source's WAL flag, a rollback journal keeps each backup a single self contained file
+        target.execute("PRAGMA journal_mode = DELETE")
+        target.close()
+        # Today's earlier backup is only replaced once the new one is complete
+        os.replace(temp_path, path)
+        self.__write_state({"fingerprint": fingerprint, "file": os.path.basename(path)})
+        info_log.info("Backup written", path=path)
+        self.prune(today)
+        return path
+
+    def backups(self) -> list[tuple[dt.date, str]]:
+        """Returns (date, path) of every dated backup, newest first"""
+        found = []
+        for file_name in os.listdir(self.backup_dir):
+            match = _BACKUP_NAME.match(file_name)
+            if match is None:
+                continue
+            try:
+                day = dt.datetime.strptime(match[1], BACKUP_DATE_FORMAT).date()
+            except ValueError:
+                continue
+            found.append((day, os.path.join(self.backup_dir, file_name)))
+        found.sort(reverse=True)
+        return found
+
+    def prune(self, today: dt.date|None=None) -> list[str]:
+        """
+        :param self:
+        \nKeeps the newest backup of each of the last `daily` days and the newest backup of each of the
+        `weekly` weeks before that, everything older is deleted. Returns the deleted paths.
+        """
+        if today is None:
+            today = dt.date.today()
+        keep = set()
+        kept_weeks = set()
+        for day, path in self.backups():
+            age = (today - day).days
+            if age < self.daily:
+                keep.add(path)
+                continue
+            week = day.isocalendar()[:2]
+            if week not in kept_weeks and len(kept_weeks) < self.weekly:
+                kept_weeks.add(week)
+                keep.add(path)
+
+        removed = []
+        for _, path in self.backups():
+            if path in keep:
+                continue
+            try:
+                os.remove(path)
+                removed.append(path)
+            except OSError as e:
+                error_log.error("Removing an old backup failed", e, path=path)
+        return removed
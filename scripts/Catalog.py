@@ -0,0 +1,102 @@
+import bisect
+from scripts.InfoLogging import timed
+
+def normalize(name: str) -> str:
+    """Catalog names are stored lower case with single spaces, " Green  Onion" and "green onion" are the same entry"""
+    return " ".join(name.split()).lower()
+
+class Catalog():
+    """
+    Sorted names of the ingredients or tags table.
+    \nLoaded once and shared by the main window and every IngredientSelector, views fill their models
+    straight from `names` in one call instead of reading the table and sorting it again.
+    \nA set of the normalized names makes duplicate checks O(1), and add/remove write the one row to the
+    database and return the sorted position so a view can insert or remove just that row.
+    """
+    def __init__(self, database, table: str, worker=None):
+        """
+        :param self:
+        :param database: DBHandler the names are read from
+        :param table: "ingredients" or "tags"
+        :param worker: Optional DatabaseWorker, writes are queued to it instead of made on the calling thread
+        """
+        if table not in ("ingredients", "tags"):
+            raise ValueError(f"Unknown catalog table: {table}")
+        self.database = database
+        self.worker = worker
+        self.table = table
+        self.names = [] # Sorted, blank names are left out
+        self.members = set() # Normalized names
+
+    @timed()
+    def load(self, rows=None):
+        """
+        :param self:
+        :param rows: (id, name) rows already read, e.g. by the start up loader, otherwise the table is read here
+        """
+        if rows is None:
+            rows = self.database.retrieve_ingredients() if self.table == "ingredients" else self.database.retrieve_tags()
+        self.names = sorted(name for _, name in rows if name.strip())
+        self.members = {normalize(name) for name in self.names}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __iter__(self):
+        return iter(self.names)
+
+    def __contains__(self, name):
+        return normalize(name) in self.members
+
+    def add(self, name: str) -> int|None:
+        """
+        :param self:
+        :param name: Name as typed, it's normalized before saving
+        \nSaves a single name and returns its sorted position, None when it's blank or already in the catalog
+        """
+        name = normalize(name)
+        if not name or name in self.members:
+            return None
+        self.__write("bulk_add_ingredients" if self.table == "ingredients" else "bulk_add_tags", [name])
+        self.members.add(name)
+        position = bisect.bisect_left(self.names, name)
+        self.names.insert(position, name)
+        return position
+
+    def usage(self, name: str) -> int:
+        """Number of recipes using the name, a name that's in use can't be removed"""
+        return self.database.count_recipes_using(self.table, name)
+
+    def remove(self, name: str, callback=None) -> bool:
+        """
+        :param self:
+        :param name: Name exactly as listed
+        :param callback: Optional callable(position), run once the delete is done with the position the name had,
+        or None when a recipe still uses it and it was kept
+        \nQueues the delete of a single name, False when it isn't in the catalog. The database checks whether
+        it's in use in the same transaction as the delete, the names are only updated once it says it's gone.
+        """
+        position = bisect.bisect_left(self.names, name)
+        if position == len(self.names) or self.names[position] != name:
+            return False
+        def removed(done: bool):
+            position = bisect.bisect_left(self.names, name) # Other edits may have moved it while queued
+            if done and position < len(self.names) and self.names[position] == name:
+                del self.names[position]
+                self.members.discard(normalize(name))
+            else:
+                position = None
+            if callback is not None:
+                callback(position)
+        self.__write("remove_ingredient" if self.table == "ingredients" else "remove_tag", name, callback=removed)
+        return True
+
+    def __write(self, operation: str, *args, callback=None):
+        # add() updates the names right away and the row is saved whenever the worker gets to it,
+        # remove() waits for the callback since the delete can be refused
+        if self.worker is not None:
+            self.worker.submit(operation, *args, callback=callback)
+        else:
+            result = getattr(self.database, operation)(*args)
+            if callback is not None:
+                callback(result)
@@ -0,0 +1,267 @@
+"""
+Headless command line for scripts and scheduled jobs, it works on the same GroceryApp.db as the app.
+
+    python -m scripts.CommandLine search "chicken soup"
+    python -m scripts.CommandLine --json shopping-list 12 15:2
+    python -m scripts.CommandLine import recipes.jsonl
+    python -m scripts.CommandLine serve --host 0.0.0.0
+
+Only the database and engine modules are imported, never Qt, so a command starts in milliseconds.
+rapidfuzz is only imported by `search --fuzzy`. Results are printed one row per line with tab separated
+columns, or as json with --json. Exits with 1 when the command fails and 2 on bad arguments.
+"""
+import argparse, json, os, sys
+from scripts import Paths
+from scripts.InfoLogging import configure, LOG_LEVEL_ENV
+
+MEAL_TYPES = ["Breakfast", "Lunch", "Dinner", "Dessert", "Snack"]
+
+class CommandError(Exception):
+    """A command that can't be carried out, the message is printed without a traceback"""
+
+# Output
+def emit(args, rows: list, columns: list[str]):
+    """Prints rows as tab separated lines, or as a json list of objects with --json"""
+    if args.json:
+        json.dump([dict(zip(columns, row)) for row in rows], sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+    for row in rows:
+        print("\t".join("" if value is None else f"{value:g}" if isinstance(value, float) else str(value)
+                        for value in row))
+
+def emit_object(args, value: dict):
+    """Prints one result, as json with --json or as "key: value" lines"""
+    if args.json:
+        json.dump(value, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return
+    for key, item in value.items():
+        print(f"{key}: {json.dumps(item, ensure_ascii=False) if isinstance(item, (dict, list)) else item}")
+
+# Commands
+def search(database, args):
+    if not args.query and not args.ingredient and not args.tag:
+        raise CommandError("give a query, --ingredient or --tag")
+    allowed = None
+    if args.ingredient or args.tag:
+        filtered = database.filter_recipes(args.ingredient, args.tag)
+        if not args.query:
+            return emit(args, [(*row, None) for row in filtered[:args.limit]], ["id", "name", "meal_type", "score"])
+        allowed = {row[0] for row in filtered}
+    if args.fuzzy or args.keyword:
+        from scripts.SearchEngine import RecipeSearchEngine
+        index = database.retrieve_recipe_index()
+        meal_types = {recipe_id: meal_type for recipe_id, _, meal_type in index}
+        engine = RecipeSearchEngine(limit=None)
+        engine.load(index)
+        rows = [(recipe_id, name, meal_types[recipe_id], round(score, 1))
+                for recipe_id, name, score in engine.search(args.query, keyword=args.keyword)
+                if allowed is None or recipe_id in allowed]
+    else:
+        # Full text search, filtered results are searched past the limit so the filter doesn't starve them
+        limit = args.limit if allowed is None else max(args.limit * 20, 1000)
+        rows = [(recipe_id, name, meal_type, round(-score, 3)) for recipe_id, name, meal_type, _, score in
+                database.search_recipes(args.query, args.fields, limit=limit)
+                if allowed is None or recipe_id in allowed]
+    emit(args, rows[:args.limit], ["id", "name", "meal_type", "score"])
+
+def show(database, args):
+    recipe = database.fetch_recipe(args.id)
+    if recipe is None:
+        raise CommandError(f"no recipe with id {args.id}")
+    if args.json:
+        return emit_object(args, recipe.to_dict())
+    print(f"{recipe.name} ({recipe.meal_type})")
+    for line in recipe.ingredients:
+        print("\t".join((line.quantity, line.measurement_unit, line.ingredient)))
+    if recipe.tags:
+        print("tags: " + ", ".join(recipe.tags))
+    if recipe.notes:
+        print(recipe.notes)
+
+def add(database, args):
+    if args.kind == "recipe":
+        from scripts import Units
+        from scripts.ImportExport import recipe_from_record, InvalidRecord
+        lines = []
+        for text in args.ingredient:
+            quantity, unit, name = Units.split_ingredient_line(text)
+            if not name:
+                raise CommandError(f"no ingredient name in {text!r}")
+            lines.append({"ingredient": name, "quantity": quantity, "measurement_unit": unit})
+        try:
+            recipe = recipe_from_record({"name": args.name, "meal_type": args.meal_type, "notes": args.notes,
+                                         "ingredients": lines, "tags": args.tag})
+        except InvalidRecord as e:
+            raise CommandError(str(e))
+        recipe_id = database.bulk_add_recipes([recipe])[0]
+        return emit_object(args, {"id": recipe_id, "name": recipe.name})
+    if args.kind == "ingredient":
+        with database.batch(): # The names and their density are committed together
+            inserted, duplicates = database.bulk_add_ingredients(args.names)
+            if args.density is not None:
+                database.set_ingredient_densities((name, args.density) for name in args.names)
+    else:
+        inserted, duplicates = database.bulk_add_tags(args.names)
+    emit_object(args, {"added": inserted, "already_saved": duplicates})
+
+def import_(database, args):
+    from scripts.ImportExport import import_file
+    report = import_file(database, args.path, args.kind, args.format)
+    emit_object(args, {"kind": report.kind, "read": report.read, "imported": report.imported,
+                       "skipped": report.skipped, "seconds": report.seconds, "errors": report.errors})
+    if report.read and not report.imported:
+        raise CommandError("nothing was imported")
+
+def export(database, args):
+    from scripts.ImportExport import export_file
+    count = export_file(database, args.path, args.kind, args.format)
+    emit_object(args, {"kind": args.kind, "path": os.path.abspath(args.path), "records": count})
+
+def shopping_list(database, args):
+    from scripts.ShoppingList import build_shopping_list
+    plan = {}
+    for entry in args.recipes:
+        recipe_id, _, servings = entry.partition(":")
+        try:
+            recipe_id, servings = int(recipe_id), float(servings or 1)
+        except ValueError:
+            raise CommandError(f"{entry!r} isn't ID or ID:SERVINGS")
+        plan[recipe_id] = plan.get(recipe_id, 0.0) + servings # The same recipe twice adds up, like the tab does
+    emit(args, build_shopping_list(database, plan), ["ingredient", "amount", "unit"])
+
+def backup(database, args):
+    path = database.create_backup(daily=args.daily, weekly=args.weekly)
+    manager = database.backup_manager(args.daily, args.weekly)
+    if path is None and not manager.is_current():
+        raise CommandError("the backup failed, see the log above")
+    emit_object(args, {"written": path, "backups": [path for _, path in manager.backups()]})
+
+def stats(database, args):
+    import scripts.DatabaseManager as DatabaseManager
+    counts = {table: database.db.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+              for table in ("recipes", "ingredients", "tags", "recipe_ingredients", "recipe_tags", "ingested_files")}
+    sizes = {}
+    for suffix in ("", "-wal"):
+        try:
+            sizes["database" + suffix.replace("-", "_")] = os.path.getsize(DatabaseManager.DB_PATH + suffix)
+        except OSError:
+            pass
+    backups = database.backup_manager().backups()
+    emit_object(args, {
+        "path": DatabaseManager.DB_PATH,
+        "schema_version": database.db.execute("PRAGMA user_version").fetchone()[0],
+        "full_text": database.has_full_text(),
+        "rows": counts,
+        "bytes": sizes,
+        "backups": len(backups),
+        "latest_backup": backups[0][1] if backups else None,
+    })
+
+def ingest(database, args):
+    from scripts.Ingestion import ingest_folder
+    report = ingest_folder(database, args.folder, args.workers, batch_size=args.batch_size)
+    emit_object(args, {key: getattr(report, key) for key in report.__slots__})
+    if report.interrupted:
+        raise CommandError("ingestion stopped part way, run it again to resume")
+
+def serve(database, args):
+    from scripts.ApiServer import serve as run_server, TOKEN_ENV
+    run_server(database, args.host, args.port, args.readers, args.token or os.environ.get(TOKEN_ENV) or None)
+
+# Arguments
+def build_parser() -> argparse.ArgumentParser:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument("--json", action="store_true", default=argparse.SUPPRESS, help="Print json")
+    parser = argparse.ArgumentParser(prog="python -m scripts.CommandLine", description="GroceryApp without the window",
+                                     parents=[common])
+    parser.add_argument("--data-dir", help=f"Folder holding the database folder, same as {Paths.DATA_DIR_ENV}")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log information as well as warnings")
+    commands = parser.add_subparsers(dest="command", required=True, metavar="command")
+
+    command = commands.add_parser("search", parents=[common], help="Search recipes")
+    command.add_argument("query", nargs="?", default="")
+    command.add_argument("--fields", nargs="+", default=["name", "notes", "ingredients"],
+                         choices=["name", "notes", "ingredients"], help="Full text fields to search")
+    command.add_argument("--fuzzy", action="store_true", help="Fuzzy name search, like the Edit/View Recipes tab")
+    command.add_argument("--keyword", action="store_true", help="Every query word has to match a word in the name")
+    command.add_argument("--ingredient", action="append", default=[], help="Only recipes using this ingredient")
+    command.add_argument("--tag", action="append", default=[], help="Only recipes with this tag")
+    command.add_argument("--limit", type=int, default=50)
+    command.set_defaults(run=search)
+
+    command = commands.add_parser("show", parents=[common], help="Print one recipe")
+    command.add_argument("id", type=int)
+    command.set_defaults(run=show)
+
+    command = commands.add_parser("add", parents=[common], help="Add a recipe, ingredients or tags")
+    kinds = command.add_subparsers(dest="kind", required=True, metavar="kind")
+    kind = kinds.add_parser("recipe", parents=[common])
+    kind.add_argument("name")
+    kind.add_argument("--meal-type", default="Dinner", choices=MEAL_TYPES)
+    kind.add_argument("--ingredient", action="append", default=[], help='A line like "1 1/2 cups flour"')
+    kind.add_argument("--tag", action="append", default=[])
+    kind.add_argument("--notes", default="")
+    kind = kinds.add_parser("ingredient", parents=[common])
+    kind.add_argument("names", nargs="+")
+    kind.add_argument("--density", type=float, help="Grams per millilitre")
+    kind = kinds.add_parser("tag", parents=[common])
+    kind.add_argument("names", nargs="+")
+    command.set_defaults(run=add)
+
+    for name, run, help_text in (("import", import_, "Import a JSON Lines or CSV file"),
+                                 ("export", export, "Export to a JSON Lines or CSV file")):
+        command = commands.add_parser(name, parents=[common], help=help_text)
+        command.add_argument("path")
+        command.add_argument("--kind", default="recipes", choices=["recipes", "ingredients", "tags"])
+        command.add_argument("--format", choices=["jsonl", "csv"], help="Defaults to the file extension")
+        command.set_defaults(run=run)
+
+    command = commands.add_parser("shopping-list", parents=[common], help="Merged ingredients of some recipes")
+    command.add_argument("recipes", nargs="+", metavar="ID[:SERVINGS]")
+    command.set_defaults(run=shopping_list)
+
+    command = commands.add_parser("backup", parents=[common], help="Back up the database and prune old backups")
+    command.add_argument("--daily", type=int, default=7, help="Days to keep every backup for")
+    command.add_argument("--weekly", type=int, default=4, help="Weeks to keep one backup for after that")
+    command.set_defaults(run=backup)
+
+    command = commands.add_parser("stats", parents=[common], help="Row counts, file sizes and backups")
+    command.set_defaults(run=stats)
+
+    command = commands.add_parser("ingest", parents=[common], help="Ingest a folder of saved recipe pages")
+    command.add_argument("folder")
+    command.add_argument("--workers", type=int, help="Parser processes, defaults to the number of cores")
+    command.add_argument("--batch-size", type=int, default=2000)
+    command.set_defaults(run=ingest)
+
+    command = commands.add_parser("serve", parents=[common], help="Serve the database as a json HTTP API")
+    command.add_argument("--host", default="127.0.0.1", help="0.0.0.0 to let other devices connect")
+    command.add_argument("--port", type=int, default=8080)
+    command.add_argument("--readers", type=int, default=4, help="Threads serving reads")
+    command.add_argument("--token", help="Require this bearer token, defaults to GROCERYAPP_API_TOKEN")
+    command.set_defaults(run=serve)
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    args.json = getattr(args, "json", False)
+    if args.data_dir:
+        os.environ[Paths.DATA_DIR_ENV] = args.data_dir
+    if LOG_LEVEL_ENV not in os.environ:
+        configure("INFO" if args.verbose else "WARNING")
+    # Imported after the data folder is known, DatabaseManager resolves its paths on import
+    import scripts.DatabaseManager as DatabaseManager
+    database = DatabaseManager.DBHandler()
+    try:
+        args.run(database, args)
+    except (CommandError, OSError, ValueError) as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        database.close()
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,111 @@
+import sqlite3, threading
+from scripts.InfoLogging import InfoLogger, ErrorLogger, metrics
+
+info_log = InfoLogger("connections")
+error_log = ErrorLogger("connections")
+
+class ConnectionManager():
+    """
+    Owns every connection to the database file.
+    \nThe database runs in WAL mode so readers never block the writer and the writer never blocks readers.
+    There is one writer connection (used by DBHandler on the GUI thread) and any number of read only
+    connections, one per thread, for background work like searches, backups and aggregation.
+    \nEach connection keeps an LRU of prepared statements (sqlite3's cached_statements), so the same SQL
+    text is only compiled once per connection.
+    """
+    cached_statements = 256 # Prepared statements kept per connection
+    cache_size_kib = 16384 # Page cache per connection
+    mmap_size = 256 * 1024 * 1024 # Bytes of the file read through memory mapping
+    busy_timeout_ms = 5000 # How long a connection waits on a lock before raising
+    def __init__(self, path: str):
+        """
+        :param self:
+        :param path: Database file
+        """
+        self.path = path
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.connections = [] # Every open connection, so close_all can reach the readers of other threads
+        self.write_connection = None
+
+    def __connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(self.path, cached_statements=self.cached_statements,
+                                     timeout=self.busy_timeout_ms / 1000, check_same_thread=False)
+        connection.execute("PRAGMA foreign_keys = ON")
+        connection.execute("PRAGMA synchronous = NORMAL") # Safe with WAL, only the last commits can be lost on power loss
+        connection.execute(f"PRAGMA cache_size = -{self.cache_size_kib}")
+        connection.execute(f"PRAGMA mmap_size = {self.mmap_size}")
+        connection.execute("PRAGMA temp_store = MEMORY")
+        metrics.trace_sql(connection) # Counts statements by kind for the debug panel
+        with self.lock:
+            self.connections.append(connection)
+        return connection
+
+    def writer(self) -> sqlite3.Connection:
+        """Returns the writer connection, opening it and switching the file to WAL the first time"""
+        if self.write_connection is None:
+            connection = self.__connect()
+            mode = connection.execute("PRAGMA journal_mode = WAL").fetchone()[0]
+            if mode.lower() != "wal":
+                info_log.warning("WAL mode unavailable", journal_mode=mode)
+            self.write_connection = connection
+        return self.write_connection
+
+    def reader(self) -> sqlite3.Connection:
+        """
+        :param self:
+        \nReturns the calling thread's read only connection, it's opened on first use and reused after.
+        Only use it from the thread that asked for it.
+        """
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = self.__connect()
+            connection.execute("PRAGMA query_only = ON")
+            self.local.connection = connection
+        return connection
+
+    def close_all(self):
+        """Closes the writer and every reader, the last one to close checkpoints the WAL back into the database"""
+        with self.lock:
+            connections, self.connections = self.connections, []
+        # Readers first so the writer's close can checkpoint
+        for connection in reversed(connections):
+            try:
+                connection.close()
+            except sqlite3.Error as e:
+                error_log.error("Closing a connection failed", e)
+        self.write_connection = None
+        self.local = threading.local()
+
+class BatchConnection():
+    """
+    Stands in for the writer connection while DBHandler.batch() runs several calls in one transaction.
+    \n`with connection:` blocks become savepoints, so a call that fails is undone on its own without losing
+    the rest of the batch, and commit()/rollback() are left to the batch. A statement that fails is already
+    undone by SQLite. Everything else is passed through to the real connection.
+    """
+    def __init__(self, connection: sqlite3.Connection):
+        self.connection = connection
+        self.depth = 0
+
+    def __getattr__(self, name):
+        return getattr(self.connection, name)
+
+    def __enter__(self):
+        self.depth += 1
+        self.connection.execute(f"SAVEPOINT batch_{self.depth}")
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        name = f"batch_{self.depth}"
+        self.depth -= 1
+        if exc_type is not None:
+            self.connection.execute(f"ROLLBACK TO {name}")
+        self.connection.execute(f"RELEASE {name}")
+        return False
+
+    def commit(self):
+        pass # The batch commits once every call has run
+
+    def rollback(self):
+        pass
@@ -1,31 +1,139 @@
-import sqlite3, json, os
-import datetime as dt
+import sqlite3, copy, itertools, json, os, re, time
+from collections.abc import Iterable, Iterator
+from contextlib import contextmanager
+from functools import lru_cache
+from scripts import Units
+from scripts.Backups import BackupManager
+from scripts.Catalog import normalize
+from scripts.ConnectionManager import ConnectionManager, BatchConnection
+from scripts import Paths
+from scripts.Records import Recipe, RECIPE_COLUMNS, decode_json
+from scripts.InfoLogging import InfoLogger, ErrorLogger, metrics, timed
 
-# Move these into a paths file later
-DB_DIR = r".\database"
-BACKUP_DIR = r".\database\backups"
-DB_PATH = os.path.join(DB_DIR, r"GroceryApp.db")
-BACKUP_PATH = os.path.join(BACKUP_DIR, f"GroceryApp_Backup-{dt.datetime.strftime(dt.datetime.now(),"%m-%d-%Y")}.db") 
+info_log = InfoLogger("database")
+error_log = ErrorLogger("database")
+
+# Every ingredient and tag name is normalized here before it's saved or looked up, so callers can pass names
+# as typed. Bulk writes repeat the same few names over and over, each distinct name is only normalized once.
+_normalize = lru_cache(maxsize=65536)(normalize)
+
+DB_DIR = Paths.database_dir()
+BACKUP_DIR = Paths.backup_dir()
+DB_PATH = Paths.database_path()
+
+# Searchable recipe columns and their bm25 weights, a hit in the name counts the most
+FTS_FIELDS = {"name": 10.0, "notes": 1.0, "ingredients": 4.0}
+
+# Ingredient names pulled out of a recipes row's json for the full text index, {0} is the row
+FTS_INGREDIENT_NAMES = """(CASE WHEN json_valid({0}.ingredients) THEN
+    (SELECT group_concat(json_extract(value, '$.ingredient'), ', ') FROM json_each({0}.ingredients))
+END)"""
+FTS_INSERT_TRIGGER = f"""
+    CREATE TRIGGER IF NOT EXISTS recipes_fts_insert AFTER INSERT ON recipes BEGIN
+        INSERT INTO recipes_fts(rowid, name, notes, ingredients)
+        VALUES (new.id, new.name, new.notes, {FTS_INGREDIENT_NAMES.format("new")});
+    END
+"""
+
+# Join tables, these index the ingredients/tags json on the recipe so filtering is a join. {0} is the table name
+# so a migration can build a replacement next to the old one. Deleting a catalog entry a recipe still uses is
+# refused, the recipe's json would keep naming it and the next save would quietly add it back.
+RECIPE_INGREDIENTS_TABLE = """
+    CREATE TABLE IF NOT EXISTS {0}(
+        recipe_id INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE,
+        position INTEGER NOT NULL,
+        ingredient_id INTEGER NOT NULL REFERENCES ingredients(id) ON DELETE RESTRICT,
+        quantity TEXT,
+        unit TEXT,
+        amount REAL,
+        base_amount REAL,
+        dimension TEXT,
+        PRIMARY KEY(recipe_id, position)
+    ) WITHOUT ROWID
+"""
+RECIPE_INGREDIENTS_INDEX = """
+    CREATE INDEX IF NOT EXISTS recipe_ingredients_ingredient_idx
+    ON recipe_ingredients(ingredient_id, recipe_id)
+"""
+RECIPE_TAGS_TABLE = """
+    CREATE TABLE IF NOT EXISTS {0}(
+        recipe_id INTEGER NOT NULL REFERENCES recipes(id) ON DELETE CASCADE,
+        tag_id INTEGER NOT NULL REFERENCES tags(id) ON DELETE RESTRICT,
+        PRIMARY KEY(recipe_id, tag_id)
+    ) WITHOUT ROWID
+"""
+RECIPE_TAGS_INDEX = """
+    CREATE INDEX IF NOT EXISTS recipe_tags_tag_idx
+    ON recipe_tags(tag_id, recipe_id)
+"""
+
+# Bump this and add a step to DBHandler.migrate whenever existing databases need upgrading
+SCHEMA_VERSION = 6
 
 class DBHandler():
     def __init__(self):
-        if not os.path.exists(DB_DIR) or not os.path.exists(BACKUP_DIR):
-            os.makedirs(BACKUP_DIR)
+        Paths.adopt_legacy_database()
+        os.makedirs(BACKUP_DIR, exist_ok=True)
             
-        self.db = sqlite3.connect(DB_PATH)
+        self.connections = ConnectionManager(DB_PATH)
+        self.db = self.connections.writer()
         self.cursor = sqlite3.Cursor(self.db)
         self.ensure_tables()
-        self.create_backup()
+        self.migrate()
+        # Backups are no longer taken here, the window starts them in the background once it's shown
         try:
             # Clears blank entries on load
             self.cursor.execute("""DELETE FROM ingredients WHERE name = ? """,("",))
             self.db.commit()
             if self.cursor.rowcount == 0:
-                            print("No such ingredient found!")
+                info_log.debug("No such ingredient found")
         except sqlite3.Error as e:
-            print(f"Error at blank entry check: {e}")
-            
-        self.__verify_ingredient_ids()
+            error_log.error("Blank entry check failed", e)
+        
+    def reader(self) -> sqlite3.Connection:
+        """
+        :param self:
+        \nRead only connection for the calling thread, lets worker threads query while the GUI thread writes
+        """
+        return self.connections.reader()
+
+    def reading(self) -> "DBHandler":
+        """
+        :param self:
+        \nA copy of this handler whose queries run on the calling thread's read only connection, so the
+        retrieve, page, fetch, search, filter and aggregate methods can be called from worker threads while
+        this handler keeps writing. Writes through the copy fail. Only use it on the thread that made it.
+        """
+        view = copy.copy(self)
+        view.db = self.reader()
+        view.cursor = sqlite3.Cursor(view.db)
+        return view
+
+    def close(self):
+        self.connections.close_all()
+
+    @contextmanager
+    def batch(self):
+        """
+        :param self:
+        \nRuns every call made inside it in one write transaction, so a burst of small edits costs one commit.
+        Each call's own transaction becomes a savepoint (see BatchConnection), a call that raises only undoes
+        itself when the caller catches it. Nothing is visible to other connections until the batch ends.
+        """
+        if isinstance(self.db, BatchConnection):
+            yield self.db # Already batching, the outer batch commits
+            return
+        connection = self.db
+        self.db = BatchConnection(connection)
+        connection.execute("BEGIN IMMEDIATE")
+        try:
+            yield self.db
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            self.db = connection
         
     # Add
     def ensure_tables(self):
@@ -42,7 +150,8 @@ class DBHandler():
         self.cursor.execute("""
                             CREATE TABLE IF NOT EXISTS ingredients(
                                 id INTEGER PRIMARY KEY,
-                                name TEXT NOT NULL UNIQUE
+                                name TEXT NOT NULL UNIQUE,
+                                density REAL
                             )
                             """)
         
@@ -53,179 +162,896 @@ class DBHandler():
             )
         """)
         
+        # Covers name lookups and the (id, name, meal_type) listings without reading the table rows
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS recipes_name_idx
+            ON recipes(name, meal_type)
+        """)
+        # Viewer order, equal names fall back to the rowid stored in the index so keyset paging is an index seek
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS recipes_name_nocase_idx
+            ON recipes(name COLLATE NOCASE)
+        """)
+        
+        # Case insensitive name lookups for the recipe filter
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ingredients_name_nocase_idx
+            ON ingredients(name COLLATE NOCASE)
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS tags_name_nocase_idx
+            ON tags(name COLLATE NOCASE)
+        """)
+        
+        self.cursor.execute(RECIPE_INGREDIENTS_TABLE.format("recipe_ingredients"))
+        self.cursor.execute(RECIPE_INGREDIENTS_INDEX)
+        self.cursor.execute(RECIPE_TAGS_TABLE.format("recipe_tags"))
+        self.cursor.execute(RECIPE_TAGS_INDEX)
+        
+        # Files read by the bulk ingestion, written with their recipes so a rerun skips what was saved
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingested_files(
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                recipes INTEGER NOT NULL,
+                error TEXT,
+                ingested_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        # Which file each ingested recipe came from, so a changed file's recipes can be replaced
+        self.cursor.execute("""
+            CREATE TABLE IF NOT EXISTS ingested_recipes(
+                recipe_id INTEGER PRIMARY KEY REFERENCES recipes(id) ON DELETE CASCADE,
+                path TEXT NOT NULL
+            )
+        """)
+        self.cursor.execute("""
+            CREATE INDEX IF NOT EXISTS ingested_recipes_path_idx
+            ON ingested_recipes(path)
+        """)
+        
         self.db.commit()
         
-    def add_recipe(self, recipe_data: dict):
+    @timed()
+    def migrate(self):
+        """
+        :param self:
+        \nUpgrades an existing database in place. PRAGMA user_version holds the last step that was applied,
+        each step runs in its own transaction so a failed upgrade leaves the previous version intact.
+        The transaction is opened explicitly, sqlite3 would otherwise run the CREATE/ALTER statements on their own.
+        """
+        migrations = [
+            self.__migrate_recipe_links, # 1 - Fill the join tables from the json columns
+            self.__migrate_full_text, # 2 - FTS5 index over names, notes and ingredient names
+            self.__migrate_canonical_quantities, # 3 - Parsed amounts in base units, ingredient densities
+            self.__migrate_restrict_catalog_deletes, # 4 - Catalog entries in use can't be deleted
+            self.__migrate_normalized_names, # 5 - Catalog and recipe names stored normalized
+            self.__migrate_thousands_separators, # 6 - Reparse quantities like "1,000"
+        ]
+        self.cursor.execute("PRAGMA user_version")
+        version = self.cursor.fetchone()[0]
+        if version > SCHEMA_VERSION:
+            info_log.warning("Database schema is newer than this app, skipping migrations", version=version, supported=SCHEMA_VERSION)
+            return
+        for step, migration in enumerate(migrations[version:], start=version + 1):
+            try:
+                started = time.perf_counter()
+                self.cursor.execute("BEGIN IMMEDIATE")
+                migration()
+                self.cursor.execute(f"PRAGMA user_version = {step}")
+                self.db.commit()
+                info_log.info("Database migrated", version=step, ms=round((time.perf_counter() - started) * 1000))
+            except (sqlite3.Error, ValueError, KeyError, TypeError) as e:
+                self.db.rollback()
+                error_log.error("Database migration failed", e, version=step)
+                break
+        
+    @timed()
+    def add_recipe(self, recipe_data: dict) -> int|None:
+        """
+        :param self:
+        \nInserts the recipe and its join rows in one transaction, returns the new recipe id
+        """
         try:
-            ingredient_string = json.dumps(recipe_data["ingredients"])
-            tags = json.dumps(recipe_data["tags"])
+            ingredients = self.__normalize_lines(recipe_data["ingredients"])
+            tags = self.__normalize_tags(recipe_data["tags"])
 
-            self.cursor.execute(
-                "INSERT INTO recipes(name, meal_type, notes, ingredients, tags) VALUES (?,?,?,?,?)",
-                (recipe_data["name"], recipe_data["mealType"], recipe_data["notes"],ingredient_string,tags)
-            )
-            self.db.commit()
+            with self.db:
+                self.cursor.execute(
+                    "INSERT INTO recipes(name, meal_type, notes, ingredients, tags) VALUES (?,?,?,?,?)",
+                    (recipe_data["name"], recipe_data["mealType"], recipe_data["notes"], json.dumps(ingredients), json.dumps(tags))
+                )
+                recipe_id = self.cursor.lastrowid
+                self.__link_recipe(recipe_id, ingredients, tags)
+            return recipe_id
         except sqlite3.IntegrityError as e:
-            print(f"Failed due to {e}")
+            error_log.error("Recipe insert failed", e, name=recipe_data.get("name"))
     
-    def add_ingredients(self, names:list):            
-        for name in names:
-            try:                        
-                self.cursor.execute(
-                    "INSERT INTO ingredients(name) VALUES (?)",
-                        (name,)
-                    )
-                self.db.commit()
-                self.__verify_ingredient_ids()
-            except sqlite3.IntegrityError as e:
-                self.db.rollback()
-                print(f"Failed due to {e}")
-            except sqlite3.ProgrammingError as e:
-                self.db.rollback()
-                print(f"Failed due to {e}")
+    @timed()
+    def bulk_add_recipes(self, recipes: Iterable[Recipe], sources: Iterable[tuple]=()) -> list[int]:
+        """
+        :param self:
+        :param recipes: Validated recipes, their ids are ignored
+        :param sources: (path, size, mtime_ns, recipes, error) of the files the batch was read from, recorded in
+        ingested_files in the same transaction so an interrupted ingestion knows exactly what was saved.
+        The recipes are the sources' recipes in the same order, each source's count says how many are its.
+        Recipes saved from one of these paths before are deleted first, so a changed file replaces them.
+        \nInserts the whole batch in one transaction. Missing ingredients and tags are created with one
+        INSERT OR IGNORE per catalog, and the recipe and join rows are written with executemany.
+        The full text insert trigger decodes every row's json in SQL, so for the batch it's dropped and the
+        index rows are written directly, then it's put back before the transaction commits.
+        \nReturns the new recipe ids in the order given, raises sqlite3.Error after rolling the batch back and
+        ValueError when the sources' counts don't add up to the recipes
+        """
+        recipes = list(recipes)
+        sources = list(sources)
+        if not recipes and not sources:
+            return []
+        source_paths = [path for path, _, _, count, _ in sources for _ in range(count)]
+        if sources and len(source_paths) != len(recipes):
+            raise ValueError(f"The sources list {len(source_paths)} recipes but {len(recipes)} were given")
+        full_text = self.has_full_text()
+        with self.db, metrics.paused_trace(self.db):
+            paths = [source[0] for source in sources]
+            for i in range(0, len(paths), 500): # Stays under SQLite's bound parameter limit
+                chunk = paths[i:i + 500]
+                self.cursor.execute(f"""DELETE FROM recipes WHERE id IN (SELECT recipe_id FROM ingested_recipes
+                                        WHERE path IN ({','.join('?' * len(chunk))}))""", chunk)
+            self.cursor.executemany("""INSERT OR REPLACE INTO ingested_files(path, size, mtime_ns, recipes, error)
+                                       VALUES (?,?,?,?,?)""", sources)
+            if not recipes:
+                return []
+            prepared = [(self.__normalize_lines([line.to_dict() for line in recipe.ingredients]),
+                         self.__normalize_tags(recipe.tags)) for recipe in recipes]
+            ingredient_ids = self.__catalog_ids("ingredients", [line["ingredient"] for lines, _ in prepared
+                                                                for line in lines if line["ingredient"]])
+            tag_ids = self.__catalog_ids("tags", [tag for _, tags in prepared for tag in tags])
+            # Ids are handed out here so the join rows can be built without reading each one back,
+            # sqlite_sequence keeps AUTOINCREMENT from reusing the ids of deleted recipes
+            self.cursor.execute("""SELECT MAX(COALESCE((SELECT MAX(id) FROM recipes), 0),
+                                              COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'recipes'), 0))""")
+            first_id = self.cursor.fetchone()[0] + 1
+            recipe_rows, fts_rows, line_rows, tag_rows = [], [], [], []
+            for recipe_id, recipe, (ingredients, tags) in zip(itertools.count(first_id), recipes, prepared):
+                recipe_rows.append((recipe_id, recipe.name, recipe.meal_type, recipe.notes,
+                                    json.dumps(ingredients), json.dumps(tags)))
+                fts_rows.append((recipe_id, recipe.name, recipe.notes,
+                                 ", ".join(line["ingredient"] for line in ingredients) or None))
+                lines, links = self.__link_rows(recipe_id, ingredients, tags, ingredient_ids, tag_ids)
+                line_rows.extend(lines)
+                tag_rows.extend(links)
+            if full_text:
+                self.cursor.execute("DROP TRIGGER IF EXISTS recipes_fts_insert")
+            self.cursor.executemany("INSERT INTO recipes(id, name, meal_type, notes, ingredients, tags) VALUES (?,?,?,?,?,?)",
+                                    recipe_rows)
+            if full_text:
+                self.cursor.executemany("INSERT INTO recipes_fts(rowid, name, notes, ingredients) VALUES (?,?,?,?)", fts_rows)
+                self.cursor.execute(FTS_INSERT_TRIGGER)
+            self.__insert_links(line_rows, tag_rows)
+            if sources:
+                self.cursor.executemany("INSERT INTO ingested_recipes(recipe_id, path) VALUES (?,?)",
+                                        zip((row[0] for row in recipe_rows), source_paths))
+            metrics.count_sql("INSERT", len(recipe_rows) + len(fts_rows) * full_text + len(line_rows) + len(tag_rows))
+        return [row[0] for row in recipe_rows]
+
+    def ingested_files(self) -> dict[str, tuple[int, int]]:
+        """
+        :param self:
+        \nReturns path -> (size, mtime_ns) of every file ingested without an error, see scripts/Ingestion.py
+        """
+        self.cursor.execute("SELECT path, size, mtime_ns FROM ingested_files WHERE error IS NULL")
+        return {path: (size, mtime_ns) for path, size, mtime_ns in self.cursor.fetchall()}
+
+    def add_ingredients(self, names:list):
+        """Add a batch of ingredients"""
+        self.bulk_add_ingredients(names)
                 
     def add_tags(self, names: list):
         """Add a batch of tags"""
-        for name in names:
-            try:
-                self.cursor.execute(
-                    "INSERT INTO tags(name) VALUES (?)",
-                    (name,)
-                )
-                self.db.commit()
-                self.__verify_tag_ids()
-            except sqlite3.IntegrityError as e:
-                self.db.rollback()
-                print(f"Failed due to {e}")
-            except sqlite3.ProgrammingError as e:
-                self.db.rollback()
-                print(f"Failed due to {e}")
+        self.bulk_add_tags(names)
+        
+    @timed()
+    def bulk_add_ingredients(self, names: Iterable[str]) -> tuple[list[str], list[str]]:
+        """
+        :param self:
+        :param names: Any iterable of ingredient names, they're normalized and blank names are skipped
+        \nInserts every name in a single transaction and returns (inserted, duplicates) as normalized names
+        """
+        return self.__bulk_add_names("ingredients", names)
+    
+    @timed()
+    def bulk_add_tags(self, names: Iterable[str]) -> tuple[list[str], list[str]]:
+        """
+        :param self:
+        :param names: Any iterable of tag names, they're normalized and blank names are skipped
+        \nInserts every name in a single transaction and returns (inserted, duplicates) as normalized names
+        """
+        return self.__bulk_add_names("tags", names)
                 
     # Retrieval
+    @timed()
     def retrieve_recipes(self):
         try:
             self.cursor.execute("SELECT * FROM recipes")
             results = self.cursor.fetchall()
             return results
         except Exception as e:
-            print(f"Recipe retrieval failed!\nReason: {e}")
+            error_log.error("Recipe retrieval failed", e)
             return []
     
-    def retrieve_ingredients(self)->list|None:
-        self.__verify_ingredient_ids()
+    @timed()
+    def retrieve_ingredients(self, with_ordinals: bool=False)->list|None:
+        """
+        :param self:
+        :param with_ordinals: Appends a dense 1..n display ordinal to each row
+        \nIds are stable and can have gaps, the ordinal is only computed for display
+        """
         try:
-            self.cursor.execute("SELECT * FROM ingredients")
+            self.cursor.execute(self.__select_names("ingredients", with_ordinals))
             results = self.cursor.fetchall()
             return results
         except Exception as e:
-            print(e)
+            error_log.error("Ingredient retrieval failed", e)
             
-    def retrieve_tags(self):
-        self.__verify_tag_ids()
+    @timed()
+    def retrieve_tags(self, with_ordinals: bool=False):
+        """
+        :param self:
+        :param with_ordinals: Appends a dense 1..n display ordinal to each row
+        """
         try:
-            self.cursor.execute("SELECT * FROM tags")
+            self.cursor.execute(self.__select_names("tags", with_ordinals))
             return self.cursor.fetchall()
         except Exception as e:
-            print(f"Failed to retrieve tags: {e}")
+            error_log.error("Tag retrieval failed", e)
             return []
         
-    def fetch_entry_data(self, entry_name:str):
+    @timed()
+    def read_startup_data(self) -> dict[str, list]:
+        """
+        :param self:
+        \nEverything the window needs after start up, read on the calling thread's reader so it can run in the
+        background while the GUI thread keeps the writer. Returns the lists of rows keyed by
+        "recipes" (id, name, meal_type), "ingredients" (id, name) and "tags" (id, name)
+        """
+        reader = self.reader()
+        reader.execute("BEGIN") # One read transaction so all three lists come from the same snapshot
         try:
-            self.cursor.execute("SELECT * FROM recipes WHERE name=?",(entry_name,))
-            result = self.cursor.fetchone()
-            self.db.commit()
-            return result
-        except Exception as e:
-            print(e)
-            return str(e)
+            return {
+                "recipes": reader.execute("SELECT id, name, meal_type FROM recipes").fetchall(),
+                "ingredients": reader.execute(self.__select_names("ingredients", False)).fetchall(),
+                "tags": reader.execute(self.__select_names("tags", False)).fetchall(),
+            }
+        finally:
+            reader.rollback()
         
-    # Remove
-    def remove_ingredient(self, ingredient_name):
+    @timed()
+    def retrieve_recipe_index(self) -> list:
+        """
+        :param self:
+        \nReturns (id, name, meal_type) for every recipe, read from the name index without touching the table rows
+        """
         try:
-            self.cursor.execute("""DELETE FROM ingredients WHERE name = ? """,(ingredient_name,))
-            self.db.commit()
-            self.__verify_ingredient_ids()
-            if self.cursor.rowcount == 0:
-                print("No such ingredient found!")
+            self.cursor.execute("SELECT id, name, meal_type FROM recipes")
+            return self.cursor.fetchall()
         except sqlite3.Error as e:
-            print(f"Error at remove_ingredient definition: {e}")
-            self.db.rollback()
-            
-    def remove_tag(self, tag_name):
-        """Remove a tag by name"""
+            error_log.error("Recipe index retrieval failed", e)
+            return []
+        
+    @timed()
+    def page_recipes(self, after: tuple[str, int]|None=None, limit: int=500) -> list:
+        """
+        :param self:
+        :param after: (name, id) of the last row already loaded, None starts from the top
+        :param limit: Rows per page
+        \nReturns the next (id, name) rows in viewer order (name without case, then id). Pages continue from the
+        last key instead of using OFFSET so every page is a seek on recipes_name_nocase_idx, however deep it is.
+        """
         try:
-            self.cursor.execute("DELETE FROM tags WHERE name = ?", (tag_name,))
-            self.db.commit()
-            self.__verify_tag_ids()
-            if self.cursor.rowcount == 0:
-                print(f"No such tag found: {tag_name}")
+            if after is None:
+                self.cursor.execute("SELECT id, name FROM recipes ORDER BY name COLLATE NOCASE, id LIMIT ?", (limit,))
+            else:
+                # The plain >= gives the planner a range to seek to, the row value comparison then skips equal names up to the id
+                self.cursor.execute("""SELECT id, name FROM recipes
+                                       WHERE name COLLATE NOCASE >= ? AND (name COLLATE NOCASE, id) > (?, ?)
+                                       ORDER BY name COLLATE NOCASE, id LIMIT ?""", (after[0], *after, limit))
+            return self.cursor.fetchall()
         except sqlite3.Error as e:
-            print(f"Failed to remove tag '{tag_name}': {e}")
-            
-    def remove_recipe(self, recipe_name):
-        """Remove a recipe by name"""
-        print(recipe_name)
+            error_log.error("Recipe page retrieval failed", e, after=after)
+            return []
+        
+    @timed()
+    def page_catalog(self, table: str, after: int=0, limit: int=500) -> list:
+        """
+        :param self:
+        :param table: "ingredients" or "tags"
+        :param after: Id of the last row already loaded, 0 starts from the top
+        \nReturns the next (id, name) rows by id, ingredients also have their density
+        """
+        if table not in ("ingredients", "tags"):
+            raise ValueError(f"Unknown catalog {table}")
+        columns = "id, name, density" if table == "ingredients" else "id, name"
         try:
-            self.cursor.execute("DELETE FROM recipes WHERE name = ?", (recipe_name,))
-            self.db.commit()
-            self.__verify_tag_ids()
+            self.cursor.execute(f"SELECT {columns} FROM {table} WHERE id > ? ORDER BY id LIMIT ?", (after, limit))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            error_log.error("Catalog page retrieval failed", e, table=table, after=after)
+            return []
+        
+    @timed()
+    def fetch_recipe(self, recipe_id: int) -> Recipe|None:
+        """
+        :param self:
+        :param recipe_id: Primary key of the recipe
+        \nReturns the recipe with its ingredients and tags decoded, None if it doesn't exist or can't be read
+        """
+        try:
+            cursor = self.db.cursor()
+            cursor.row_factory = sqlite3.Row # Columns are read by name, not position
+            row = cursor.execute(f"SELECT {RECIPE_COLUMNS} FROM recipes WHERE id=?", (recipe_id,)).fetchone()
+            return Recipe.from_row(row) if row is not None else None
+        except (sqlite3.Error, ValueError) as e:
+            error_log.error("Recipe could not be read", e, recipe_id=recipe_id)
+            return None
+        
+    def iter_recipes(self, batch_size: int=1000) -> Iterator[Recipe]:
+        """
+        :param self:
+        :param batch_size: Rows fetched from SQLite at a time
+        \nYields every recipe in id order from one read snapshot on the calling thread's reader, only one batch
+        is held in memory. Rows that can't be decoded are logged and skipped.
+        """
+        for row in self.__stream(f"SELECT {RECIPE_COLUMNS} FROM recipes ORDER BY id", batch_size):
+            try:
+                yield Recipe.from_row(row)
+            except ValueError as e:
+                error_log.error("Recipe could not be read", e, recipe_id=row["id"])
+                
+    def iter_ingredients(self, batch_size: int=1000) -> Iterator[sqlite3.Row]:
+        """Yields (name, density) rows in id order, see iter_recipes"""
+        return self.__stream("SELECT name, density FROM ingredients ORDER BY id", batch_size)
+    
+    def iter_tags(self, batch_size: int=1000) -> Iterator[sqlite3.Row]:
+        """Yields (name,) rows in id order, see iter_recipes"""
+        return self.__stream("SELECT name FROM tags ORDER BY id", batch_size)
+        
+    @timed()
+    def find_recipe_ids(self, recipe_name: str) -> list[int]:
+        """
+        :param self:
+        :param recipe_name: Exact recipe name
+        \nNames aren't unique so this returns every matching id, the lookup only reads the name index
+        """
+        try:
+            self.cursor.execute("SELECT id FROM recipes WHERE name=? ORDER BY id", (recipe_name,))
+            return [row[0] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            error_log.error("Recipe id lookup failed", e, name=recipe_name)
+            return []
+        
+    @timed()
+    def search_recipes(self, query: str, fields: Iterable[str]=("name", "notes", "ingredients"),
+                       limit: int=50, markers: tuple[str, str]=("[", "]")) -> list:
+        """
+        :param self:
+        :param query: Words to look for, each word also matches as a prefix
+        :param fields: Any of name, notes and ingredients
+        :param markers: Text put around matched words in the snippet
+        \nReturns (id, name, meal_type, snippet, score) ranked by bm25, best match first
+        """
+        fields = [field for field in fields if field in FTS_FIELDS]
+        words = re.findall(r"\w+", query)
+        if not fields or not words:
+            return []
+        if not self.has_full_text():
+            return self.__search_recipes_like(words, fields, limit)
+        
+        # Every word is quoted so user input can't be read as FTS syntax
+        match = "{" + " ".join(fields) + "} : (" + " ".join(f'"{word}"*' for word in words) + ")"
+        weights = ", ".join(str(FTS_FIELDS[field]) for field in FTS_FIELDS)
+        try:
+            self.cursor.execute(f"""
+                SELECT r.id, r.name, r.meal_type,
+                       snippet(recipes_fts, -1, ?, ?, '...', 12),
+                       bm25(recipes_fts, {weights}) AS score
+                FROM recipes_fts JOIN recipes r ON r.id = recipes_fts.rowid
+                WHERE recipes_fts MATCH ?
+                ORDER BY score LIMIT ?
+            """, (markers[0], markers[1], match, limit))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            error_log.error("Full text search failed", e, query=query)
+            return []
+        
+    @timed()
+    def aggregate_ingredients(self, plan: dict[int, float]) -> list:
+        """
+        :param self:
+        :param plan: recipe id -> serving multiplier
+        \nSums every ingredient across the planned recipes in one GROUP BY over the base amounts stored at save time,
+        so oz, g and lbs of the same ingredient add up. Volumes become mass when the ingredient has a density.
+        Unknown units are summed per unit.
+        \nThe plan is passed as one json array and read with json_each, so nothing is written and the query
+        also runs on a read only connection. The CROSS JOIN keeps the plan as the outer loop, SQLite has no
+        statistics for it and would otherwise scan every recipe_ingredients row looking for the planned recipes.
+        \nReturns (ingredient name, dimension or None, unit, total, recipe count) sorted by name
+        """
+        if not plan:
+            return []
+        try:
+            self.cursor.execute("""
+                WITH plan(recipe_id, multiplier) AS MATERIALIZED (
+                    SELECT value ->> 0, value ->> 1 FROM json_each(?)
+                )
+                SELECT name, dimension, raw_unit, SUM(total), COUNT(DISTINCT recipe_id) FROM (
+                    SELECT ri.ingredient_id, i.name, ri.recipe_id,
+                           CASE WHEN ri.dimension = 'volume' AND i.density IS NOT NULL THEN 'mass' ELSE ri.dimension END AS dimension,
+                           CASE WHEN ri.dimension IS NULL THEN lower(trim(ri.unit)) END AS raw_unit,
+                           COALESCE(ri.base_amount, 0) * p.multiplier
+                               * (CASE WHEN ri.dimension = 'volume' AND i.density IS NOT NULL THEN i.density ELSE 1 END) AS total
+                    FROM plan p
+                    CROSS JOIN recipe_ingredients ri ON ri.recipe_id = p.recipe_id
+                    JOIN ingredients i ON i.id = ri.ingredient_id
+                )
+                GROUP BY ingredient_id, dimension, raw_unit
+                ORDER BY name
+            """, (json.dumps([[int(recipe_id), float(multiplier)] for recipe_id, multiplier in plan.items()]),))
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            error_log.error("Shopping list aggregation failed", e)
+            return []
+        
+    @timed()
+    def set_ingredient_density(self, ingredient_name: str, density: float|None):
+        """
+        :param self:
+        :param density: Grams per millilitre, None clears it
+        \nWith a density the shopping list converts volumes of this ingredient to mass
+        """
+        try:
+            with self.db:
+                self.cursor.execute("UPDATE ingredients SET density = ? WHERE name = ?", (density, _normalize(ingredient_name)))
             if self.cursor.rowcount == 0:
-                print(f"No such recipe found: {recipe_name}")
+                info_log.debug("No such ingredient found", ingredient=ingredient_name)
         except sqlite3.Error as e:
-            print(f"Failed to remove recipe '{recipe_name}': {e}")
-            
-    # Update
-    def __verify_ingredient_ids(self):
+            error_log.error("Setting density failed", e, ingredient=ingredient_name)
+        
+    @timed()
+    def set_ingredient_densities(self, densities: Iterable[tuple[str, float|None]]):
+        """
+        :param self:
+        :param densities: (ingredient name, grams per millilitre) pairs
+        \nSets every density with one executemany in one transaction, raises sqlite3.Error after rolling back
         """
-        Docstring for __verify_ingredient_ids
+        with self.db:
+            self.cursor.executemany("UPDATE ingredients SET density = ? WHERE name = ?",
+                                    ((density, _normalize(name)) for name, density in densities))
         
-        :param self: Ensures that there are no gaps in the ingredient ids
+    def has_full_text(self) -> bool:
+        self.cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'recipes_fts'")
+        return self.cursor.fetchone() is not None
+        
+    @timed()
+    def filter_recipes(self, ingredients: Iterable[str]=(), tags: Iterable[str]=()) -> list:
         """
-        self.cursor.execute("SELECT id FROM ingredients")
-        ids = self.cursor.fetchall()
-        for i, id in enumerate(ids):
-            if i+1 != id[0]:
-                self.cursor.execute(
-                    "UPDATE ingredients SET id = ? WHERE id = ?",
-                    (i+1, id[0])
-                    )
-        self.db.commit()
+        :param self:
+        :param ingredients: Ingredient names the recipe has to use
+        :param tags: Tag names the recipe has to have
+        \nReturns (id, name, meal_type) for recipes matching ALL of the given names, sorted by name.
+        Names are compared ignoring case, so "salt" also finds recipes saved with "Salt".
+        """
+        queries = []
+        params = []
+        for name in map(_normalize, ingredients):
+            queries.append("""SELECT ri.recipe_id FROM recipe_ingredients ri
+                              JOIN ingredients i ON i.id = ri.ingredient_id WHERE i.name = ? COLLATE NOCASE""")
+            params.append(name)
+        for name in map(_normalize, tags):
+            queries.append("""SELECT rt.recipe_id FROM recipe_tags rt
+                              JOIN tags t ON t.id = rt.tag_id WHERE t.name = ? COLLATE NOCASE""")
+            params.append(name)
+        if not queries:
+            return []
+        try:
+            self.cursor.execute(f"""SELECT id, name, meal_type FROM recipes
+                                    WHERE id IN ({" INTERSECT ".join(queries)}) ORDER BY name""", params)
+            return self.cursor.fetchall()
+        except sqlite3.Error as e:
+            error_log.error("Recipe filter failed", e)
+            return []
         
-    def __verify_tag_ids(self):
+    def count_recipes_using(self, table: str, name: str) -> int:
+        """
+        :param self:
+        :param table: "ingredients" or "tags"
+        \nNumber of recipes that use the ingredient or tag called name
         """
-        Docstring for __verify_tag_ids
+        if table == "ingredients":
+            sql = """SELECT COUNT(DISTINCT ri.recipe_id) FROM recipe_ingredients ri
+                     JOIN ingredients i ON i.id = ri.ingredient_id WHERE i.name = ?"""
+        elif table == "tags":
+            sql = "SELECT COUNT(*) FROM recipe_tags rt JOIN tags t ON t.id = rt.tag_id WHERE t.name = ?"
+        else:
+            raise ValueError(f"Unknown catalog table: {table}")
+        self.cursor.execute(sql, (_normalize(name),))
+        return self.cursor.fetchone()[0]
         
-        :param self: Ensures that there are no gaps in the ingredient ids
+    # Remove
+    @timed()
+    def remove_ingredient(self, ingredient_name) -> bool:
         """
-        self.cursor.execute("SELECT id FROM tags")
-        ids = self.cursor.fetchall()
-        for i, id in enumerate(ids):
-            if i+1 != id[0]:
-                self.cursor.execute(
-                    "UPDATE ingredients SET id = ? WHERE id = ?",
-                    (i+1, id[0])
-                    )
-        self.db.commit()
-
+        :param self:
+        \nRemove an ingredient by name. Refused while a recipe still uses it, returns True when it was removed
+        """
+        return self.__remove_name("ingredients", ingredient_name)
+            
+    @timed()
+    def remove_tag(self, tag_name) -> bool:
+        """
+        :param self:
+        \nRemove a tag by name. Refused while a recipe still has it, returns True when it was removed
+        """
+        return self.__remove_name("tags", tag_name)
+            
+    @timed()
+    def remove_recipe(self, recipe_id: int):
+        """Remove a recipe by id, its join rows are removed by the foreign keys"""
+        try:
+            self.cursor.execute("DELETE FROM recipes WHERE id = ?", (recipe_id,))
+            if self.cursor.rowcount == 0:
+                info_log.debug("No such recipe found", recipe_id=recipe_id)
+            self.db.commit()
+        except sqlite3.Error as e:
+            error_log.error("Recipe removal failed", e, recipe_id=recipe_id)
+            self.db.rollback()
+            
+    # Update
+    @timed()
     def update_recipe(self, recipe_data: dict):
-        ingredients = json.dumps(recipe_data["ingredients"])
-        tags = json.dumps(recipe_data["tags"])
+        ingredients = self.__normalize_lines(recipe_data["ingredients"])
+        tags = self.__normalize_tags(recipe_data["tags"])
         with self.db:
             self.cursor.execute("UPDATE recipes SET name=?, meal_type=?, notes=?, ingredients=?, tags=? WHERE id=?",
                             (recipe_data["name"], recipe_data["mealType"], recipe_data["notes"], 
-                             ingredients, tags, recipe_data["id"]))
+                             json.dumps(ingredients), json.dumps(tags), recipe_data["id"]))
+            self.__link_recipe(recipe_data["id"], ingredients, tags)
             
-    # Back up
-    def create_backup(self):
-        """        
+    # Helpers
+    def __remove_name(self, table: str, name: str) -> bool:
+        """
         :param self:
-        \nThis is pretty simple for now, I might add better backups in the future
+        \nShared delete for the ingredient/tag catalogs, the usage check and the delete share one transaction
         """
+        name = _normalize(name)
         try:
+            with self.db:
+                uses = self.count_recipes_using(table, name)
+                if uses:
+                    info_log.warning("Catalog entry still in use, not removed", table=table, name=name, recipes=uses)
+                    return False
+                self.cursor.execute(f"DELETE FROM {table} WHERE name = ?", (name,))
+                removed = self.cursor.rowcount > 0
+            if not removed:
+                info_log.debug("No such catalog entry found", table=table, name=name)
+            return removed
+        except sqlite3.Error as e:
+            error_log.error("Catalog removal failed", e, table=table, name=name)
+            return False
+
+    def __normalize_lines(self, ingredients: list) -> list:
+        """Copies of the ingredient lines with their names normalized"""
+        return [{**line, "ingredient": _normalize(line["ingredient"])} if isinstance(line.get("ingredient"), str) else line
+                for line in ingredients]
+
+    def __normalize_tags(self, tags: Iterable[str]) -> list[str]:
+        """Normalized tag names in their first order, blanks and repeats are dropped"""
+        return list(dict.fromkeys(name for name in (_normalize(tag) for tag in tags if isinstance(tag, str)) if name))
+
+    def __link_recipe(self, recipe_id: int, ingredients: list, tags: list):
+        """
+        :param self:
+        \nRewrites the join rows for one recipe, any names missing from the catalogs are added to them.
+        Must be called inside the caller's transaction.
+        """
+        self.cursor.execute("DELETE FROM recipe_ingredients WHERE recipe_id = ?", (recipe_id,))
+        self.cursor.execute("DELETE FROM recipe_tags WHERE recipe_id = ?", (recipe_id,))
+        
+        ingredient_ids = self.__catalog_ids("ingredients", [line["ingredient"] for line in ingredients if line.get("ingredient")])
+        tag_ids = self.__catalog_ids("tags", [tag for tag in tags if tag])
+        self.__insert_links(*self.__link_rows(recipe_id, ingredients, tags, ingredient_ids, tag_ids))
+        
+    def __link_rows(self, recipe_id: int, ingredients: list, tags: list, ingredient_ids: dict[str, int],
+                    tag_ids: dict[str, int]) -> tuple[list, list]:
+        """
+        :param self:
+        \nBuilds the recipe_ingredients and recipe_tags rows for one recipe, blank names are left out
+        """
+        line_rows = []
+        for position, line in enumerate(line for line in ingredients if line.get("ingredient")):
+            # Parsed once here so aggregation never has to read the quantity text again
+            amount, base_amount, dimension = Units.to_base(line.get("quantity"), line.get("measurement_unit"))
+            line_rows.append((recipe_id, position, ingredient_ids[line["ingredient"]], line.get("quantity"),
+                              line.get("measurement_unit"), amount, base_amount, dimension))
+        tag_rows = [(recipe_id, tag_ids[tag]) for tag in tags if tag]
+        return line_rows, tag_rows
+    
+    def __insert_links(self, line_rows: list, tag_rows: list):
+        self.cursor.executemany(
+            """INSERT INTO recipe_ingredients(recipe_id, position, ingredient_id, quantity, unit, amount, base_amount, dimension)
+               VALUES (?,?,?,?,?,?,?,?)""",
+            line_rows
+        )
+        self.cursor.executemany("INSERT OR IGNORE INTO recipe_tags(recipe_id, tag_id) VALUES (?,?)", tag_rows)
+        
+    def __catalog_ids(self, table: str, names: list[str]) -> dict[str, int]:
+        """
+        :param self:
+        \nMaps names to catalog ids, inserting the ones that don't exist yet
+        """
+        ids = {}
+        unique = list(dict.fromkeys(names))
+        self.cursor.executemany(f"INSERT OR IGNORE INTO {table}(name) VALUES (?)", ((name,) for name in unique))
+        chunk_size = 500 # Stays under SQLite's bound parameter limit
+        for i in range(0, len(unique), chunk_size):
+            chunk = unique[i:i + chunk_size]
+            self.cursor.execute(f"SELECT name, id FROM {table} WHERE name IN ({','.join('?' * len(chunk))})", chunk)
+            ids.update(self.cursor.fetchall())
+        return ids
+    
+    def __stream(self, sql: str, batch_size: int) -> Iterator[sqlite3.Row]:
+        """
+        :param self:
+        \nRuns the select inside one read transaction on the reader and yields its rows a batch at a time,
+        the transaction ends when the generator is exhausted or closed
+        """
+        reader = self.reader()
+        cursor = reader.cursor()
+        cursor.row_factory = sqlite3.Row
+        reader.execute("BEGIN")
+        try:
+            cursor.execute(sql)
+            while rows := cursor.fetchmany(batch_size):
+                yield from rows
+        finally:
+            cursor.close()
+            reader.rollback()
+    
+    def __search_recipes_like(self, words: list[str], fields: list[str], limit: int) -> list:
+        """
+        :param self:
+        \nFallback for SQLite builds without FTS5, every word has to appear in one of the fields
+        """
+        columns = {"name": "name", "notes": "notes", "ingredients": "ingredients"}
+        conditions = []
+        params = []
+        for word in words:
+            conditions.append("(" + " OR ".join(f"{columns[field]} LIKE ?" for field in fields) + ")")
+            params.extend([f"%{word}%"] * len(fields))
+        self.cursor.execute(f"""SELECT id, name, meal_type, '', 0 FROM recipes
+                                WHERE {" AND ".join(conditions)} ORDER BY name LIMIT ?""", (*params, limit))
+        return self.cursor.fetchall()
+    
+    def __migrate_recipe_links(self):
+        """
+        :param self:
+        \nSchema 1 - Fills recipe_ingredients/recipe_tags from the json columns of existing recipes
+        """
+        self.__relink_recipes(self.db.execute("SELECT id, ingredients, tags FROM recipes").fetchall())
+
+    def __relink_recipes(self, rows: list):
+        """
+        :param self:
+        \nRewrites the join rows of (id, ingredients json, tags json) recipe rows, recipes with unreadable json are skipped
+        """
+        for recipe_id, ingredients, tags in rows:
+            try:
+                ingredients = decode_json(ingredients)
+                tags = decode_json(tags)
+            except ValueError as e:
+                info_log.warning("Skipping recipe with unreadable data during migration", recipe_id=recipe_id, reason=str(e))
+                continue
+            self.__link_recipe(recipe_id, ingredients, tags)
             
-            dest_conn = sqlite3.connect(BACKUP_PATH)
+    def __migrate_canonical_quantities(self):
+        """
+        :param self:
+        \nSchema 3 - Adds the parsed amount, base unit amount and dimension to recipe_ingredients and an optional
+        density (g/ml) to ingredients, then parses the quantities that are already saved
+        """
+        # New databases already get these columns from ensure_tables
+        self.__add_column("recipe_ingredients", "amount", "REAL")
+        self.__add_column("recipe_ingredients", "base_amount", "REAL")
+        self.__add_column("recipe_ingredients", "dimension", "TEXT")
+        self.__add_column("ingredients", "density", "REAL")
+        rows = self.db.execute("SELECT recipe_id, position, quantity, unit FROM recipe_ingredients").fetchall()
+        self.cursor.executemany(
+            "UPDATE recipe_ingredients SET amount = ?, base_amount = ?, dimension = ? WHERE recipe_id = ? AND position = ?",
+            ((*Units.to_base(quantity, unit), recipe_id, position) for recipe_id, position, quantity, unit in rows)
+        )
+        
+    def __migrate_thousands_separators(self):
+        """
+        :param self:
+        \nSchema 6 - Quantities with a comma are parsed again, "1,000" used to be read as 1 instead of 1000
+        """
+        rows = self.db.execute("SELECT recipe_id, position, quantity, unit FROM recipe_ingredients WHERE quantity LIKE '%,%'").fetchall()
+        self.cursor.executemany(
+            "UPDATE recipe_ingredients SET amount = ?, base_amount = ?, dimension = ? WHERE recipe_id = ? AND position = ?",
+            ((*Units.to_base(quantity, unit), recipe_id, position) for recipe_id, position, quantity, unit in rows)
+        )
+        
+    def __add_column(self, table: str, column: str, declaration: str):
+        columns = {row[1] for row in self.db.execute(f"PRAGMA table_info({table})")}
+        if column not in columns:
+            self.cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {declaration}")
+        
+    def __migrate_full_text(self):
+        """
+        :param self:
+        \nSchema 2 - FTS5 table kept in sync by triggers on recipes. Only the ingredient names are indexed,
+        not the json around them. Skipped if this SQLite build doesn't have FTS5, searches then use LIKE.
+        """
+        try:
+            self.cursor.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS recipes_fts
+                USING fts5(name, notes, ingredients, tokenize = 'unicode61 remove_diacritics 2')
+            """)
+        except sqlite3.OperationalError as e:
+            info_log.warning("Full text search unavailable", reason=str(e))
+            return
+        
+        self.cursor.execute(FTS_INSERT_TRIGGER)
+        self.cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS recipes_fts_delete AFTER DELETE ON recipes BEGIN
+                DELETE FROM recipes_fts WHERE rowid = old.id;
+            END
+        """)
+        self.cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS recipes_fts_update AFTER UPDATE OF name, notes, ingredients ON recipes BEGIN
+                UPDATE recipes_fts SET name = new.name, notes = new.notes, ingredients = {FTS_INGREDIENT_NAMES.format("new")}
+                WHERE rowid = old.id;
+            END
+        """)
+        self.cursor.execute("DELETE FROM recipes_fts")
+        self.cursor.execute(f"""
+            INSERT INTO recipes_fts(rowid, name, notes, ingredients)
+            SELECT id, name, notes, {FTS_INGREDIENT_NAMES.format("recipes")} FROM recipes
+        """)
+        
+    def __migrate_restrict_catalog_deletes(self):
+        """
+        :param self:
+        \nSchema 4 - Rebuilds the join tables with ON DELETE RESTRICT on the ingredient and tag ids, deleting a
+        catalog entry used to cascade and drop the recipe's join rows while its json still named the entry.
+        Recipes that already lost join rows that way are relinked, which puts the missing entries back.
+        """
+        for table, create, index in (("recipe_ingredients", RECIPE_INGREDIENTS_TABLE, RECIPE_INGREDIENTS_INDEX),
+                                     ("recipe_tags", RECIPE_TAGS_TABLE, RECIPE_TAGS_INDEX)):
+            self.cursor.execute(f"DROP TABLE IF EXISTS {table}_new")
+            self.cursor.execute(create.format(f"{table}_new"))
+            columns = ", ".join(row[1] for row in self.db.execute(f"PRAGMA table_info({table}_new)"))
+            self.cursor.execute(f"INSERT INTO {table}_new({columns}) SELECT {columns} FROM {table}")
+            self.cursor.execute(f"DROP TABLE {table}")
+            self.cursor.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+            self.cursor.execute(index)
+        rows = self.db.execute("""
+            SELECT id, ingredients, tags FROM recipes r
+            WHERE json_valid(r.ingredients) AND json_valid(r.tags) AND (
+                (SELECT COUNT(*) FROM json_each(r.ingredients)
+                 WHERE type = 'object' AND COALESCE(value ->> 'ingredient', '') != '')
+                    != (SELECT COUNT(*) FROM recipe_ingredients WHERE recipe_id = r.id)
+                OR (SELECT COUNT(DISTINCT value) FROM json_each(r.tags) WHERE COALESCE(value, '') != '')
+                    != (SELECT COUNT(*) FROM recipe_tags WHERE recipe_id = r.id)
+            )
+        """).fetchall()
+        if rows:
+            info_log.info("Relinking recipes that lost catalog entries", recipes=len(rows))
+        self.__relink_recipes(rows)
+        
+    def __migrate_normalized_names(self):
+        """
+        :param self:
+        \nSchema 5 - Normalizes the catalog names and the names in the recipe json the way Catalog.normalize does.
+        Older versions saved them as typed, so an import of "salt" added a second entry next to "Salt".
+        Entries that only differed by case or spacing are merged into one.
+        """
+        for table, links, column in (("ingredients", "recipe_ingredients", "ingredient_id"),
+                                     ("tags", "recipe_tags", "tag_id")):
+            rows = self.db.execute(f"SELECT id, name FROM {table} ORDER BY id").fetchall()
+            # The entry already named that way is kept, otherwise the lowest id is renamed
+            kept = {name: entry_id for entry_id, name in rows if name == normalize(name)}
+            for entry_id, name in rows:
+                normalized = normalize(name)
+                if not normalized:
+                    continue
+                target = kept.setdefault(normalized, entry_id)
+                if target == entry_id:
+                    if name != normalized:
+                        self.cursor.execute(f"UPDATE {table} SET name = ? WHERE id = ?", (normalized, entry_id))
+                    continue
+                # recipe_tags can already link the recipe to the target, those duplicate rows are dropped
+                self.cursor.execute(f"UPDATE OR IGNORE {links} SET {column} = ? WHERE {column} = ?", (target, entry_id))
+                self.cursor.execute(f"DELETE FROM {links} WHERE {column} = ?", (entry_id,))
+                if table == "ingredients":
+                    self.cursor.execute("""UPDATE ingredients SET density = COALESCE(density,
+                                           (SELECT density FROM ingredients WHERE id = ?)) WHERE id = ?""", (entry_id, target))
+                self.cursor.execute(f"DELETE FROM {table} WHERE id = ?", (entry_id,))
+        updates = []
+        for recipe_id, ingredients, tags in self.db.execute("SELECT id, ingredients, tags FROM recipes").fetchall():
+            try:
+                lines = decode_json(ingredients)
+                names = decode_json(tags)
+            except ValueError:
+                continue # Left as it is, __migrate_recipe_links already logged it
+            new_lines = [{**line, "ingredient": normalize(line["ingredient"])}
+                         if isinstance(line, dict) and isinstance(line.get("ingredient"), str) else line for line in lines]
+            new_names = list(dict.fromkeys(normalize(name) if isinstance(name, str) else name for name in names))
+            if new_lines != lines or new_names != names:
+                updates.append((json.dumps(new_lines), json.dumps(new_names), recipe_id))
+        self.cursor.executemany("UPDATE recipes SET ingredients = ?, tags = ? WHERE id = ?", updates)
+        if updates:
+            info_log.info("Normalized ingredient and tag names", recipes=len(updates))
+        
+    def __bulk_add_names(self, table: str, names: Iterable[str]) -> tuple[list[str], list[str]]:
+        """
+        :param self:
+        \nShared INSERT OR IGNORE path for the ingredient/tag catalogs. New rows always get an id
+        above the current max so the inserted names can be read back with one range query.
+        """
+        names = [name for name in (_normalize(name) for name in names if isinstance(name, str)) if name]
+        if not names:
+            return [], []
+        try:
             with self.db:
-                self.db.backup(dest_conn)
-            # DEBUG print("Backup success!")
+                self.cursor.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}")
+                last_id = self.cursor.fetchone()[0]
+                self.cursor.executemany(f"INSERT OR IGNORE INTO {table}(name) VALUES (?)",
+                                        ((name,) for name in names))
+                self.cursor.execute(f"SELECT name FROM {table} WHERE id > ? ORDER BY id", (last_id,))
+                inserted = [row[0] for row in self.cursor.fetchall()]
+        except sqlite3.Error as e:
+            error_log.error("Bulk insert failed", e, table=table)
+            return [], []
+        
+        # Anything that wasn't inserted was already in the table or repeated in the batch
+        remaining = set(inserted)
+        duplicates = []
+        for name in names:
+            if name in remaining:
+                remaining.discard(name)
+            else:
+                duplicates.append(name)
+        return inserted, duplicates
+        
+    def __select_names(self, table: str, with_ordinals: bool) -> str:
+        """
+        :param self:
+        \nBuilds the select for the ingredient/tag catalogs. The ordinal is a window function
+        so nothing is written back to the table when rows are added or removed.
+        """
+        if with_ordinals:
+            return f"SELECT id, name, ROW_NUMBER() OVER (ORDER BY id) FROM {table} ORDER BY id"
+        return f"SELECT id, name FROM {table} ORDER BY id"
+            
+    # Back up
+    def backup_manager(self, daily: int=7, weekly: int=4) -> BackupManager:
+        """
+        :param self:
+        \nThe manager opens its own connections, so it can be handed to a worker thread
+        """
+        return BackupManager(DB_PATH, BACKUP_DIR, daily, weekly)
+
+    @timed()
+    def create_backup(self, progress=None, daily: int=7, weekly: int=4) -> str|None:
+        """        
+        :param self:
+        :param progress: Optional callable(copied_pages, total_pages)
+        \nIncremental, rotating backup. Skipped when nothing changed since the last one.
+        \nReturns the backup path, None when skipped or failed
+        """
+        try:
+            return self.backup_manager(daily, weekly).run(progress)
         except Exception as e:
-            print(f"Backup failed!\nReason:{e}")
\ No newline at end of file
+            error_log.error("Backup failed", e)
+            return None
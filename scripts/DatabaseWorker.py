@@ -0,0 +1,137 @@
+import queue, threading
+from concurrent.futures import Future
+from dataclasses import dataclass
+from PyQt6.QtCore import QObject, pyqtSignal, pyqtSlot
+from scripts.InfoLogging import ErrorLogger, timer
+
+error_log = ErrorLogger("database_worker")
+
+class DatabaseSignals(QObject):
+    # ((callback, errback), future) emitted on the worker thread, delivered on the thread the worker was made on
+    done = pyqtSignal(object, object)
+
+    @pyqtSlot(object, object)
+    def deliver(self, callbacks, future):
+        callback, errback = callbacks
+        error = future.exception()
+        if error is None:
+            if callback is not None:
+                callback(future.result())
+        elif errback is not None:
+            errback(error)
+
+@dataclass(slots=True)
+class Operation():
+    future: Future
+    function: object
+    args: tuple
+    kwargs: dict
+    batch: bool = True
+    result: object = None
+    error: Exception|None = None
+
+class DatabaseWorker():
+    """
+    Dedicated thread that owns DBHandler's writer connection, the GUI queues writes and never waits on SQLite.
+    \nsubmit() returns a concurrent.futures.Future and can also call back on the GUI thread through a Qt signal.
+    Operations run in the order they were submitted. Whatever is waiting in the queue when the thread gets to
+    it is run in one DBHandler.batch() transaction, so a burst of edits while the disk is slow (or a backup is
+    copying) is committed once instead of once per edit. Futures are resolved after the commit, so a callback
+    can rely on the change being visible to the readers.
+    \nOnce the worker is running only it may use the writer, the GUI reads through DBHandler.reading().
+    """
+    max_batch = 64 # Operations committed together at most
+
+    def __init__(self, database):
+        """
+        :param self:
+        :param database: DBHandler, create the worker on the GUI thread so callbacks are delivered there
+        """
+        self.database = database
+        self.queue = queue.SimpleQueue()
+        self.signals = DatabaseSignals()
+        self.signals.done.connect(self.signals.deliver)
+        self.pending = 0 # Submitted and not finished, only a hint for the GUI
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self.__run, name="database-writer", daemon=True)
+        self.thread.start()
+
+    def submit(self, operation, *args, callback=None, errback=None, batch: bool=True, **kwargs) -> Future:
+        """
+        :param self:
+        :param operation: Name of a DBHandler method, or a callable that's given the DBHandler first
+        :param callback: Optional callable(result), run on the GUI thread once it's committed
+        :param errback: Optional callable(exception), run on the GUI thread if it raised, it's logged either way
+        :param batch: False runs it in its own transaction(s), for long work like imports that commits as it goes
+        """
+        function = getattr(self.database, operation) if isinstance(operation, str) else operation
+        if not isinstance(operation, str):
+            args = (self.database, *args)
+        future = Future()
+        if callback is not None or errback is not None:
+            future.add_done_callback(lambda done: self.signals.done.emit((callback, errback), done))
+        with self.lock:
+            self.pending += 1
+        self.queue.put(Operation(future, function, args, kwargs, batch))
+        return future
+
+    def call(self, operation, *args, **kwargs):
+        """Runs an operation after everything already queued and waits for its result"""
+        return self.submit(operation, *args, **kwargs).result()
+
+    def close(self, timeout: float|None=None):
+        """Finishes every queued operation and stops the thread"""
+        self.queue.put(None)
+        self.thread.join(timeout)
+
+    def __run(self):
+        held = None # An operation taken while collecting a batch that has to run on its own
+        while True:
+            operation = held if held is not None else self.queue.get()
+            held = None
+            if operation is None:
+                return
+            operations = [operation]
+            stop = False
+            while operation.batch and len(operations) < self.max_batch:
+                try:
+                    waiting = self.queue.get_nowait()
+                except queue.Empty:
+                    break
+                if waiting is None or not waiting.batch:
+                    held, stop = waiting, waiting is None
+                    break
+                operations.append(waiting)
+            self.__execute(operations)
+            if stop:
+                return
+
+    def __execute(self, operations: list[Operation]):
+        if len(operations) == 1:
+            operation = operations[0]
+            try:
+                operation.result = operation.function(*operation.args, **operation.kwargs)
+            except Exception as e:
+                operation.error = e
+        else:
+            try:
+                with timer("DatabaseWorker.batch"), self.database.batch() as connection:
+                    for operation in operations:
+                        try:
+                            with connection: # A savepoint, a failure only undoes this operation
+                                operation.result = operation.function(*operation.args, **operation.kwargs)
+                        except Exception as e:
+                            operation.error = e
+            except Exception as e:
+                # The commit itself failed, nothing in the batch was saved
+                for operation in operations:
+                    operation.error = operation.error or e
+        for operation in operations:
+            with self.lock:
+                self.pending -= 1
+            if operation.error is not None:
+                error_log.error("Database operation failed", operation.error, traceback=True,
+                                operation=getattr(operation.function, "__qualname__", str(operation.function)))
+                operation.future.set_exception(operation.error)
+            else:
+                operation.future.set_result(operation.result)
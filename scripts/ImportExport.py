@@ -0,0 +1,261 @@
+import csv, json, os, time
+from collections.abc import Callable, Iterable, Iterator
+from dataclasses import dataclass, field
+from itertools import islice
+from scripts import Units
+from scripts.Records import Recipe, IngredientLine
+from scripts.InfoLogging import InfoLogger, ErrorLogger, timed
+
+info_log = InfoLogger("import_export")
+error_log = ErrorLogger("import_export")
+
+FORMATS = ("jsonl", "csv")
+KINDS = ("recipes", "ingredients", "tags")
+EXTENSIONS = {".jsonl": "jsonl", ".ndjson": "jsonl", ".json": "jsonl", ".csv": "csv"}
+
+# CSV columns per kind, recipe ingredients and tags are json arrays inside their cell
+CSV_COLUMNS = {
+    "recipes": ["id", "name", "meal_type", "notes", "ingredients", "tags"],
+    "ingredients": ["name", "density"],
+    "tags": ["name"],
+}
+MAX_REPORTED_ERRORS = 100 # Invalid records past this are only counted
+
+class InvalidRecord(ValueError):
+    """A record in an import file that can't be saved, the message says which field is wrong"""
+
+@dataclass(slots=True)
+class ImportReport():
+    kind: str
+    read: int = 0
+    imported: int = 0
+    skipped: int = 0
+    errors: list[str] = field(default_factory=list) # "line N: reason", only the first MAX_REPORTED_ERRORS
+    seconds: float = 0.0
+
+    def skip(self, line: int, reason: str):
+        self.skipped += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(f"line {line}: {reason}")
+
+def detect_format(path: str, fmt: str|None=None) -> str:
+    """
+    :param fmt: "jsonl" or "csv", taken from the file extension when not given
+    """
+    if fmt is None:
+        fmt = EXTENSIONS.get(os.path.splitext(path)[1].lower())
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format for {path}, use one of {', '.join(FORMATS)}")
+    return fmt
+
+def chunked(items: Iterable, size: int) -> Iterator[list]:
+    """Splits any iterable into lists of up to size items without reading ahead"""
+    iterator = iter(items)
+    while chunk := list(islice(iterator, size)):
+        yield chunk
+
+# Reading
+def read_jsonl(file) -> Iterator[tuple[int, dict|None, str|None]]:
+    """
+    :param file: Text file opened for reading
+    \nYields (line number, record, None) or (line number, None, error) for lines that aren't a json object,
+    blank lines are skipped
+    """
+    for number, line in enumerate(file, start=1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError as e:
+            yield number, None, f"invalid json ({e})"
+            continue
+        if not isinstance(record, dict):
+            yield number, None, "expected a json object"
+            continue
+        yield number, record, None
+
+def read_csv(file, kind: str) -> Iterator[tuple[int, dict|None, str|None]]:
+    """
+    :param file: Text file opened for reading with newline=""
+    \nYields the same tuples as read_jsonl. The header row names the columns, recipe ingredients and tags
+    cells are decoded from json.
+    """
+    reader = csv.DictReader(file)
+    for row in reader:
+        number = reader.line_num
+        if kind == "recipes":
+            try:
+                for column in ("ingredients", "tags"):
+                    row[column] = json.loads(row[column]) if row.get(column) else []
+            except ValueError as e:
+                yield number, None, f"invalid json in the {column} column ({e})"
+                continue
+        yield number, row, None
+
+def read_records(file, fmt: str, kind: str) -> Iterator[tuple[int, dict|None, str|None]]:
+    return read_jsonl(file) if fmt == "jsonl" else read_csv(file, kind)
+
+# Validation
+def _text(record: dict, key: str, required: bool=False) -> str:
+    value = record.get(key)
+    if type(value) is str and (value := value.strip()): # The common case, checked first since it runs for every field
+        return value
+    if value is None:
+        value = ""
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        value = f"{value:g}"
+    if not isinstance(value, str):
+        raise InvalidRecord(f"{key} must be text")
+    value = value.strip()
+    if required and not value:
+        raise InvalidRecord(f"{key} is missing")
+    return value
+
+def recipe_from_record(record: dict) -> Recipe:
+    """
+    :param record: One decoded line, "meal_type" or the data pack's "mealType" are both accepted. An ingredient
+    can be an object or a free text line that's split into quantity, unit and name
+    \nChecks the types of every field and returns a Recipe, raises InvalidRecord otherwise
+    """
+    if "meal_type" not in record and "mealType" in record:
+        record = {**record, "meal_type": record["mealType"]}
+    ingredients = record.get("ingredients") or []
+    tags = record.get("tags") or []
+    if not isinstance(ingredients, list):
+        raise InvalidRecord("ingredients must be a list")
+    if not isinstance(tags, list) or not all(isinstance(tag, str) for tag in tags):
+        raise InvalidRecord("tags must be a list of names")
+    lines = []
+    for position, line in enumerate(ingredients, start=1):
+        if isinstance(line, str):
+            # A free text line like "2 cups water", split the same way the command line and ingestion do
+            quantity, unit, name = Units.split_ingredient_line(line)
+            line = {"ingredient": name, "quantity": quantity, "measurement_unit": unit}
+        if not isinstance(line, dict):
+            raise InvalidRecord(f"ingredient {position} must be an object or a name")
+        lines.append(IngredientLine(_text(line, "ingredient", required=True), _text(line, "quantity"),
+                                    _text(line, "measurement_unit")))
+    # Names are normalized by DBHandler when they're saved, the same way the management tabs show them
+    tags = list(dict.fromkeys(tag.strip() for tag in tags if tag.strip()))
+    return Recipe(id=None, name=_text(record, "name", required=True), meal_type=_text(record, "meal_type", required=True),
+                  notes=_text(record, "notes"), ingredients=lines, tags=tags)
+
+def name_from_record(record: dict) -> tuple[str, float|None]:
+    """Returns (name, density) for an ingredient or tag record, density is None when it isn't given"""
+    name = _text(record, "name", required=True)
+    density = record.get("density")
+    if density in (None, ""):
+        return name, None
+    try:
+        density = float(density)
+    except (TypeError, ValueError):
+        raise InvalidRecord("density must be a number")
+    if density <= 0:
+        raise InvalidRecord("density must be above 0")
+    return name, density
+
+# Import
+@timed()
+def import_file(database, path: str, kind: str="recipes", fmt: str|None=None, chunk_size: int=10000,
+                progress: Callable[[int], None]|None=None) -> ImportReport:
+    """
+    :param database: DBHandler the records are written to
+    :param path: JSON Lines or CSV file
+    :param kind: "recipes", "ingredients" or "tags"
+    :param chunk_size: Records written per transaction
+    :param progress: Optional callable(records read so far), called after every chunk
+    \nStreams the file, only one chunk of records is in memory at a time. Invalid records are skipped and
+    listed in the report, a chunk that fails to save is rolled back and counted as skipped.
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind {kind}, use one of {', '.join(KINDS)}")
+    fmt = detect_format(path, fmt)
+    report = ImportReport(kind)
+    started = time.perf_counter()
+    parse = recipe_from_record if kind == "recipes" else name_from_record
+
+    def valid_records(records) -> Iterator[tuple[int, object]]:
+        for number, record, error in records:
+            report.read += 1
+            if error is None:
+                try:
+                    yield number, parse(record)
+                    continue
+                except InvalidRecord as e:
+                    error = str(e)
+            report.skip(number, error)
+
+    with open(path, encoding="utf-8-sig", newline="") as file:
+        for chunk in chunked(valid_records(read_records(file, fmt, kind)), chunk_size):
+            items = [item for _, item in chunk]
+            try:
+                report.imported += _save_chunk(database, kind, items)
+            except Exception as e:
+                error_log.error("Import chunk failed", e, first_line=chunk[0][0], records=len(chunk))
+                report.skip(chunk[0][0], f"{len(chunk)} records from this line could not be saved ({e})")
+                report.skipped += len(chunk) - 1
+            if progress is not None:
+                progress(report.read)
+    report.seconds = round(time.perf_counter() - started, 3)
+    info_log.info("Import finished", path=path, kind=kind, read=report.read, imported=report.imported,
+                  skipped=report.skipped, seconds=report.seconds)
+    return report
+
+def _save_chunk(database, kind: str, items: list) -> int:
+    """Writes one chunk and returns how many new rows it added"""
+    if kind == "recipes":
+        return len(database.bulk_add_recipes(items))
+    add = database.bulk_add_ingredients if kind == "ingredients" else database.bulk_add_tags
+    with database.batch(): # The names and their densities are committed together
+        inserted, _ = add(name for name, _ in items)
+        database.set_ingredient_densities((name, density) for name, density in items if density is not None)
+    return len(inserted)
+
+# Export
+def _export_rows(database, kind: str) -> Iterator[dict]:
+    if kind == "recipes":
+        return (recipe.to_dict() for recipe in database.iter_recipes())
+    if kind == "ingredients":
+        return ({"name": row["name"], "density": row["density"]} for row in database.iter_ingredients())
+    return ({"name": row["name"]} for row in database.iter_tags())
+
+@timed()
+def export_file(database, path: str, kind: str="recipes", fmt: str|None=None,
+                progress: Callable[[int], None]|None=None, progress_every: int=5000) -> int:
+    """
+    :param database: DBHandler the records are read from, on the calling thread's reader
+    :param path: File to write, it's written next to the target and moved into place when complete
+    :param progress: Optional callable(records written so far)
+    \nStreams every record from one read snapshot, returns how many were written
+    """
+    if kind not in KINDS:
+        raise ValueError(f"Unknown kind {kind}, use one of {', '.join(KINDS)}")
+    fmt = detect_format(path, fmt)
+    temp_path = path + ".tmp"
+    count = 0
+    rows = _export_rows(database, kind)
+    try:
+        with open(temp_path, "w", encoding="utf-8", newline="") as file:
+            if fmt == "jsonl":
+                write = lambda row: file.write(json.dumps(row, ensure_ascii=False) + "\n")
+            else:
+                writer = csv.DictWriter(file, CSV_COLUMNS[kind])
+                writer.writeheader()
+                def write(row):
+                    if kind == "recipes":
+                        row["ingredients"] = json.dumps(row["ingredients"], ensure_ascii=False)
+                        row["tags"] = json.dumps(row["tags"], ensure_ascii=False)
+                    writer.writerow(row)
+            for row in rows:
+                write(row)
+                count += 1
+                if progress is not None and count % progress_every == 0:
+                    progress(count)
+        os.replace(temp_path, path)
+    except BaseException:
+        rows.close() # Ends the read transaction right away
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    info_log.info("Export finished", path=path, kind=kind, records=count)
+    return count
@@ -1,7 +1,269 @@
-class ErrorLogger:
-    def __init__(self) -> None:
-        pass
-    
+import json, logging, math, os, sqlite3, sys, threading, time
+import datetime as dt
+from collections import Counter, deque
+from contextlib import contextmanager
+from functools import wraps
+
+LOGGER_NAME = "GroceryApp"
+LOG_LEVEL_ENV = "GROCERYAPP_LOG_LEVEL" # DEBUG, INFO, WARNING, ERROR
+LOG_FORMAT_ENV = "GROCERYAPP_LOG_FORMAT" # "json" for one json object per line, plain text otherwise
+METRICS_ENV = "GROCERYAPP_METRICS" # "0" turns timing and SQL counting off
+METRICS_FILE_ENV = "GROCERYAPP_METRICS_FILE" # Metrics are dumped here when the app closes
+
+# Upper bounds (ms) of the latency histogram buckets, the last bucket catches everything slower
+HISTOGRAM_BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+class StructuredFormatter(logging.Formatter):
+    """
+    Formats an event plus its fields, either as text ("... event key=value") or as a json line.
+    """
+    def __init__(self, json_lines: bool=False):
+        super().__init__()
+        self.json_lines = json_lines
+
+    def format(self, record):
+        fields = getattr(record, "fields", {})
+        timestamp = dt.datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds")
+        if self.json_lines:
+            entry = {"time": timestamp, "level": record.levelname, "logger": record.name, "event": record.getMessage()}
+            entry.update({key: value if isinstance(value, (int, float, bool, type(None))) else str(value)
+                          for key, value in fields.items()})
+            if record.exc_info:
+                entry["traceback"] = self.formatException(record.exc_info)
+            return json.dumps(entry)
+        text = f"{timestamp} {record.levelname} {record.name}: {record.getMessage()}"
+        if fields:
+            text += " " + " ".join(f"{key}={value!r}" if isinstance(value, str) else f"{key}={value}"
+                                   for key, value in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+def configure(level: str|int|None=None, json_lines: bool|None=None, stream=None):
+    """
+    :param level: Defaults to GROCERYAPP_LOG_LEVEL, then INFO
+    :param json_lines: Defaults to GROCERYAPP_LOG_FORMAT == "json"
+    \nSets up the app's logger once, calling it again replaces the handler (e.g. to change the level)
+    """
+    if level is None:
+        level = os.environ.get(LOG_LEVEL_ENV, "INFO").upper()
+    if json_lines is None:
+        json_lines = os.environ.get(LOG_FORMAT_ENV, "").lower() == "json"
+    logger = logging.getLogger(LOGGER_NAME)
+    for handler in list(logger.handlers):
+        logger.removeHandler(handler)
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(StructuredFormatter(json_lines))
+    logger.addHandler(handler)
+    logger.setLevel(level)
+    logger.propagate = False
+    return logger
+
 class InfoLogger:
-    def __init__(self) -> None:
-        pass
\ No newline at end of file
+    """
+    Structured logger for a part of the app, events are short messages and the details go in keyword fields:
+    \n    info_log.info("Backup written", path=path, pages=total)
+    """
+    def __init__(self, name: str) -> None:
+        root = logging.getLogger(LOGGER_NAME)
+        if not root.handlers:
+            configure()
+        self.logger = root.getChild(name)
+
+    def log(self, level: int, event: str, exc_info=None, **fields):
+        if self.logger.isEnabledFor(level):
+            self.logger.log(level, event, exc_info=exc_info, extra={"fields": fields})
+
+    def debug(self, event: str, **fields):
+        self.log(logging.DEBUG, event, **fields)
+
+    def info(self, event: str, **fields):
+        self.log(logging.INFO, event, **fields)
+
+    def warning(self, event: str, **fields):
+        self.log(logging.WARNING, event, **fields)
+
+class ErrorLogger(InfoLogger):
+    """
+    Logs failures at ERROR and counts them per event in the metrics, so failures that are handled and
+    swallowed still show up in the debug panel.
+    """
+    def error(self, event: str, error: BaseException|None=None, traceback: bool=False, **fields):
+        """
+        :param error: The exception that was caught, it's added as the "reason" field
+        :param traceback: Also log the traceback of `error`
+        """
+        if error is not None:
+            fields["reason"] = str(error)
+        metrics.count_error(f"{self.logger.name.removeprefix(LOGGER_NAME + '.')}: {event}")
+        self.log(logging.ERROR, event, exc_info=error if traceback else None, **fields)
+
+class OperationStats():
+    """Latency of one operation, a bounded sample for percentiles plus totals and bucket counts that never drop anything"""
+    __slots__ = ("count", "total", "maximum", "samples", "buckets")
+    sample_size = 4096
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+        self.samples = deque(maxlen=self.sample_size) # Most recent durations in ms
+        self.buckets = [0] * (len(HISTOGRAM_BUCKETS_MS) + 1)
+
+    def add(self, ms: float):
+        self.count += 1
+        self.total += ms
+        if ms > self.maximum:
+            self.maximum = ms
+        self.samples.append(ms)
+        for position, bound in enumerate(HISTOGRAM_BUCKETS_MS):
+            if ms <= bound:
+                self.buckets[position] += 1
+                break
+        else:
+            self.buckets[-1] += 1
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+        def percentile(fraction: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[max(0, math.ceil(fraction * len(ordered)) - 1)] # Nearest rank
+        labels = [f"<={bound}ms" for bound in HISTOGRAM_BUCKETS_MS] + [f">{HISTOGRAM_BUCKETS_MS[-1]}ms"]
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": round(percentile(0.50), 3),
+            "p95_ms": round(percentile(0.95), 3),
+            "p99_ms": round(percentile(0.99), 3),
+            "max_ms": round(self.maximum, 3),
+            "histogram": {label: count for label, count in zip(labels, self.buckets) if count},
+        }
+
+class Metrics():
+    """
+    Process wide performance counters: latency per operation, SQL statements executed and handled errors.
+    \nSafe to record from any thread. Everything can be read with snapshot(), shown in the debug panel or
+    written with dump_json().
+    """
+    def __init__(self):
+        self.enabled = os.environ.get(METRICS_ENV, "1") != "0"
+        self.lock = threading.Lock()
+        self.operations = {} # name -> OperationStats
+        self.sql = Counter() # statement keyword (SELECT, INSERT...) -> count
+        self.errors = Counter() # "logger: event" -> count
+        self.started = dt.datetime.now()
+
+    def record(self, operation: str, ms: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            stats = self.operations.get(operation)
+            if stats is None:
+                stats = self.operations[operation] = OperationStats()
+            stats.add(ms)
+
+    def count_sql(self, statement: str, count: int=1):
+        """
+        :param statement: SQL text, only its first keyword is kept
+        :param count: Times it ran, for bulk writes counted by hand while the trace is paused
+        """
+        statement = statement.lstrip()
+        if statement.startswith("--"):
+            keyword = "TRIGGER" # Statements run by triggers are traced as "-- TRIGGER name"
+        else:
+            keyword = statement.split(None, 1)[0].upper() if statement else "?"
+        with self.lock:
+            self.sql[keyword] += count
+
+    def count_error(self, event: str):
+        with self.lock:
+            self.errors[event] += 1
+
+    def trace_sql(self, connection: sqlite3.Connection):
+        """Counts every statement the connection executes, including each row of an executemany"""
+        if self.enabled:
+            connection.set_trace_callback(self.count_sql)
+
+    @contextmanager
+    def paused_trace(self, connection: sqlite3.Connection):
+        """
+        Stops counting statements on the connection for a bulk write, the trace callback runs for every row
+        of an executemany and every statement a trigger runs, which adds up over hundreds of thousands of rows
+        """
+        connection.set_trace_callback(None)
+        try:
+            yield connection
+        finally:
+            self.trace_sql(connection)
+
+    def reset(self):
+        with self.lock:
+            self.operations = {}
+            self.sql = Counter()
+            self.errors = Counter()
+            self.started = dt.datetime.now()
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            operations = {name: stats.summary() for name, stats in sorted(self.operations.items())}
+            sql = dict(self.sql.most_common())
+            errors = dict(self.errors.most_common())
+        return {
+            "since": self.started.isoformat(timespec="seconds"),
+            "generated": dt.datetime.now().isoformat(timespec="seconds"),
+            "operations": operations,
+            "sql_statements": sql,
+            "sql_total": sum(sql.values()),
+            "errors": errors,
+        }
+
+    def dump_json(self, path: str, extra: dict|None=None) -> str:
+        """
+        :param extra: Added to the top level of the dump, e.g. {"startup_ms": {...}}
+        """
+        snapshot = self.snapshot()
+        snapshot.update(extra or {})
+        with open(path, "w", encoding="utf-8") as file:
+            json.dump(snapshot, file, indent=2)
+        return path
+
+metrics = Metrics()
+
+class timer():
+    """
+    Context manager that records how long its block took:
+    \n    with timer("shopping_list.build"):
+    \n        ...
+    """
+    __slots__ = ("operation", "started")
+    def __init__(self, operation: str):
+        self.operation = operation
+        self.started = 0.0
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        metrics.record(self.operation, (time.perf_counter() - self.started) * 1000)
+        return False
+
+def timed(operation: str|None=None):
+    """
+    Decorator that records every call's duration, the operation defaults to the function's qualified name
+    (e.g. "DBHandler.add_recipe"). Failed calls are recorded too.
+    """
+    def decorate(function):
+        name = operation or function.__qualname__
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if not metrics.enabled:
+                return function(*args, **kwargs)
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                metrics.record(name, (time.perf_counter() - started) * 1000)
+        return wrapper
+    return decorate
@@ -0,0 +1,332 @@
+"""
+Bulk ingestion of saved recipe web pages and schema.org Recipe JSON-LD files.
+
+    python -m scripts.Ingestion "C:\\Users\\me\\Saved Recipes" --workers 8
+
+Files are parsed in a process pool, each worker pulls the Recipe objects out of the JSON-LD (the
+<script type="application/ld+json"> blocks of a page, or a .json/.jsonld file) and splits every ingredient
+line into quantity, unit and a name matched against the ingredients catalog. This process is the only
+writer, it saves the results in batched transactions through DBHandler.bulk_add_recipes.
+\nEvery file is recorded in the ingested_files table in the same transaction as its recipes, so after a crash
+or Ctrl+C running it again skips what was saved and carries on. Files that changed since are read again and
+their recipes replace the ones saved from them before.
+"""
+import argparse, html, json, os, re, sys, time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from scripts import Units
+from scripts.Catalog import normalize
+from scripts.InfoLogging import InfoLogger, ErrorLogger, timed
+
+info_log = InfoLogger("ingestion")
+error_log = ErrorLogger("ingestion")
+
+EXTENSIONS = (".html", ".htm", ".json", ".jsonld")
+# recipeCategory/keyword words -> meal type, anything else is saved as DEFAULT_MEAL_TYPE
+MEAL_TYPES = {
+    "breakfast": "Breakfast", "brunch": "Breakfast",
+    "lunch": "Lunch", "sandwich": "Lunch", "salad": "Lunch",
+    "dinner": "Dinner", "main": "Dinner", "entree": "Dinner", "supper": "Dinner",
+    "dessert": "Dessert", "cake": "Dessert", "cookie": "Dessert", "baking": "Dessert",
+    "snack": "Snack", "appetizer": "Snack", "starter": "Snack",
+}
+DEFAULT_MEAL_TYPE = "Dinner"
+MAX_TAGS = 10
+MAX_REPORTED_ERRORS = 100
+_TAGS = re.compile(r"<[^>]+>")
+# Only the script blocks of a page are looked at, walking every tag of a large page with html.parser is
+# what makes parsing slow. Script contents are raw text in HTML so they need no unescaping.
+_SCRIPTS = re.compile(r"<script\b([^>]*)>(.*?)</script\s*>", re.IGNORECASE | re.DOTALL)
+_JSON_LD = re.compile(r"""type\s*=\s*["']?\s*application/ld\+json""", re.IGNORECASE)
+
+@dataclass(slots=True)
+class IngestReport():
+    files: int = 0 # Found in the folder
+    skipped: int = 0 # Already ingested and unchanged
+    parsed: int = 0
+    failed: int = 0
+    recipes: int = 0 # Saved to the database
+    invalid: int = 0 # Recipes found but missing a name or ingredients
+    new_ingredients: int = 0 # Names with no catalog match, added to the catalog as they are
+    interrupted: bool = False # The pool broke, running again resumes after the last saved batch
+    errors: list[str] = field(default_factory=list)
+    seconds: float = 0.0
+
+    def error(self, message: str):
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append(message)
+
+# Parsing, runs in the worker processes
+def find_recipes(data) -> list[dict]:
+    """Every schema.org Recipe object in a JSON-LD document, including ones inside lists and @graph"""
+    found = []
+    stack = [data]
+    while stack:
+        item = stack.pop()
+        if isinstance(item, list):
+            stack.extend(reversed(item))
+        elif isinstance(item, dict):
+            kind = item.get("@type")
+            kinds = kind if isinstance(kind, list) else [kind]
+            if "Recipe" in kinds:
+                found.append(item)
+            elif "@graph" in item:
+                stack.append(item["@graph"])
+    return found
+
+def _text(value) -> str:
+    """Plain text from a JSON-LD value, markup and entities are removed"""
+    if isinstance(value, dict):
+        value = value.get("text") or value.get("name") or ""
+    elif isinstance(value, list):
+        value = ", ".join(_text(item) for item in value)
+    return " ".join(html.unescape(_TAGS.sub(" ", str(value or ""))).split())
+
+def _steps(value) -> list[str]:
+    """recipeInstructions as a list of steps, it can be text, HowToSteps or HowToSections of HowToSteps"""
+    if isinstance(value, str):
+        return [line for line in (_text(part) for part in re.split(r"\n+|<br\s*/?>|</p>", value)) if line]
+    if isinstance(value, dict):
+        if "itemListElement" in value:
+            return _steps(value["itemListElement"])
+        return [_text(value)] if _text(value) else []
+    if isinstance(value, list):
+        return [step for item in value for step in _steps(item)]
+    return []
+
+def _words(value) -> list[str]:
+    """recipeCategory/recipeCuisine/keywords, each can be a comma separated string or a list"""
+    items = value if isinstance(value, list) else str(value or "").split(",")
+    return [word for word in (normalize(_text(item)) for item in items) if word]
+
+def _singular(word: str) -> str:
+    if len(word) > 4 and word.endswith("ies"):
+        return word[:-3] + "y"
+    if len(word) > 3 and word.endswith(("oes", "ches", "shes", "sses", "xes")):
+        return word[:-2]
+    if len(word) > 3 and word.endswith("s") and not word.endswith(("ss", "us")):
+        return word[:-1]
+    return word
+
+def _singular_name(name: str) -> str:
+    return " ".join(_singular(word) for word in name.split())
+
+class IngredientMatcher():
+    """
+    Maps ingredient names from recipe pages onto the ingredients catalog: "2 eggs" gives "eggs", which matches
+    the catalog's "egg". Only whole names match, exactly or by their singular form. Matching part of a name
+    is wrong too often ("peanut butter" isn't "butter"), so names with no match are kept as they are and
+    added to the catalog on save.
+    """
+    def __init__(self, names):
+        self.names = set() # Catalog names
+        self.lookup = {} # Singular form -> catalog name
+        for name in names:
+            name = normalize(name)
+            if name:
+                self.names.add(name)
+                self.lookup.setdefault(_singular_name(name), name)
+
+    def match(self, name: str) -> str:
+        name = normalize(name)
+        if name in self.names:
+            return name
+        return self.lookup.get(_singular_name(name), name)
+
+def recipe_record(recipe: dict, matcher: IngredientMatcher) -> dict:
+    """
+    :param recipe: A schema.org Recipe object
+    \nReturns the recipe in the import format of scripts/ImportExport.py
+    """
+    lines = []
+    for text in recipe.get("recipeIngredient") or recipe.get("ingredients") or []:
+        quantity, unit, name = Units.split_ingredient_line(_text(text))
+        if name:
+            lines.append({"ingredient": matcher.match(name), "quantity": quantity, "measurement_unit": unit})
+    categories = _words(recipe.get("recipeCategory"))
+    keywords = _words(recipe.get("recipeCuisine")) + _words(recipe.get("keywords"))
+    meal_type = next((MEAL_TYPES[word] for phrase in categories + keywords for word in phrase.split()
+                      if word in MEAL_TYPES), DEFAULT_MEAL_TYPE)
+    notes = []
+    if recipe.get("description"):
+        notes.append(_text(recipe["description"]))
+    if recipe.get("recipeYield"):
+        notes.append(f"Makes: {_text(recipe['recipeYield'])}")
+    steps = _steps(recipe.get("recipeInstructions"))
+    notes.extend(f"{number}. {step}" for number, step in enumerate(steps, start=1))
+    return {
+        "name": _text(recipe.get("name")),
+        "meal_type": meal_type,
+        "notes": "\n".join(notes),
+        "ingredients": lines,
+        "tags": list(dict.fromkeys(categories + keywords))[:MAX_TAGS],
+    }
+
+def parse_file(path: str, matcher: IngredientMatcher) -> list[dict]:
+    """Recipes of one page or JSON-LD file, raises OSError/ValueError when it can't be read"""
+    with open(path, encoding="utf-8", errors="replace") as file:
+        text = file.read()
+    if path.lower().endswith((".html", ".htm")):
+        documents = []
+        for attributes, block in _SCRIPTS.findall(text):
+            if not _JSON_LD.search(attributes):
+                continue
+            try:
+                documents.append(json.loads(block))
+            except ValueError:
+                continue # Pages often carry other broken or templated blocks, only the recipe matters
+    else:
+        documents = [json.loads(text)]
+    return [recipe_record(recipe, matcher) for document in documents for recipe in find_recipes(document)]
+
+_matcher = None # Built once per worker by _init_worker
+
+def _init_worker(catalog_names: list[str]):
+    global _matcher
+    _matcher = IngredientMatcher(catalog_names)
+
+def parse_files(files: list[tuple[str, int, int]]) -> list[tuple]:
+    """
+    :param files: (path, size, mtime_ns)
+    \nWorker task, returns (path, size, mtime_ns, records, error) per file, a file that fails doesn't fail the task
+    """
+    results = []
+    for path, size, mtime_ns in files:
+        try:
+            results.append((path, size, mtime_ns, parse_file(path, _matcher), None))
+        except Exception as e:
+            results.append((path, size, mtime_ns, [], f"{type(e).__name__}: {e}"))
+    return results
+
+# Writing, runs in this process
+def discover(folder: str) -> list[tuple[str, int, int]]:
+    """Returns (absolute path, size, mtime_ns) of every recipe file under the folder, sorted by path"""
+    files = []
+    for root, _, names in os.walk(folder):
+        for name in names:
+            if name.lower().endswith(EXTENSIONS):
+                path = os.path.abspath(os.path.join(root, name))
+                stat = os.stat(path)
+                files.append((path, stat.st_size, stat.st_mtime_ns))
+    files.sort()
+    return files
+
+@timed()
+def ingest_folder(database, folder: str, workers: int|None=None, files_per_task: int=16, batch_size: int=2000,
+                  progress=None) -> IngestReport:
+    """
+    :param database: DBHandler, only this process writes to it
+    :param folder: Searched recursively for .html/.htm/.json/.jsonld files
+    :param workers: Parser processes, defaults to the number of cores. 0 parses in this process.
+    :param files_per_task: Files sent to a worker at a time, fewer round trips for folders of small files
+    :param batch_size: Recipes saved per transaction
+    :param progress: Optional callable(files done, files to do, recipes saved)
+    \nParses every new or changed file and saves its recipes, see the module docstring
+    """
+    from scripts.ImportExport import recipe_from_record, InvalidRecord, chunked
+    started = time.perf_counter()
+    report = IngestReport()
+    files = discover(folder)
+    report.files = len(files)
+    done = database.ingested_files()
+    todo = [entry for entry in files if done.get(entry[0]) != (entry[1], entry[2])]
+    report.skipped = len(files) - len(todo)
+    catalog = [row[1] for row in database.retrieve_ingredients() or []]
+    known = {normalize(name) for name in catalog}
+    new_names = set()
+    recipes, sources = [], []
+    finished = 0
+
+    def flush():
+        if recipes or sources:
+            report.recipes += len(database.bulk_add_recipes(recipes, sources))
+            recipes.clear()
+            sources.clear()
+
+    def collect(results):
+        nonlocal finished
+        for path, size, mtime_ns, records, error in results:
+            finished += 1
+            if error is not None:
+                report.failed += 1
+                report.error(f"{path}: {error}")
+                sources.append((path, size, mtime_ns, 0, error))
+                continue
+            report.parsed += 1
+            saved = 0
+            for record in records:
+                try:
+                    recipe = recipe_from_record(record)
+                except InvalidRecord as e:
+                    report.invalid += 1
+                    report.error(f"{path}: {record.get('name') or 'recipe'} skipped, {e}")
+                    continue
+                if not recipe.ingredients:
+                    report.invalid += 1
+                    report.error(f"{path}: {recipe.name} skipped, it has no ingredients")
+                    continue
+                recipes.append(recipe)
+                new_names.update(line.ingredient for line in recipe.ingredients if line.ingredient not in known)
+                saved += 1
+            sources.append((path, size, mtime_ns, saved, None))
+        if len(recipes) >= batch_size:
+            flush()
+        if progress is not None:
+            progress(finished, len(todo), report.recipes + len(recipes))
+
+    tasks = chunked(todo, files_per_task)
+    try:
+        if workers == 0:
+            _init_worker(catalog)
+            for task in tasks:
+                collect(parse_files(task))
+        else:
+            workers = workers or os.cpu_count() or 1
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(catalog,)) as pool:
+                # A few tasks queued per worker keeps them busy without holding the whole folder's results
+                pending = set()
+                for task in tasks:
+                    pending.add(pool.submit(parse_files, task))
+                    if len(pending) >= workers * 2:
+                        completed, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in completed:
+                            collect(future.result())
+                for future in wait(pending).done:
+                    collect(future.result())
+    except BrokenProcessPool as e:
+        report.interrupted = True
+        error_log.error("A parser process died, run the ingestion again to resume", e)
+    finally:
+        # Whatever was parsed is saved, including on Ctrl+C, so the next run starts after it
+        flush()
+        report.new_ingredients = len(new_names)
+        report.seconds = round(time.perf_counter() - started, 3)
+        info_log.info("Ingestion finished", folder=folder, files=report.files, skipped=report.skipped,
+                      parsed=report.parsed, failed=report.failed, recipes=report.recipes,
+                      new_ingredients=report.new_ingredients, seconds=report.seconds)
+    return report
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Ingest saved recipe pages and JSON-LD files into GroceryApp")
+    parser.add_argument("folder")
+    parser.add_argument("--workers", type=int, help="Parser processes, defaults to the number of cores, 0 for none")
+    parser.add_argument("--batch-size", type=int, default=2000, help="Recipes saved per transaction")
+    args = parser.parse_args(argv)
+    import scripts.DatabaseManager as DatabaseManager
+    database = DatabaseManager.DBHandler()
+    last = [0.0]
+    def show(done, total, saved):
+        if time.perf_counter() - last[0] > 0.5 or done == total:
+            last[0] = time.perf_counter()
+            print(f"\r{done}/{total} files, {saved} recipes", end="", file=sys.stderr, flush=True)
+    try:
+        report = ingest_folder(database, args.folder, args.workers, batch_size=args.batch_size, progress=show)
+    finally:
+        database.close()
+    print(file=sys.stderr)
+    print(json.dumps({key: getattr(report, key) for key in report.__slots__}, indent=2))
+    return 1 if report.interrupted else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,193 @@
+import bisect, string
+from PyQt6.QtCore import Qt, QAbstractListModel, QModelIndex
+from scripts.InfoLogging import timed
+
+# Same folding as SQLite's NOCASE collation (ASCII only) so the in memory order matches ORDER BY name COLLATE NOCASE
+_NOCASE = str.maketrans(string.ascii_uppercase, string.ascii_lowercase)
+
+def sort_key(name: str, recipe_id: int) -> tuple[str, int]:
+    return (name.translate(_NOCASE), recipe_id)
+
+class RecipeListModel(QAbstractListModel):
+    """
+    Recipe list for the viewers, rows are (id, name) and the id is returned for Qt.UserRole.
+    \nShowing every recipe is lazy: rows are paged from SQLite with DBHandler.page_recipes as the view scrolls
+    (canFetchMore/fetchMore), so opening the list costs one page no matter how many recipes there are.
+    Search results are a fixed list shown in the order given, with optional tooltips.
+    """
+    page_size = 500 # Rows fetched per page, a few screens worth
+    def __init__(self, database, parent=None):
+        """
+        :param self:
+        :param database: DBHandler the pages are read from
+        """
+        super().__init__(parent)
+        self.database = database
+        self.ids = []
+        self.names = []
+        self.keys = [] # Sort keys of the loaded rows, only kept while showing the index
+        self.tooltips = None
+        self.showing_index = True
+        self.exhausted = False # True once the last page has been loaded
+
+    # Qt model interface
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.ids)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.ids):
+            return None
+        row = index.row()
+        if role == Qt.ItemDataRole.DisplayRole:
+            return self.names[row]
+        if role == Qt.ItemDataRole.UserRole:
+            return self.ids[row]
+        if role == Qt.ItemDataRole.ToolTipRole and self.tooltips:
+            return self.tooltips[row]
+        return None
+
+    def canFetchMore(self, parent=QModelIndex()):
+        return not parent.isValid() and self.showing_index and not self.exhausted
+
+    @timed("RecipeListModel.fetchMore")
+    def fetchMore(self, parent=QModelIndex()):
+        if not self.canFetchMore(parent):
+            return
+        after = (self.names[-1], self.ids[-1]) if self.ids else None
+        rows = self.database.page_recipes(after, self.page_size)
+        if len(rows) < self.page_size:
+            self.exhausted = True
+        if not rows:
+            return
+        start = len(self.ids)
+        self.beginInsertRows(QModelIndex(), start, start + len(rows) - 1)
+        for recipe_id, name in rows:
+            self.ids.append(recipe_id)
+            self.names.append(name)
+            self.keys.append(sort_key(name, recipe_id))
+        self.endInsertRows()
+
+    # Contents
+    @timed()
+    def show_index(self):
+        """Switches to every recipe in name order, only the first page is loaded"""
+        self.beginResetModel()
+        self.ids, self.names, self.keys = [], [], []
+        self.tooltips = None
+        self.showing_index = True
+        self.exhausted = False
+        self.endResetModel()
+        self.fetchMore()
+
+    @timed()
+    def show_results(self, entries, tooltips: list[str]|None=None):
+        """
+        :param self:
+        :param entries: (id, name) pairs in the order they should be shown
+        :param tooltips: Optional text shown when hovering each row
+        """
+        self.beginResetModel()
+        self.ids, self.names = [], []
+        for recipe_id, name in entries:
+            self.ids.append(recipe_id)
+            self.names.append(name)
+        self.keys = []
+        self.tooltips = list(tooltips) if tooltips else None
+        self.showing_index = False
+        self.exhausted = True
+        self.endResetModel()
+
+    def row_of(self, recipe_id: int) -> int|None:
+        try:
+            return self.ids.index(recipe_id)
+        except ValueError:
+            return None
+
+    # Deltas
+    def recipe_added(self, recipe_id: int, name: str):
+        """Inserts the row if it falls inside what's loaded, later pages pick it up from the database otherwise"""
+        if not self.showing_index:
+            return
+        key = sort_key(name, recipe_id)
+        if not self.exhausted and (not self.keys or key > self.keys[-1]):
+            return
+        row = bisect.bisect_left(self.keys, key)
+        self.beginInsertRows(QModelIndex(), row, row)
+        self.ids.insert(row, recipe_id)
+        self.names.insert(row, name)
+        self.keys.insert(row, key)
+        self.endInsertRows()
+
+    def recipe_removed(self, recipe_id: int):
+        row = self.row_of(recipe_id)
+        if row is None:
+            return
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self.ids[row]
+        del self.names[row]
+        if self.showing_index:
+            del self.keys[row]
+        if self.tooltips:
+            del self.tooltips[row]
+        self.endRemoveRows()
+
+    def recipe_changed(self, recipe_id: int, name: str):
+        """Renames in place for search results, moves the row when showing the index"""
+        if self.showing_index:
+            self.recipe_removed(recipe_id)
+            self.recipe_added(recipe_id, name)
+            return
+        row = self.row_of(recipe_id)
+        if row is not None:
+            self.names[row] = name
+            index = self.index(row)
+            self.dataChanged.emit(index, index, [Qt.ItemDataRole.DisplayRole])
+
+class CheckableListModel(QAbstractListModel):
+    """
+    List of names with a check box each, e.g. the tag picker in IngredientSelector.
+    \nThe checked names are kept in a set so checking, unchecking and reading the selection never
+    loop over widgets, and the view only creates what's on screen however many names there are.
+    """
+    def __init__(self, names: list[str], checked=(), parent=None):
+        """
+        :param self:
+        :param names: Names in display order, the list is only read so a catalog's list can be passed as is
+        :param checked: Names that start checked
+        """
+        super().__init__(parent)
+        self.names = names
+        self.checked = set(checked)
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.names)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid() or index.row() >= len(self.names):
+            return None
+        name = self.names[index.row()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            return name
+        if role == Qt.ItemDataRole.CheckStateRole:
+            return Qt.CheckState.Checked if name in self.checked else Qt.CheckState.Unchecked
+        return None
+
+    def setData(self, index, value, role=Qt.ItemDataRole.EditRole):
+        if role != Qt.ItemDataRole.CheckStateRole or not index.isValid():
+            return False
+        name = self.names[index.row()]
+        if Qt.CheckState(value) == Qt.CheckState.Checked:
+            self.checked.add(name)
+        else:
+            self.checked.discard(name)
+        self.dataChanged.emit(index, index, [Qt.ItemDataRole.CheckStateRole])
+        return True
+
+    def flags(self, index):
+        if not index.isValid():
+            return Qt.ItemFlag.NoItemFlags
+        return Qt.ItemFlag.ItemIsEnabled | Qt.ItemFlag.ItemIsSelectable | Qt.ItemFlag.ItemIsUserCheckable
+
+    def checked_names(self) -> list[str]:
+        """Checked names in display order, names that aren't listed are left out"""
+        return [name for name in self.names if name in self.checked]
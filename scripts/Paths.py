@@ -0,0 +1,48 @@
+import os, sys, shutil
+from scripts.InfoLogging import InfoLogger
+
+info_log = InfoLogger("paths")
+
+DATA_DIR_ENV = "GROCERYAPP_DATA_DIR" # Overrides where the database folder lives
+DB_FILE_NAME = "GroceryApp.db"
+
+def app_dir() -> str:
+    """
+    Folder the app runs from, the executable's folder when built with PyInstaller, otherwise the repo root.
+    \nThe database used to live in a path relative to the working directory, this keeps it next to the app
+    no matter where it's launched from.
+    """
+    if getattr(sys, "frozen", False):
+        return os.path.dirname(os.path.abspath(sys.executable))
+    return os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def data_dir() -> str:
+    override = os.environ.get(DATA_DIR_ENV)
+    if override:
+        return os.path.abspath(os.path.expanduser(override))
+    return app_dir()
+
+def database_dir() -> str:
+    return os.path.join(data_dir(), "database")
+
+def database_path() -> str:
+    return os.path.join(database_dir(), DB_FILE_NAME)
+
+def backup_dir() -> str:
+    return os.path.join(database_dir(), "backups")
+
+def adopt_legacy_database(search_dirs=None):
+    """
+    :param search_dirs: Folders to look in, defaults to the working directory and the app folder
+    \nOn Linux/macOS the old r".\\database" path created a folder literally named ".\\database". If one
+    exists and there's no database in the new location yet it's moved over once.
+    """
+    if os.sep == "\\" or os.path.exists(database_path()):
+        return
+    for folder in search_dirs or (os.getcwd(), app_dir()):
+        legacy_dir = os.path.join(folder, ".\\database")
+        if os.path.isfile(os.path.join(legacy_dir, DB_FILE_NAME)):
+            os.makedirs(data_dir(), exist_ok=True)
+            shutil.move(legacy_dir, database_dir())
+            info_log.info("Moved legacy database folder", source=legacy_dir, destination=database_dir())
+            return
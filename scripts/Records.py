@@ -0,0 +1,90 @@
+import json, sqlite3
+from dataclasses import dataclass, field
+
+try:
+    # orjson is optional, it decodes the ingredient/tag columns several times faster when it's installed
+    import orjson
+    _loads = orjson.loads
+except ImportError:
+    _loads = json.loads
+
+RECIPE_COLUMNS = "id, name, meal_type, notes, ingredients, tags"
+
+def decode_json(text: str|bytes|None) -> list:
+    """
+    :param text: A json column written by DBHandler
+    \nReturns [] for empty columns, raises ValueError when the text isn't valid json
+    """
+    if not text:
+        return []
+    return _loads(text)
+
+@dataclass(slots=True)
+class IngredientLine():
+    ingredient: str
+    quantity: str = ""
+    measurement_unit: str = ""
+
+    @classmethod
+    def from_dict(cls, line: dict) -> "IngredientLine":
+        return cls(line.get("ingredient", ""), line.get("quantity", "") or "", line.get("measurement_unit", "") or "")
+
+    def to_dict(self) -> dict:
+        return {"ingredient": self.ingredient, "quantity": self.quantity, "measurement_unit": self.measurement_unit}
+
+@dataclass(slots=True)
+class Recipe():
+    """
+    One row of the recipes table with its json columns decoded.
+    \nBuilt by column name from a sqlite3.Row, so the order of the SELECT doesn't matter.
+    """
+    id: int|None
+    name: str
+    meal_type: str
+    notes: str = ""
+    ingredients: list[IngredientLine] = field(default_factory=list)
+    tags: list[str] = field(default_factory=list)
+
+    @classmethod
+    def from_row(cls, row: sqlite3.Row) -> "Recipe":
+        return cls(
+            id=row["id"],
+            name=row["name"],
+            meal_type=row["meal_type"],
+            notes=row["notes"] or "",
+            ingredients=[IngredientLine.from_dict(line) for line in decode_json(row["ingredients"])],
+            tags=list(decode_json(row["tags"])),
+        )
+
+    @classmethod
+    def from_data_pack(cls, data_pack: dict) -> "Recipe":
+        return cls(
+            id=data_pack.get("id"),
+            name=data_pack["name"],
+            meal_type=data_pack["mealType"],
+            notes=data_pack.get("notes", ""),
+            ingredients=[IngredientLine.from_dict(line) for line in data_pack.get("ingredients", [])],
+            tags=list(data_pack.get("tags", [])),
+        )
+
+    def to_data_pack(self) -> dict:
+        """Returns the dict the recipe tabs and DBHandler.add_recipe/update_recipe work with"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "mealType": self.meal_type,
+            "notes": self.notes,
+            "ingredients": [line.to_dict() for line in self.ingredients],
+            "tags": list(self.tags),
+        }
+
+    def to_dict(self) -> dict:
+        """Returns the recipe with column names as keys, the shape used by exports"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "meal_type": self.meal_type,
+            "notes": self.notes,
+            "ingredients": [line.to_dict() for line in self.ingredients],
+            "tags": list(self.tags),
+        }
@@ -0,0 +1,162 @@
+import heapq
+from collections import OrderedDict
+from rapidfuzz import fuzz, process, utils
+from scripts.InfoLogging import timed
+
+class RecipeSearchEngine():
+    """
+    Fuzzy recipe name search.
+    \nNames are normalized and tokenized once when they're added, searches score every name in a single
+    rapidfuzz batch call instead of calling fuzz.ratio per recipe from Python.
+    \nSearches may run on a worker thread while the GUI thread applies add/remove deltas, so a search
+    scores a snapshot of the names in chunks and checks for cancellation between chunks.
+    """
+    chunk_size = 10000 # Names scored per batch, keeps each GIL hold short and cancellation responsive
+    cache_size = 64 # Recent queries kept for backspacing/retyping
+    def __init__(self, match_threshold: float=23, keyword_threshold: float=80, limit: int|None=200):
+        """
+        :param self:
+        :param match_threshold: Minimum full name score for a normal search, higher is stricter
+        :param keyword_threshold: Minimum score for a query word to match a word in the name
+        :param limit: Default number of results returned, None returns every match
+        """
+        self.match_threshold = match_threshold
+        self.keyword_threshold = keyword_threshold
+        self.limit = limit
+        self.names = {} # id -> normalized name
+        self.display_names = {} # id -> name as entered, used to break score ties
+        self.tokens = {} # normalized word -> ids of the recipes containing it
+        self.word_cache = {} # query word -> ids of recipes with a matching word, reused as the query grows
+        self.result_cache = OrderedDict() # (query, keyword, limit) -> results
+
+    @timed()
+    def load(self, entries):
+        """
+        :param self:
+        :param entries: (id, name, ...) tuples, e.g. the "recipes" rows of DBHandler.read_startup_data
+        """
+        self.names = {}
+        self.display_names = {}
+        self.tokens = {}
+        self.invalidate()
+        for entry in entries:
+            self.__index(entry[0], entry[1])
+
+    def add(self, recipe_id: int, name: str):
+        if recipe_id in self.names:
+            self.remove(recipe_id)
+        self.invalidate()
+        self.__index(recipe_id, name)
+
+    def __index(self, recipe_id: int, name: str):
+        normalized = utils.default_process(name)
+        self.names[recipe_id] = normalized
+        self.display_names[recipe_id] = name
+        for token in set(normalized.split()):
+            self.tokens.setdefault(token, set()).add(recipe_id)
+
+    def remove(self, recipe_id: int):
+        normalized = self.names.pop(recipe_id, None)
+        if normalized is None:
+            return
+        self.invalidate()
+        del self.display_names[recipe_id]
+        for token in set(normalized.split()):
+            owners = self.tokens.get(token)
+            if owners is not None:
+                owners.discard(recipe_id)
+                if not owners:
+                    del self.tokens[token]
+
+    def update(self, recipe_id: int, name: str):
+        self.add(recipe_id, name)
+
+    def invalidate(self):
+        """Drops cached results, the caches are replaced rather than cleared so running searches can't refill them"""
+        self.word_cache = {}
+        self.result_cache = OrderedDict()
+
+    @timed()
+    def search(self, query: str, keyword: bool=False, limit: int|None=-1, cancelled=None) -> list[tuple[int, str, float]]|None:
+        """
+        :param self:
+        :param query: Text typed by the user
+        :param keyword: Only match recipes where every query word is close to a word in the name
+        :param limit: Max results, defaults to the engine limit, None returns everything
+        :param cancelled: Optional callable, when it returns True the search stops and returns None
+        \nReturns (id, name, score) sorted by score (best first) then name
+        """
+        if limit == -1:
+            limit = self.limit
+        normalized = utils.default_process(query)
+        if not normalized:
+            return []
+        
+        # Caches are swapped out (not cleared) on changes, so holding on to this one can't store stale results
+        result_cache = self.result_cache
+        cache_key = (normalized, keyword, limit)
+        cached = result_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        if keyword:
+            candidates = self.keyword_candidates(normalized, cancelled)
+            if candidates is None:
+                return None
+            names = self.names
+            ids = [recipe_id for recipe_id in candidates if recipe_id in names]
+            choices = [names[recipe_id] for recipe_id in ids]
+            cutoff = 0 # Keyword matches are kept whatever their full name score is
+        else:
+            snapshot = self.names.copy() # The GUI thread can keep applying deltas while this runs
+            ids = list(snapshot)
+            choices = list(snapshot.values())
+            cutoff = self.match_threshold
+
+        matches = []
+        for start in range(0, len(choices), self.chunk_size):
+            if cancelled is not None and cancelled():
+                return None
+            for _, score, index in process.extract(normalized, choices[start:start + self.chunk_size], scorer=fuzz.ratio,
+                                                   processor=None, score_cutoff=cutoff, limit=limit):
+                matches.append((ids[start + index], score))
+        if limit is not None and len(matches) > limit:
+            matches = heapq.nlargest(limit, matches, key=lambda match: match[1])
+        
+        display_names = self.display_names
+        results = [(recipe_id, display_names.get(recipe_id, ""), score) for recipe_id, score in matches]
+        results.sort(key=lambda result: (-result[2], result[1].lower()))
+        
+        result_cache[cache_key] = results
+        if len(result_cache) > self.cache_size:
+            result_cache.popitem(last=False)
+        return results
+
+    def keyword_candidates(self, normalized_query: str, cancelled=None) -> set[int]|None:
+        """
+        :param self:
+        \nEach query word is scored against the unique words of every name in one batch, the
+        recipes owning a close enough word for ALL query words are returned. Word matches are cached
+        so while typing only the word in progress is scored, the finished words reuse their candidates.
+        """
+        word_cache = self.word_cache
+        candidates = None
+        vocabulary = None
+        # Longer words tend to match fewer recipes, doing them first keeps the intersection small
+        for word in sorted(set(normalized_query.split()), key=len, reverse=True):
+            if cancelled is not None and cancelled():
+                return None
+            owners = word_cache.get(word)
+            if owners is None:
+                if vocabulary is None:
+                    vocabulary = list(self.tokens)
+                matches = process.extract(word, vocabulary, scorer=fuzz.ratio, processor=None,
+                                          score_cutoff=self.keyword_threshold, limit=None)
+                owners = set()
+                for token, _, _ in matches:
+                    owners.update(self.tokens.get(token, ()))
+                word_cache[word] = owners
+            candidates = set(owners) if candidates is None else candidates & owners
+            if not candidates:
+                return set()
+        return candidates or set()
@@ -0,0 +1,15 @@
+from scripts import Units
+
+def build_shopping_list(database, plan: dict[int, float]) -> list[tuple[str, float, str]]:
+    """
+    :param database: DBHandler
+    :param plan: recipe id -> serving multiplier
+    \nMerges the ingredients of every planned recipe and returns (ingredient, amount, unit) rows.
+    The summing happens in SQLite over amounts stored in base units, this only picks a readable unit for each total.
+    """
+    rows = database.aggregate_ingredients(plan)
+    shopping_list = []
+    for name, dimension, unit, total, _ in rows:
+        amount, unit = Units.format_amount(total or 0.0, dimension, unit)
+        shopping_list.append((name, amount, unit))
+    return shopping_list
@@ -1,21 +1,53 @@
-from PyQt6.QtWidgets import (QWidget, QVBoxLayout, QHBoxLayout, 
+from PyQt6.QtWidgets import (QVBoxLayout, QHBoxLayout, 
                              QPushButton, QSizePolicy, QListView,
-                             QCheckBox, QDialog, QTableView,
-                             QAbstractItemView, QGridLayout, QScrollArea,
-                             QHeaderView)
-from PyQt6.QtCore import Qt, QStringListModel, QModelIndex
+                             QDialog, QTableView, QLineEdit, QComboBox,
+                             QAbstractItemView, QHeaderView, QStyledItemDelegate)
+from PyQt6.QtCore import Qt, QStringListModel, QModelIndex, QSortFilterProxyModel
 from PyQt6.QtGui import QStandardItemModel, QStandardItem
+from scripts import Units
+from scripts.Models import CheckableListModel
+
+class UnitDelegate(QStyledItemDelegate):
+    """
+    Edits measurement unit cells with a drop down of the units Units.to_base knows, so every saved unit
+    converts on the shopping list. A unit saved before that isn't in the list is offered first so opening
+    the editor doesn't change it.
+    """
+    def __init__(self, units: list[str], parent=None):
+        super().__init__(parent)
+        self.units = units
+
+    def createEditor(self, parent, option, index):
+        editor = QComboBox(parent)
+        editor.addItems(self.units)
+        return editor
+
+    def setEditorData(self, editor, index):
+        text = index.data(Qt.ItemDataRole.EditRole) or ""
+        known = Units.normalize_unit(text)
+        unit = known[0] if known is not None else text
+        if editor.findText(unit) < 0:
+            editor.insertItem(0, unit)
+        editor.setCurrentIndex(editor.findText(unit))
+
+    def setModelData(self, editor, model, index):
+        model.setData(index, editor.currentText(), Qt.ItemDataRole.EditRole)
 
 class IngredientSelector(QDialog):
-    def __init__(self, parent=None, ingredient_list:list=[], tag_list:list=[], data_pack: dict|None=None):
+    def __init__(self, parent=None, ingredient_catalog=None, tag_catalog=None, data_pack: dict|None=None,
+                 measurement_units: list[str]|None=None):
+        """
+        :param ingredient_catalog: Catalog of ingredients shared with the main window, already sorted
+        :param tag_catalog: Catalog of tags shared with the main window, already sorted
+        :param measurement_units: Units offered for each ingredient, defaults to Units.MEASUREMENT_UNITS
+        """
         super().__init__(parent)
         self.setWindowTitle("Ingredient Selector")
         self.setModal(True)  # This is key for proper modal behavior
         self.setMinimumSize(1600,900)
-        self.ingredients = [ingredient[1] for ingredient in ingredient_list]
-        self.tag_list = [tag[1] for tag in tag_list]
-        self.ingredients.sort()
-        self.tag_list.sort()
+        self.ingredients = ingredient_catalog.names if ingredient_catalog is not None else []
+        self.tag_list = tag_catalog.names if tag_catalog is not None else []
+        self.measurement_units = list(measurement_units or Units.MEASUREMENT_UNITS)
         
         if data_pack is None:
             self.data_pack = {
@@ -31,13 +63,11 @@ class IngredientSelector(QDialog):
         group_1 = QHBoxLayout()
         # ingredient model set up
         self.ingredient_view_model = QStringListModel()
-        for ingredient in self.ingredients:
-            self.ingredient_view_model.insertRows(self.ingredient_view_model.rowCount(), 1)  # Insert one row at the end
-            index = self.ingredient_view_model.index(self.ingredient_view_model.rowCount() - 1, 0)
-            self.ingredient_view_model.setData(index, ingredient, Qt.ItemDataRole.DisplayRole)
+        self.ingredient_view_model.setStringList(self.ingredients) # One reset instead of a row insert per ingredient
             
         self.ingredient_view = QListView()
         self.ingredient_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.ingredient_view.setUniformItemSizes(True)
         self.ingredient_view.setModel(self.ingredient_view_model)
         # Makes sure no accidental ingredients are added
         self.ingredient_view.clearSelection()
@@ -67,25 +97,33 @@ class IngredientSelector(QDialog):
         self.ingredient_table.setSelectionBehavior(QTableView.SelectionBehavior.SelectRows)
         self.ingredient_table.setSelectionMode(QAbstractItemView.SelectionMode.SingleSelection)
         self.ingredient_table.setAlternatingRowColors(True)
+        self.unit_delegate = UnitDelegate(self.measurement_units, self.ingredient_table)
+        self.ingredient_table.setItemDelegateForColumn(2, self.unit_delegate)
        
         # Layout setup
         group_1.addWidget(self.ingredient_view)
         group_1.addLayout(button_layout)
         group_1.addWidget(self.ingredient_table)
         
-        # Tags
-        tag_scroll_area = QScrollArea()
-        tag_scroll_area.setWidgetResizable(True)
-        tag_container = QWidget()
-        tag_layout = QGridLayout(tag_container)
-        tag_scroll_area.setWidget(tag_container)
-        self.checkboxes = []
-        
-        for x, tag in enumerate(self.tag_list):
-            row = x // 5
-            new_checkbox = QCheckBox(f"{tag}")
-            tag_layout.addWidget(new_checkbox, row, x % 5)
-            self.checkboxes.append(new_checkbox)
+        # Tags, one checkable list view instead of a check box widget per tag
+        self.tag_model = CheckableListModel(self.tag_list, parent=self)
+        self.tag_filter_model = QSortFilterProxyModel(self)
+        self.tag_filter_model.setSourceModel(self.tag_model)
+        self.tag_filter_model.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.tag_filter = QLineEdit()
+        self.tag_filter.setPlaceholderText("Filter tags...")
+        self.tag_view = QListView()
+        self.tag_view.setModel(self.tag_filter_model)
+        self.tag_view.setEditTriggers(QListView.EditTrigger.NoEditTriggers)
+        self.tag_view.setUniformItemSizes(True)
+        # Lays the tags out in rows that wrap like the old grid
+        self.tag_view.setFlow(QListView.Flow.LeftToRight)
+        self.tag_view.setWrapping(True)
+        self.tag_view.setResizeMode(QListView.ResizeMode.Adjust)
+        self.tag_view.setSpacing(4)
+        tag_layout = QVBoxLayout()
+        tag_layout.addWidget(self.tag_filter)
+        tag_layout.addWidget(self.tag_view)
 
                 
         # Apply button
@@ -95,20 +133,18 @@ class IngredientSelector(QDialog):
         transfer_button.clicked.connect(self.add_ingredient_to_list)
         remove_button.clicked.connect(self.remove_ingredient_from_list)
         apply_button.clicked.connect(self.apply)
+        self.tag_filter.textChanged.connect(self.tag_filter_model.setFilterFixedString)
 
         # Main layout
         main_layout.addLayout(group_1,3)
-        main_layout.addWidget(tag_scroll_area,1)
+        main_layout.addLayout(tag_layout,1)
         main_layout.addWidget(apply_button)
         
         # Late Calls
         self.init_with_data_pack()
 
     def save_results(self):
-        self.ingredient_selections = []
-        for checkbox in self.findChildren(QCheckBox):
-            if checkbox.isChecked():
-                self.ingredient_selections.append(checkbox.text())
+        self.ingredient_selections = self.tag_model.checked_names()
                 
     def add_ingredient_to_list(self):
         selection_index = self.ingredient_view.currentIndex()
@@ -116,7 +152,7 @@ class IngredientSelector(QDialog):
             sel_text = self.ingredient_view_model.data(selection_index, Qt.ItemDataRole.DisplayRole)
             name = QStandardItem(sel_text)
             quant = QStandardItem("0")
-            unit =  QStandardItem("Enter Measurement Unit")
+            unit =  QStandardItem(self.measurement_units[0])
             
             name.setFlags(name.flags() & ~Qt.ItemFlag.ItemIsEditable)
             row = [name, quant, unit]
@@ -141,11 +177,6 @@ class IngredientSelector(QDialog):
         self.data_pack["ingredients"] = []
         self.data_pack["tags"] = []
         
-        tag_data = {}
-        for checkbox in self.checkboxes:
-            tag_data[checkbox.text()] = checkbox.isChecked()
-        # DEBUG print(tag_data)
-        
         rows = self.table_model.rowCount()
         columns = self.table_model.columnCount()
         for row in range(rows):
@@ -161,18 +192,14 @@ class IngredientSelector(QDialog):
             ingredient_data["measurement_unit"]=row_data[2]
             self.data_pack["ingredients"].append(ingredient_data)
 
-        for key in tag_data.keys():
-            if tag_data[key] == True:
-                self.data_pack["tags"].append(key)
+        self.data_pack["tags"] = self.tag_model.checked_names()
         # DEBUG print(f"From 'apply' in popup window: {self.data_pack}")
         
         self.close()
                 
     def init_with_data_pack(self):
-        for checkbox in self.checkboxes:
-            for tag in self.data_pack["tags"]:
-                if checkbox.text() == tag:
-                    checkbox.setChecked(True)
+        # One set update, the view asks for check states as rows are painted
+        self.tag_model.checked = set(self.data_pack["tags"])
                     
         for ingredient in self.data_pack["ingredients"]:          
             row = [QStandardItem(ingredient["ingredient"]), QStandardItem(ingredient["quantity"]), QStandardItem(ingredient["measurement_unit"])]
@@ -183,4 +210,82 @@ class IngredientSelector(QDialog):
         return self.data_pack
     
     def closeEvent(self, a0):
-        super().closeEvent(a0)
\ No newline at end of file
+        super().closeEvent(a0)
+
+class DebugPanel(QDialog):
+    """
+    Shows the InfoLogging metrics: latency percentiles per operation, SQL statements by kind and handled errors.
+    """
+    def __init__(self, parent=None, extra: dict|None=None):
+        """
+        :param extra: Extra values to include in the json dump, e.g. the start up times
+        """
+        super().__init__(parent)
+        from scripts.InfoLogging import metrics
+        self.metrics = metrics
+        self.extra = extra or {}
+        self.setWindowTitle("Performance")
+        self.setMinimumSize(1000, 700)
+        main_layout = QVBoxLayout(self)
+        
+        self.operation_model = QStandardItemModel(0, 7)
+        self.operation_model.setHorizontalHeaderLabels(["Operation", "Count", "p50 ms", "p95 ms", "p99 ms", "Max ms", "Total ms"])
+        operation_table = QTableView()
+        operation_table.setModel(self.operation_model)
+        operation_table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        operation_table.setSortingEnabled(True)
+        operation_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents) # type: ignore
+        
+        self.counter_model = QStandardItemModel(0, 2)
+        self.counter_model.setHorizontalHeaderLabels(["Counter", "Count"])
+        counter_table = QTableView()
+        counter_table.setModel(self.counter_model)
+        counter_table.setEditTriggers(QTableView.EditTrigger.NoEditTriggers)
+        counter_table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch) # type: ignore
+        
+        button_layout = QHBoxLayout()
+        refresh_button = QPushButton("Refresh")
+        reset_button = QPushButton("Reset")
+        save_button = QPushButton("Save JSON...")
+        button_layout.addWidget(refresh_button)
+        button_layout.addWidget(reset_button)
+        button_layout.addWidget(save_button)
+        
+        # Connections
+        refresh_button.clicked.connect(self.refresh)
+        reset_button.clicked.connect(self.reset)
+        save_button.clicked.connect(self.save_json)
+        
+        main_layout.addWidget(operation_table, 3)
+        main_layout.addWidget(counter_table, 1)
+        main_layout.addLayout(button_layout)
+        self.refresh()
+
+    def refresh(self):
+        snapshot = self.metrics.snapshot()
+        self.operation_model.removeRows(0, self.operation_model.rowCount())
+        for name, stats in snapshot["operations"].items():
+            row = [QStandardItem(name)]
+            for key in ("count", "p50_ms", "p95_ms", "p99_ms", "max_ms", "total_ms"):
+                item = QStandardItem()
+                item.setData(stats[key], Qt.ItemDataRole.DisplayRole) # Numbers so the columns sort numerically
+                row.append(item)
+            self.operation_model.appendRow(row)
+            
+        self.counter_model.removeRows(0, self.counter_model.rowCount())
+        counters = [(f"SQL {keyword}", count) for keyword, count in snapshot["sql_statements"].items()]
+        counters += [(f"Error {event}", count) for event, count in snapshot["errors"].items()]
+        for name, count in counters:
+            count_item = QStandardItem()
+            count_item.setData(count, Qt.ItemDataRole.DisplayRole)
+            self.counter_model.appendRow([QStandardItem(name), count_item])
+
+    def reset(self):
+        self.metrics.reset()
+        self.refresh()
+
+    def save_json(self):
+        from PyQt6.QtWidgets import QFileDialog
+        path, _ = QFileDialog.getSaveFileName(self, "Save Metrics", "metrics.json", "JSON (*.json)")
+        if path:
+            self.metrics.dump_json(path, self.extra)
@@ -0,0 +1,173 @@
+import re
+from functools import lru_cache
+
+# Canonical unit -> (dimension, factor to the base unit, aliases)
+# Mass is stored in grams, volume in millilitres and counts in items
+UNITS = {
+    # Mass
+    "g": ("mass", 1.0, ("gram", "grams", "gr", "gm")),
+    "kg": ("mass", 1000.0, ("kilogram", "kilograms", "kgs")),
+    "mg": ("mass", 0.001, ("milligram", "milligrams")),
+    "oz": ("mass", 28.349523125, ("ounce", "ounces")),
+    "lbs": ("mass", 453.59237, ("lb", "pound", "pounds", "#")),
+    # Volume
+    "ml": ("volume", 1.0, ("millilitre", "millilitres", "milliliter", "milliliters", "cc")),
+    "l": ("volume", 1000.0, ("litre", "litres", "liter", "liters")),
+    "tsp": ("volume", 4.92892159375, ("teaspoon", "teaspoons", "t")),
+    "tbsp": ("volume", 14.78676478125, ("tablespoon", "tablespoons", "tbs", "tbl", "T")),
+    "fl oz": ("volume", 29.5735295625, ("fluid ounce", "fluid ounces", "floz", "fl. oz")),
+    "cup": ("volume", 236.5882365, ("cups", "c")),
+    "pint": ("volume", 473.176473, ("pints", "pt")),
+    "quart": ("volume", 946.352946, ("quarts", "qt")),
+    "gallon": ("volume", 3785.411784, ("gallons", "gal")),
+    # Count
+    "each": ("count", 1.0, ("", "ea", "x", "piece", "pieces", "pc", "pcs", "whole", "item", "items")),
+    "dozen": ("count", 12.0, ("doz", "dz")),
+}
+
+# How totals are shown, the second unit is used once the total reaches its factor
+DISPLAY_UNITS = {
+    "mass": ("g", "kg"),
+    "volume": ("ml", "l"),
+    "count": ("each", None),
+}
+
+# Units offered in drop downs, smallest first within each dimension
+MEASUREMENT_UNITS = sorted(UNITS, key=lambda unit: (UNITS[unit][0], UNITS[unit][1]))
+
+def _build_lookup() -> dict[str, tuple[str, str, float]]:
+    """
+    Flattens UNITS into alias -> (canonical unit, dimension, factor) once at import.
+    "T"/"t" are the only case sensitive aliases (tablespoon/teaspoon), everything else is matched lower case.
+    """
+    lookup = {}
+    for unit, (dimension, factor, aliases) in UNITS.items():
+        for alias in (unit, *aliases):
+            key = alias if alias in ("T", "t") else alias.lower()
+            lookup[key] = (unit, dimension, factor)
+    return lookup
+
+UNIT_LOOKUP = _build_lookup()
+
+_UNICODE_FRACTIONS = {
+    "¼": 0.25, "½": 0.5, "¾": 0.75, "⅓": 1 / 3, "⅔": 2 / 3, "⅛": 0.125,
+    "⅜": 0.375, "⅝": 0.625, "⅞": 0.875, "⅕": 0.2, "⅙": 1 / 6,
+}
+# "1,000" and "12,345.5" use thousands separators, a decimal comma ("1,5") is only read as one when it isn't
+# followed by exactly three digits, otherwise "1,000 g" would be read as 1 g
+_DECIMAL = r"(?:\d{1,3}(?:,\d{3})+(?:\.\d+)?|\d+(?:\.\d+|,(?!\d{3}(?!\d))\d+)?)"
+_THOUSANDS = re.compile(r"^\d{1,3}(?:,\d{3})+(?:\.\d+)?$")
+_NUMBER = rf"(?:{_DECIMAL}\s*(?:\d+/\d+|[¼½¾⅓⅔⅛⅜⅝⅞⅕⅙])?|\d+/\d+|[¼½¾⅓⅔⅛⅜⅝⅞⅕⅙])"
+_QUANTITY = re.compile(rf"^\s*(?P<low>{_NUMBER})(?:\s*(?:-|–|to)\s*(?P<high>{_NUMBER}))?\s*$", re.IGNORECASE)
+_LEADING = re.compile(rf"^\s*(?P<quantity>{_NUMBER}(?:\s*(?:-|–|to)\s*{_NUMBER})?)\s*(?P<unit>[^\d\s¼½¾⅓⅔⅛⅜⅝⅞⅕⅙].*)$", re.IGNORECASE)
+_MIXED = re.compile(rf"^(?P<whole>{_DECIMAL})?\s*(?:(?P<num>\d+)/(?P<den>\d+)|(?P<uni>[¼½¾⅓⅔⅛⅜⅝⅞⅕⅙]))?$")
+
+def _parse_number(text: str) -> float|None:
+    match = _MIXED.match(text.strip())
+    if match is None or not any(match.groupdict().values()):
+        return None
+    whole = match["whole"] or ""
+    whole = whole.replace(",", "") if _THOUSANDS.match(whole) else whole.replace(",", ".")
+    value = float(whole) if whole else 0.0
+    if match["num"]:
+        if int(match["den"]) == 0:
+            return None
+        value += int(match["num"]) / int(match["den"])
+    elif match["uni"]:
+        value += _UNICODE_FRACTIONS[match["uni"]]
+    return value
+
+def parse_range(text: str|None) -> tuple[float, float]|None:
+    """
+    :param text: Quantity as typed, e.g. "2", "1.5", "1/2", "1 1/2", "1½", "2-3", "2 to 3"
+    \nReturns (low, high), both are the same value when it isn't a range. None when it can't be read.
+    """
+    if not text:
+        return None
+    match = _QUANTITY.match(text)
+    if match is None:
+        return None
+    low = _parse_number(match["low"])
+    if low is None:
+        return None
+    high = _parse_number(match["high"]) if match["high"] else low
+    if high is None:
+        return None
+    return low, max(low, high)
+
+def parse_quantity(text: str|None) -> float|None:
+    """
+    :param text: Quantity as typed
+    \nReturns a single amount, ranges use their upper bound so a shopping list always covers the recipe
+    """
+    parsed = parse_range(text)
+    return None if parsed is None else parsed[1]
+
+def normalize_unit(text: str|None) -> tuple[str, str, float]|None:
+    """
+    :param text: Unit as typed
+    \nReturns (canonical unit, dimension, factor to base) or None for units that aren't known
+    """
+    text = (text or "").strip().rstrip(".")
+    return UNIT_LOOKUP.get(text) or UNIT_LOOKUP.get(text.lower())
+
+@lru_cache(maxsize=4096)
+def to_base(quantity: str|None, unit: str|None) -> tuple[float|None, float|None, str|None]:
+    """
+    :param quantity: Quantity as typed
+    :param unit: Unit as typed
+    \nReturns (amount, base amount, dimension), this is what gets stored next to the text at save time.
+    Unknown units keep their amount as the base amount with no dimension so they're only summed per unit.
+    \nResults are cached, recipes repeat the same few quantities and units so bulk imports rarely parse.
+    """
+    amount = parse_quantity(quantity)
+    if amount is None and not (unit or "").strip():
+        # "1 cup" typed into the quantity box with no unit picked
+        match = _LEADING.match(quantity or "")
+        if match is not None:
+            amount, unit = parse_quantity(match["quantity"]), match["unit"]
+    normalized = normalize_unit(unit)
+    if amount is None:
+        return None, None, None
+    if normalized is None:
+        return amount, amount, None
+    return amount, amount * normalized[2], normalized[1]
+
+def format_amount(total: float, dimension: str|None, unit: str|None=None) -> tuple[float, str]:
+    """
+    :param total: Amount in the dimension's base unit, or in `unit` when the dimension is unknown
+    \nReturns (amount, unit) rounded for display
+    """
+    if dimension in DISPLAY_UNITS:
+        small, large = DISPLAY_UNITS[dimension]
+        if large is not None and abs(total) >= UNITS[large][1]:
+            return round(total / UNITS[large][1], 2), large
+        return round(total, 2), small
+    return round(total, 2), unit or ""
+
+_PARENTHESES = re.compile(r"\([^)]*\)|\[[^\]]*\]")
+_TRAILING_NOTES = re.compile(r"\s*(?:,.*|\bto taste\b.*|\bfor serving\b.*|\boptional\b.*)$", re.IGNORECASE)
+
+def split_ingredient_line(text: str) -> tuple[str, str, str]:
+    """
+    :param text: A free text ingredient line, e.g. "1 1/2 cups all-purpose flour, sifted"
+    \nReturns (quantity, unit, ingredient name) as they would be typed into the app, e.g. ("1 1/2", "cup",
+    "all-purpose flour"). Quantity and unit are "" when the line doesn't start with an amount or a known unit.
+    """
+    text = " ".join(_PARENTHESES.sub(" ", text or "").split())
+    quantity, rest = "", text
+    match = _LEADING.match(text)
+    if match is not None:
+        quantity, rest = match["quantity"].strip(), match["unit"].strip()
+    unit = ""
+    words = rest.split()
+    # Two word units ("fl oz", "fluid ounces") first, then one word, a trailing "." or "of" isn't part of it
+    for length in (2, 1):
+        candidate = " ".join(words[:length]).rstrip(".")
+        if len(words) > length and candidate and normalize_unit(candidate) is not None:
+            unit, rest = normalize_unit(candidate)[0], " ".join(words[length:])
+            break
+    if rest.lower().startswith("of "):
+        rest = rest[3:]
+    name = _TRAILING_NOTES.sub("", rest).strip(" .-*")
+    return quantity, unit, name or rest.strip()
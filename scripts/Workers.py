@@ -0,0 +1,89 @@
+from PyQt6.QtCore import QObject, QRunnable, pyqtSignal
+from scripts.InfoLogging import ErrorLogger, timer
+
+error_log = ErrorLogger("workers")
+
+class SearchSignals(QObject):
+    # (request number, results) results is None when the search was cancelled
+    finished = pyqtSignal(int, object)
+
+class SearchTask(QRunnable):
+    """
+    Runs one RecipeSearchEngine search off the GUI thread.
+    \nEvery request gets a number, the task gives up as soon as a newer request exists so
+    stale queries never hold up the one the user is actually waiting for.
+    """
+    def __init__(self, engine, request: int, latest_request, query: str, keyword: bool):
+        """
+        :param self:
+        :param engine: RecipeSearchEngine to search
+        :param request: Number of this request
+        :param latest_request: Callable returning the newest request number
+        """
+        super().__init__()
+        self.engine = engine
+        self.request = request
+        self.latest_request = latest_request
+        self.query = query
+        self.keyword = keyword
+        self.signals = SearchSignals()
+
+    def run(self):
+        cancelled = lambda: self.latest_request() != self.request
+        if cancelled():
+            return
+        try:
+            results = self.engine.search(self.query, keyword=self.keyword, cancelled=cancelled)
+        except Exception as e:
+            error_log.error("Search failed", e, traceback=True, query=self.query)
+            results = None
+        self.signals.finished.emit(self.request, results)
+
+class BackupSignals(QObject):
+    progress = pyqtSignal(int, int) # (copied pages, total pages)
+    finished = pyqtSignal(object) # Backup path, None when skipped or failed
+
+class BackupTask(QRunnable):
+    """
+    Runs a BackupManager backup off the GUI thread so start up time doesn't depend on the database size.
+    """
+    def __init__(self, manager):
+        super().__init__()
+        self.manager = manager
+        self.signals = BackupSignals()
+
+    def run(self):
+        try:
+            path = self.manager.run(progress=self.signals.progress.emit)
+        except Exception as e:
+            error_log.error("Backup failed", e, traceback=True)
+            path = None
+        self.signals.finished.emit(path)
+
+class StartupSignals(QObject):
+    # (RecipeSearchEngine, ingredient rows, tag rows), None when loading failed
+    finished = pyqtSignal(object)
+
+class StartupLoadTask(QRunnable):
+    """
+    Reads the recipe names and the ingredient/tag catalogs and builds the search engine off the GUI thread,
+    so the window can be shown before any of it is ready. rapidfuzz is first imported here as well.
+    """
+    def __init__(self, database, search_result_limit: int|None):
+        super().__init__()
+        self.database = database
+        self.search_result_limit = search_result_limit
+        self.signals = StartupSignals()
+
+    def run(self):
+        try:
+            with timer("startup.load"):
+                from scripts.SearchEngine import RecipeSearchEngine
+                data = self.database.read_startup_data()
+                engine = RecipeSearchEngine(limit=self.search_result_limit)
+                engine.load(data["recipes"])
+            result = (engine, data["ingredients"], data["tags"])
+        except Exception as e:
+            error_log.error("Start up load failed", e, traceback=True)
+            result = None
+        self.signals.finished.emit(result)